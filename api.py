@@ -4,13 +4,18 @@
 #
 # Main module for this project. RESTful API for interfacing with underlying market feed client.
 
+import os
 import logging
 import datetime
-from flask import Flask
+from decimal import Decimal
+from flask import Flask, Response, request
 from flask_cors import CORS
 from flask_restful import Resource, Api, reqparse
 from market_data_feed.market_data_feed_client import MarketDataFeedClient
 from market_data_feed import time_util
+from market_data_feed import metrics
+from market_data_feed import trade_tape
+from market_data_feed.level_stream import LevelStream
 
 logging.basicConfig(
     format='%(asctime)s - %(name)10s - %(levelname)7s - %(message)s', level=logging.DEBUG
@@ -20,7 +25,16 @@ app = Flask(__name__)
 CORS(app)
 api = Api(app)
 
-mdf_client = MarketDataFeedClient()
+# Under a multi process server (ex: gunicorn -w 4 api:app), run a single feed with
+# `market-data-publish --name mdf-books` and set MDF_SHARED_BOOK=mdf-books, so every worker reads that feed's books
+# rather than opening its own connection
+mdf_client = MarketDataFeedClient(metrics_enabled=True, shared_book=os.environ.get("MDF_SHARED_BOOK"))
+level_stream = LevelStream(mdf_client)
+
+MAX_LEVELS_DEPTH = 50
+
+# Part of every ETag, so a version seen before a restart (when versions start over) never matches a new book
+ETAG_EPOCH = os.urandom(4).hex()
 
 
 class MarketDataFeedAPI(Resource):
@@ -30,16 +44,30 @@ class MarketDataFeedAPI(Resource):
         logging.info("Received MarketDataFeedAPI GET Request")
 
         parser = reqparse.RequestParser()
-        parser.add_argument("action", type=str)
+        parser.add_argument("action", type=str, location="args")
+        parser.add_argument("product", type=str, location="args")
+        parser.add_argument("resolution", type=str, default="1m", location="args")
+        parser.add_argument("count", type=int, default=60, location="args")
         args = parser.parse_args()
         action = args["action"]
+        product_id = args["product"] or mdf_client.products[0]
+        if product_id not in mdf_client.products:
+            return {"msg": "Unknown product ({}), expected one of {}".format(product_id, mdf_client.products)}, 400
+        if args["count"] < 0:
+            return {"msg": "Count must be at least 0"}, 400
 
         if "start" == action:
             msg_str = self._start()
         elif "stop" == action:
             msg_str = self._stop()
         elif "levels" == action:
-            msg_str = self._levels()
+            msg_str = self._levels(product_id)
+        elif "stats" == action:
+            msg_str = self._stats(product_id)
+        elif "bars" == action:
+            msg_str = self._bars(product_id, args["resolution"], args["count"])
+        elif "trades" == action:
+            msg_str = self._trades(product_id, args["count"])
         else:
             msg_str = "Action ({}) not recognized".format(action)
             logging.warning(msg_str)
@@ -49,22 +77,111 @@ class MarketDataFeedAPI(Resource):
         return {"msg": msg_str}
 
     def _start(self):
+        if mdf_client.shared_book is not None:
+            return "Market Data Feed runs in the process publishing {}".format(mdf_client.shared_book)
         mdf_client.start()
         return "Market Data Feed Started"
 
     def _stop(self):
+        if mdf_client.shared_book is not None:
+            return "Market Data Feed runs in the process publishing {}".format(mdf_client.shared_book)
         mdf_client.close()
         return "Market Data Feed Stopped"
 
-    def _levels(self):
+    def _levels(self, product_id):
         level_count = 5
-        msg_str = "Inside BTC-USD Levels as of: \n{}\n\n{}".format(
+        msg_str = "Inside {} Levels as of: \n{}\n\n{}".format(
+            product_id,
             str(datetime.datetime.now()),
-            mdf_client.get_inside_levels_printout(level_count))
+            mdf_client.get_inside_levels_printout(level_count, product_id))
         return msg_str
 
+    def _stats(self, product_id):
+        return str(mdf_client.get_product_stats(product_id))
+
+    def _bars(self, product_id, resolution, count):
+        # OHLCV bars, ex: /feed?action=bars&resolution=1m&count=60, oldest first with the last one still open
+        try:
+            bars = mdf_client.get_bars(resolution, count, product_id)
+        except (ValueError, KeyError) as e:
+            return "Bars not available: {}".format(e)
+        return [{"time": time_util.format_exchange_time(start), "open": open_price, "high": high, "low": low,
+                 "close": close, "volume": volume, "trade_count": trade_count}
+                for (start, open_price, high, low, close, volume, trade_count) in bars.tolist()]
+
+    def _trades(self, product_id, count):
+        # Recent trades, ex: /feed?action=trades&count=100, oldest first
+        try:
+            trades = mdf_client.get_trades(count, product_id)
+        except (ValueError, KeyError) as e:
+            return "Trades not available: {}".format(e)
+        return [{"time": time_util.format_exchange_time(trade_time), "price": price, "size": size,
+                 "side": "buy" if side == trade_tape.BUY else "sell"}
+                for (trade_time, price, size, side) in trades.tolist()]
+
+
+class LevelsAPI(Resource):
+
+    def get(self):
+        # JSON inside levels, ex: /levels?product=BTC-USD&depth=10. The ETag follows the book version, so a poll
+        # carrying If-None-Match gets 304 Not Modified until the book changes.
+        parser = reqparse.RequestParser()
+        parser.add_argument("depth", type=int, default=5, location="args")
+        parser.add_argument("product", type=str, location="args")
+        args = parser.parse_args()
+        depth = args["depth"]
+        product_id = args["product"] or mdf_client.products[0]
+        if product_id not in mdf_client.products:
+            return {"msg": "Unknown product ({}), expected one of {}".format(product_id, mdf_client.products)}, 400
+        if not 1 <= depth <= MAX_LEVELS_DEPTH:
+            return {"msg": "Depth must be between 1 and {}".format(MAX_LEVELS_DEPTH)}, 400
+
+        (version, body) = mdf_client.get_inside_levels_json(depth, product_id)
+        response = Response(body, mimetype="application/json", headers={"Cache-Control": "no-cache"})
+        response.set_etag("{}-{}-{}-{}".format(ETAG_EPOCH, product_id, version, depth))
+        return response.make_conditional(request)
+
+
+class MicrostructureAPI(Resource):
+
+    def get(self):
+        # Mid, spread, microprice, depth imbalance and session VWAP, ex: /microstructure?product=BTC-USD. Decimals are
+        # sent as strings, like the levels, and are null until the book has both sides (or a trade, for the VWAP).
+        parser = reqparse.RequestParser()
+        parser.add_argument("product", type=str, location="args")
+        args = parser.parse_args()
+        product_id = args["product"] or mdf_client.products[0]
+        if product_id not in mdf_client.products:
+            return {"msg": "Unknown product ({}), expected one of {}".format(product_id, mdf_client.products)}, 400
+
+        microstructure = mdf_client.get_microstructure(product_id)
+        return {key: str(value) if isinstance(value, Decimal) else value for (key, value) in microstructure.items()}
+
 
 api.add_resource(MarketDataFeedAPI, "/feed")
+api.add_resource(LevelsAPI, "/levels")
+api.add_resource(MicrostructureAPI, "/microstructure")
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    # Plain text scrape target for Prometheus, outside flask_restful since it isn't JSON
+    return Response(metrics.render_prometheus(mdf_client), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/stream")
+def stream_levels():
+    # Server-Sent Events stream of top of book deltas, ex: /stream?product=BTC-USD&levels=10&interval=0.25
+    try:
+        subscription = level_stream.subscribe(request.args.get("product"),
+                                              request.args.get("levels", 5, type=int),
+                                              request.args.get("interval", 0.1, type=float))
+    except ValueError as e:
+        return {"msg": str(e)}, 400
+    logging.info("Level stream subscriber added. product={} levels={} interval={}".format(
+        subscription.product_id, subscription.level_count, subscription.conflation_interval))
+    return Response(subscription.events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 if __name__ == "__main__":
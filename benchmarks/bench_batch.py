@@ -0,0 +1,58 @@
+# benchmarks/bench_batch.py
+# original author: Jacob Brown
+#
+#
+# Replay throughput of OrderBook.apply_batch against calling OrderBook.handle_event per event, over a long synthetic
+# full channel stream (including `received` events). The stream is materialized a chunk at a time so only applying the
+# events is timed. Run from the repo root with:
+#     python -m benchmarks.bench_batch
+
+import sys
+import time
+import argparse
+import itertools
+from market_data_feed.order_book import OrderBook
+from benchmarks.bench_order_book import iter_events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='OrderBook.apply_batch replay throughput')
+    parser.add_argument('--events', type=int, default=10000000)
+    parser.add_argument('--chunk', type=int, default=500000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-levels', type=int, nargs='+', default=[15, 500])
+    parser.add_argument('--tick-size', help='Run the OrderBook in fixed point mode with this price increment')
+    parser.add_argument('--lot-size', default='0.00000001', help='Size increment used with --tick-size')
+    args = parser.parse_args(argv)
+
+    book_kwargs = {}
+    if args.tick_size:
+        book_kwargs = {'tick_size': args.tick_size, 'lot_size': args.lot_size}
+
+    for max_levels in args.max_levels:
+        per_event_book = OrderBook(max_levels=max_levels, **book_kwargs)
+        batch_book = OrderBook(max_levels=max_levels, **book_kwargs)
+        per_event_elapsed = 0.0
+        batch_elapsed = 0.0
+
+        stream = iter_events(args.seed, with_received=True)
+        remaining = args.events
+        while remaining > 0:
+            chunk = list(itertools.islice(stream, min(args.chunk, remaining)))
+            remaining -= len(chunk)
+
+            start = time.perf_counter()
+            for event in chunk:
+                per_event_book.handle_event(event)
+            per_event_elapsed += time.perf_counter() - start
+
+            start = time.perf_counter()
+            batch_book.apply_batch(chunk)
+            batch_elapsed += time.perf_counter() - start
+
+        print('max_levels={:>6}  events={:,}  handle_event/sec={:>10,.0f}  apply_batch/sec={:>10,.0f}'.format(
+            max_levels, args.events, args.events / per_event_elapsed, args.events / batch_elapsed))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
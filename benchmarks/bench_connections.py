@@ -0,0 +1,127 @@
+# benchmarks/bench_connections.py
+# original author: Jacob Brown
+#
+#
+# Connection count versus memory and CPU for the threaded WebSocketClient and the asyncio AsyncWebSocketClient, both
+# reading from a local feed stub (see feed_stub.py) started in its own process. Each client type is measured in a fresh
+# subprocess, since the threaded client's non-daemon threads can take up to a ping interval to exit. Run from the repo
+# root with:
+#     python -m benchmarks.bench_connections
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+from market_data_feed.websocket_client import WebSocketClient
+from market_data_feed.async_websocket_client import AsyncWebSocketClient
+
+
+class CountingClient(WebSocketClient):
+
+    def on_message(self, msg):
+        self.message_count += 1
+
+
+class AsyncCountingClient(AsyncWebSocketClient):
+
+    def on_message(self, msg):
+        self.message_count += 1
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(client_type, url, connection_count, window):
+    client_class = CountingClient if client_type == 'threaded' else AsyncCountingClient
+    rss_before = rss_kb()
+    threads_before = threading.active_count()
+
+    clients = []
+    for _ in range(connection_count):
+        client = client_class(url=url, channels=['full'])
+        client.message_count = 0
+        client.start()
+        clients.append(client)
+    while any(client.message_count == 0 for client in clients):
+        time.sleep(0.05)
+
+    # Steady state -> CPU spent handling the streams over <window> seconds
+    message_count_before = sum(client.message_count for client in clients)
+    cpu_before = time.process_time()
+    time.sleep(window)
+    cpu_seconds = time.process_time() - cpu_before
+    message_count = sum(client.message_count for client in clients) - message_count_before
+
+    result = {'client': client_type,
+              'connections': connection_count,
+              'threads': threading.active_count() - threads_before,
+              'rss_mb': (rss_kb() - rss_before) / 1024,
+              'cpu_pct': 100 * cpu_seconds / window,
+              'cpu_us_per_msg': 1e6 * cpu_seconds / max(message_count, 1)}
+
+    # Only one close is timed, the threaded client can take up to its 30s ping interval for each
+    start = time.perf_counter()
+    clients[0].close()
+    result['close_s'] = time.perf_counter() - start
+    return result
+
+
+def wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Feed stub did not start on {}:{}'.format(host, port))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Threaded vs asyncio client connection scaling')
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 10, 50, 100])
+    parser.add_argument('--rate', type=int, default=50, help='Frames per second sent to each connection')
+    parser.add_argument('--window', type=float, default=5.0, help='Seconds of steady state measured')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--measure', choices=['threaded', 'asyncio'], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    url = 'ws://127.0.0.1:{}'.format(args.port)
+    if args.measure:
+        # Child process -> one measurement, then exit without waiting on any lingering client threads
+        logging.disable(logging.CRITICAL)  # Clients log an error for every connection dropped by the exit
+        print(json.dumps(measure(args.measure, url, args.connections[0], args.window)), flush=True)
+        os._exit(0)
+
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.feed_stub', '--port', str(args.port),
+                               '--rate', str(args.rate)])
+    try:
+        wait_for_port('127.0.0.1', args.port)
+        print('{:>9} {:>12} {:>8} {:>9} {:>8} {:>12} {:>12}'.format(
+            'client', 'connections', 'threads', 'rss_mb', 'cpu_pct', 'cpu_us/msg', 'close_s'))
+        for connection_count in args.connections:
+            for client_type in ('threaded', 'asyncio'):
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_connections', '--measure', client_type,
+                     '--connections', str(connection_count), '--window', str(args.window), '--port', str(args.port)],
+                    check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print('{client:>9} {connections:>12} {threads:>8} {rss_mb:>9.1f} {cpu_pct:>8.1f} '
+                      '{cpu_us_per_msg:>12.1f} {close_s:>12.2f}'.format(**result), flush=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# benchmarks/bench_decode.py
+# original author: Jacob Brown
+#
+#
+# Decode cost per message type for each frame decoder (see decoders.py). Frames are read from a file of captured raw
+# frames, one per line, or generated from the synthetic full channel stream with the extra fields the real feed sends.
+# Run from the repo root with:
+#     python -m benchmarks.bench_decode [--frames captured_frames.txt]
+
+import sys
+import json
+import time
+import argparse
+import itertools
+from market_data_feed import decoders
+from benchmarks.bench_order_book import iter_events
+
+
+def generate_frames(frame_count, seed=1):
+    # Compact JSON, as sent by the feed, with the fields the book never reads filled in
+    frames = []
+    for (sequence, event) in enumerate(itertools.islice(iter_events(seed, with_received=True), frame_count)):
+        event['product_id'] = 'BTC-USD'
+        event['sequence'] = 10000000000 + sequence
+        event['time'] = '2020-03-21T19:32:45.123456Z'
+        if event['type'] == 'received':
+            event['client_oid'] = 'd50ec984-77a8-460a-b958-66f114b0de9b'
+        elif event['type'] == 'match':
+            event['trade_id'] = 85000000 + sequence
+            event['taker_order_id'] = 'a9625b04-fc66-4999-a876-543c3684d702'
+        frames.append(json.dumps(event, separators=(',', ':')))
+    return frames
+
+
+def load_frames(path):
+    with open(path) as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+
+def time_decoder(decoder, frames, repeat):
+    # Best of <repeat> passes, in nanoseconds per frame
+    best_elapsed = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for frame in frames:
+            decoder(frame)
+        elapsed = time.perf_counter() - start
+        if best_elapsed is None or elapsed < best_elapsed:
+            best_elapsed = elapsed
+    return best_elapsed / len(frames) * 1e9
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Frame decode cost per message type')
+    parser.add_argument('--frames', help='File of captured raw frames, one per line')
+    parser.add_argument('--count', type=int, default=200000, help='Generated frames when --frames is not given')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.frames) if args.frames else generate_frames(args.count)
+
+    # Dict<String, List<String>> -> {Message Type : Frames}
+    frames_by_type = {}
+    for frame in frames:
+        frames_by_type.setdefault(json.loads(frame).get('type'), []).append(frame)
+
+    decoder_names = ['json', 'selective']
+    if decoders.orjson is not None:
+        decoder_names[1:1] = ['orjson']
+    decoder_by_name = {name: decoders.get_decoder(name) for name in decoder_names}
+    if decoders.orjson is not None:
+        decoder_by_name['selective(json)'] = decoders.selective_decoder(loads=json.loads)
+
+    print('{:>10} {:>9}'.format('type', 'frames') + ''.join('{:>20}'.format(name + ' ns') for name in decoder_by_name))
+    for (event_type, typed_frames) in sorted(frames_by_type.items()) + [('all', frames)]:
+        costs = [time_decoder(decoder, typed_frames, args.repeat) for decoder in decoder_by_name.values()]
+        print('{:>10} {:>9,}'.format(event_type, len(typed_frames)) + ''.join('{:>20,.0f}'.format(c) for c in costs))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
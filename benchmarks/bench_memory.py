@@ -0,0 +1,90 @@
+# benchmarks/bench_memory.py
+# original author: Jacob Brown
+#
+#
+# Memory cost per resting order of a full depth OrderBook. Run from the repo root with:
+#     python -m benchmarks.bench_memory
+
+import sys
+import uuid
+import random
+import argparse
+import tracemalloc
+from market_data_feed.order_book import OrderBook
+
+
+def generate_open_events(order_count, seed=1, level_count=5000):
+    # Coinbase style events -> uuid order ids, 0.01 ticks, 8dp sizes, spread over <level_count> levels per side
+    rng = random.Random(seed)
+    for i in range(order_count):
+        side = 'sell' if i % 2 else 'buy'
+        offset = rng.randrange(1, level_count + 1)
+        price = 1000000 + offset if side == 'sell' else 1000000 - offset
+        yield {'type': 'open',
+               'order_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+               'side': side,
+               'price': '%d.%02d' % divmod(price, 100),
+               'remaining_size': '%.8f' % rng.uniform(0.001, 2.0)}
+
+
+def measure(order_count, seed=1, **book_kwargs):
+    # Events are generated lazily so that only what the book itself keeps alive is counted
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    order_book = OrderBook(full_depth=True, **book_kwargs)
+    for event in generate_open_events(order_count, seed=seed):
+        order_book.handle_event(event)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    resting_orders = len(order_book.ask_ids) + len(order_book.bid_ids)
+    return resting_orders, (after - before) / resting_orders
+
+
+def measure_event_allocations(order_count, seed=1, **book_kwargs):
+    # Peak transient bytes allocated while applying a single event, averaged per event type. Opens that join an
+    # existing level and partial fills are the common steady state events that used to rebuild tuples.
+    order_book = OrderBook(full_depth=True, **book_kwargs)
+    opens = list(generate_open_events(order_count, seed=seed))
+    (seed_opens, joining_opens) = (opens[:order_count // 2], opens[order_count // 2:])
+    for event in seed_opens:
+        order_book.handle_event(event)
+    partial_fills = [{'type': 'match', 'maker_order_id': event['order_id'], 'side': event['side'],
+                      'price': event['price'], 'size': '0.00000001'} for event in seed_opens]
+
+    results = {}
+    tracemalloc.start()
+    for (name, events) in (('open (existing level)', joining_opens), ('match (partial fill)', partial_fills)):
+        transient_bytes = 0
+        for event in events:
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            order_book.handle_event(event)
+            transient_bytes += tracemalloc.get_traced_memory()[1] - start
+        results[name] = transient_bytes / len(events)
+    tracemalloc.stop()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Full depth OrderBook memory per resting order')
+    parser.add_argument('--orders', type=int, nargs='+', default=[100000, 250000])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--tick-size', help='Run the OrderBook in fixed point mode with this price increment')
+    parser.add_argument('--lot-size', default='0.00000001', help='Size increment used with --tick-size')
+    args = parser.parse_args(argv)
+
+    book_kwargs = {}
+    if args.tick_size:
+        book_kwargs = {'tick_size': args.tick_size, 'lot_size': args.lot_size}
+
+    for order_count in args.orders:
+        (resting_orders, bytes_per_order) = measure(order_count, seed=args.seed, **book_kwargs)
+        print('resting_orders={:>8,}  bytes/order={:>7.1f}'.format(resting_orders, bytes_per_order))
+
+    for (name, transient_bytes) in measure_event_allocations(args.orders[0], seed=args.seed, **book_kwargs).items():
+        print('{:<22}  peak transient bytes/event={:>7.1f}'.format(name, transient_bytes))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# benchmarks/bench_microstructure.py
+# original author: Jacob Brown
+#
+#
+# Cost of the book's incrementally maintained microstructure (mid, spread, microprice, depth imbalance, VWAP) over the
+# seeded synthetic full channel stream, per event, for each book configuration:
+#     apply only      -> handle_event alone, what every event pays for the running sums
+#     scrape          -> plus working the same figures out downstream after every event, as consumers did before ->
+#                        sum the inside levels, price the best levels, and keep the VWAP from the match events
+#     incremental     -> plus OrderBook.get_microstructure after every event
+# With --baseline, the apply only figure is also measured for the OrderBook of another checkout (ex: one made with
+# `git worktree add /tmp/baseline HEAD~1`), interleaved with this tree's, to show what maintaining the sums adds. Run
+# from the repo root with:
+#     python -m benchmarks.bench_microstructure [--baseline /tmp/baseline] [--repeat 5]
+
+import os
+import sys
+import time
+import argparse
+import importlib.util
+from decimal import Decimal as D
+from market_data_feed.order_book import OrderBook
+from benchmarks.synthetic_feed import generate_events
+
+FIXED_POINT = {'tick_size': '0.01', 'lot_size': '0.00000001'}
+
+# List<Pair<String, Dict>> -> ( Scenario Name , OrderBook Keyword Arguments )
+SCENARIOS = [('levels_15', {'max_levels': 15}),
+             ('full_depth', {'full_depth': True}),
+             ('levels_15_fixed', dict(max_levels=15, **FIXED_POINT)),
+             ('full_depth_fixed', dict(full_depth=True, **FIXED_POINT))]
+
+
+def load_order_book_class(checkout):
+    # OrderBook of another checkout's market_data_feed package, imported under its own name so both can be loaded
+    package_directory = os.path.join(checkout, 'market_data_feed')
+    spec = importlib.util.spec_from_file_location('baseline_market_data_feed',
+                                                  os.path.join(package_directory, '__init__.py'),
+                                                  submodule_search_locations=[package_directory])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = package
+    spec.loader.exec_module(package)
+    return importlib.import_module(spec.name + '.order_book').OrderBook
+
+
+def scrape(order_book, depth, trades):
+    # The figures get_microstructure returns, worked out from the book's levels and the consumer's own trade sums
+    asks = [(order_book.to_decimal_price(price), order_book.to_decimal_size(size))
+            for (price, size) in order_book.get_inside_ask_levels(depth)]
+    bids = [(order_book.to_decimal_price(price), order_book.to_decimal_size(size))
+            for (price, size) in order_book.get_inside_bid_levels(depth)]
+    ask_depth = sum(size for (_, size) in asks)
+    bid_depth = sum(size for (_, size) in bids)
+    microstructure = {'mid': None, 'spread': None, 'microprice': None, 'imbalance': None,
+                      'vwap': trades[0] / trades[1] if trades[1] else None}
+    if asks and bids:
+        ((ask_price, ask_size), (bid_price, bid_size)) = (asks[0], bids[0])
+        microstructure['mid'] = (ask_price + bid_price) / 2
+        microstructure['spread'] = ask_price - bid_price
+        microstructure['microprice'] = (ask_price * bid_size + bid_price * ask_size) / (ask_size + bid_size)
+    if ask_depth + bid_depth > 0:
+        microstructure['imbalance'] = (bid_depth - ask_depth) / (bid_depth + ask_depth)
+    return microstructure
+
+
+def run_apply(order_book_class, events, book_kwargs):
+    order_book = order_book_class(**book_kwargs)
+    handle_event = order_book.handle_event
+    start = time.perf_counter()
+    for event in events:
+        handle_event(event)
+    return time.perf_counter() - start
+
+
+def run_scrape(events, book_kwargs):
+    order_book = OrderBook(**book_kwargs)
+    handle_event = order_book.handle_event
+    depth = order_book.imbalance_depth
+    trades = [D(0), D(0)]  # [ Notional , Volume ]
+    start = time.perf_counter()
+    for event in events:
+        handle_event(event)
+        if event['type'] == 'match':
+            size = D(event['size'])
+            trades[0] += D(event['price']) * size
+            trades[1] += size
+        scrape(order_book, depth, trades)
+    return time.perf_counter() - start
+
+
+def run_incremental(events, book_kwargs):
+    order_book = OrderBook(**book_kwargs)
+    handle_event = order_book.handle_event
+    get_microstructure = order_book.get_microstructure
+    start = time.perf_counter()
+    for event in events:
+        handle_event(event)
+        get_microstructure()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Incremental book microstructure overhead')
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', help='Checkout whose OrderBook the apply only cost is compared against')
+    args = parser.parse_args(argv)
+
+    events = list(generate_events(args.events, args.seed))
+    baseline_class = load_order_book_class(args.baseline) if args.baseline else None
+
+    # Best of <repeat>, configurations interleaved within each round so drift hits them all alike
+    runs = [('apply only', lambda kwargs: run_apply(OrderBook, events, kwargs)),
+            ('scrape', lambda kwargs: run_scrape(events, kwargs)),
+            ('incremental', lambda kwargs: run_incremental(events, kwargs))]
+    if baseline_class is not None:
+        runs.insert(0, ('baseline apply', lambda kwargs: run_apply(baseline_class, events, kwargs)))
+
+    for (name, book_kwargs) in SCENARIOS:
+        best = {}
+        for _ in range(args.repeat):
+            for (run_name, run) in runs:
+                ns_per_event = run(book_kwargs) / len(events) * 1e9
+                best[run_name] = min(best.get(run_name, ns_per_event), ns_per_event)
+        line = '{:<18}'.format(name) + ''.join('  {} {:>6,.0f} ns/event'.format(run_name, best[run_name])
+                                                for (run_name, _) in runs)
+        if baseline_class is not None:
+            line += '  (sums add {:+,.0f} ns/event)'.format(best['apply only'] - best['baseline apply'])
+        print(line, flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# benchmarks/bench_order_book.py
+# original author: Jacob Brown
+#
+#
+# Throughput benchmark for OrderBook.handle_event over a synthetic full channel stream. Run from the repo root with:
+#     python -m benchmarks.bench_order_book
+
+import sys
+import time
+import random
+import itertools
+import argparse
+from market_data_feed.order_book import OrderBook
+
+
+def iter_events(seed=1, price_spread=20000, tick=0.01, with_received=False):
+    # Endless random mix of open/done/match events around a drifting mid price. Offsets from the mid are spread over
+    # <price_spread> ticks so that deep books (large max_levels) actually fill up. With <with_received>, every open is
+    # preceded by its `received` event as on the real feed.
+    rng = random.Random(seed)
+    mid = 10000.0
+    resting = []  # List<Tuple<String, String, String, String>> -> (order id, side, price, size)
+    next_id = 0
+
+    while True:
+        mid += rng.choice((-tick, 0.0, tick))
+        roll = rng.random()
+
+        if roll < 0.55 or not resting:
+            side = 'sell' if rng.random() < 0.5 else 'buy'
+            offset = int(rng.expovariate(1.0 / price_spread * 8)) + 1
+            price = mid + offset * tick if side == 'sell' else mid - offset * tick
+            order = (str(next_id), side, '%.2f' % price, '%.8f' % rng.uniform(0.001, 2.0))
+            next_id += 1
+            resting.append(order)
+            if with_received:
+                yield {'type': 'received', 'order_id': order[0], 'side': side, 'price': order[2], 'size': order[3],
+                       'order_type': 'limit'}
+            yield {'type': 'open', 'order_id': order[0], 'side': side, 'price': order[2], 'remaining_size': order[3]}
+
+        elif roll < 0.9:
+            (order_id, side, price, size) = resting.pop(rng.randrange(len(resting)))
+            yield {'type': 'done', 'order_id': order_id, 'side': side, 'price': price, 'remaining_size': '0',
+                   'reason': 'canceled'}
+
+        else:
+            index = rng.randrange(len(resting))
+            (order_id, side, price, size) = resting[index]
+            if rng.random() < 0.5:
+                resting.pop(index)
+                yield {'type': 'match', 'maker_order_id': order_id, 'side': side, 'price': price, 'size': size}
+            else:
+                fill = '%.8f' % (float(size) / 2)
+                remaining = '%.8f' % (float(size) - float(fill))
+                resting[index] = (order_id, side, price, remaining)
+                yield {'type': 'match', 'maker_order_id': order_id, 'side': side, 'price': price, 'size': fill}
+
+
+def generate_events(event_count, seed=1, price_spread=20000, tick=0.01, with_received=False):
+    return list(itertools.islice(iter_events(seed, price_spread, tick, with_received), event_count))
+
+
+def run(max_levels, events, repeat=3, **book_kwargs):
+    # Best of <repeat> runs, each on a fresh book, to keep scheduler noise out of the comparison
+    best_elapsed = None
+    for _ in range(repeat):
+        order_book = OrderBook(max_levels=max_levels, **book_kwargs)
+        start = time.perf_counter()
+        for event in events:
+            order_book.handle_event(event)
+        elapsed = time.perf_counter() - start
+        if best_elapsed is None or elapsed < best_elapsed:
+            best_elapsed = elapsed
+    return len(events) / best_elapsed, len(order_book.best_ask_levels) + len(order_book.best_bid_levels)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='OrderBook.handle_event throughput')
+    parser.add_argument('--events', type=int, default=500000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-levels', type=int, nargs='+', default=[15, 500, 50000])
+    parser.add_argument('--tick-size', help='Run the OrderBook in fixed point mode with this price increment')
+    parser.add_argument('--lot-size', default='0.00000001', help='Size increment used with --tick-size')
+    args = parser.parse_args(argv)
+
+    book_kwargs = {}
+    if args.tick_size:
+        book_kwargs = {'tick_size': args.tick_size, 'lot_size': args.lot_size}
+
+    events = generate_events(args.events, seed=args.seed)
+    for max_levels in args.max_levels:
+        (events_per_sec, level_count) = run(max_levels, events, repeat=args.repeat, **book_kwargs)
+        print('max_levels={:>6}  events/sec={:>10,.0f}  final_levels={}'.format(max_levels, events_per_sec,
+                                                                               level_count))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
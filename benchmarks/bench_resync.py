@@ -0,0 +1,76 @@
+# benchmarks/bench_resync.py
+# original author: Jacob Brown
+#
+#
+# Time to a correct book after a sequence gap. Seeds a BookSynchronizer from a generated level 3 snapshot file while
+# feeding it a live-like stream, and reports the resync time and how many messages were buffered. Run from the repo
+# root with:
+#     python -m benchmarks.bench_resync
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from market_data_feed.order_book import OrderBook
+from market_data_feed.book_sync import BookSynchronizer
+from market_data_feed.snapshot_loader import FileSnapshotLoader
+from benchmarks.bench_memory import generate_open_events
+
+
+def write_snapshot(path, order_count, sequence):
+    snapshot = {'sequence': sequence, 'asks': [], 'bids': []}
+    for event in generate_open_events(order_count):
+        side = 'asks' if event['side'] == 'sell' else 'bids'
+        snapshot[side].append([event['price'], event['remaining_size'], event['order_id']])
+    with open(path, 'w') as f:
+        json.dump(snapshot, f)
+
+
+def run(order_count, message_rate, **book_kwargs):
+    (fd, path) = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    snapshot_sequence = 1000
+    try:
+        write_snapshot(path, order_count, snapshot_sequence)
+        target = BookSynchronizer(OrderBook(full_depth=True, **book_kwargs), 'BTC-USD', FileSnapshotLoader(path))
+
+        # Stream starts a little before the snapshot's sequence, as it would when subscribing before fetching it
+        sequence = snapshot_sequence - 100
+        interval = 1.0 / message_rate
+        next_send = time.perf_counter()
+        while True:
+            target.handle_event({'type': 'received', 'sequence': sequence})
+            sequence += 1
+            if (not target.syncing) and (target.resync_count > 0):
+                break
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return target.last_resync_time_ms, target.last_resync_buffered_count
+    finally:
+        os.remove(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Snapshot resync time under load')
+    parser.add_argument('--orders', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--rate', type=int, default=5000, help='Simulated feed messages per second')
+    parser.add_argument('--tick-size', help='Run the OrderBook in fixed point mode with this price increment')
+    parser.add_argument('--lot-size', default='0.00000001', help='Size increment used with --tick-size')
+    args = parser.parse_args(argv)
+
+    book_kwargs = {}
+    if args.tick_size:
+        book_kwargs = {'tick_size': args.tick_size, 'lot_size': args.lot_size}
+
+    for order_count in args.orders:
+        (resync_time_ms, buffered_count) = run(order_count, args.rate, **book_kwargs)
+        print('snapshot_orders={:>8,}  resync_ms={:>6}  buffered_messages={:>6,}'.format(order_count, resync_time_ms,
+                                                                                       buffered_count))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
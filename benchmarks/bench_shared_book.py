@@ -0,0 +1,119 @@
+# benchmarks/bench_shared_book.py
+# original author: Jacob Brown
+#
+#
+# /feed?action=levels style reads (inside level printouts) per second with the seeded synthetic full channel stream fed
+# at a steady rate, served two ways -> W reader threads in the feed's own process (one API process, its threads
+# sharing the GIL with the feed), and W reader processes on the feed process' shared memory books (see shared_book.py,
+# W API workers on one feed). Reads can only scale with workers given cores to run them on. Run from the repo root
+# with:
+#     python -m benchmarks.bench_shared_book [--workers 1 2 4] [--seconds 3]
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from threading import Thread
+from market_data_feed.shared_book import SharedBookPublisher
+from market_data_feed.market_data_feed_client import MarketDataFeedClient
+from benchmarks.synthetic_feed import generate_events
+
+
+def feed(client, events, rate, deadline):
+    # Applies <events> at <rate> a second, in order, until they run out or <deadline> passes -> share of the events
+    # scheduled by then that were applied, under 1.0 when readers starve the feed
+    batch_size = 100
+    start = time.perf_counter()
+    applied = 0
+    for i in range(0, len(events), batch_size):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if time.perf_counter() > deadline:
+            break
+        for event in events[i:i + batch_size]:
+            client.on_message(event)
+        applied += batch_size
+    return applied / min(len(events), (time.perf_counter() - start) * rate)
+
+
+def read_levels(client, deadline, counts, index):
+    count = 0
+    while time.perf_counter() < deadline:
+        client.get_inside_levels_printout(5)
+        count += 1
+    counts[index] = count
+
+
+def run_threads(events, worker_count, args):
+    client = MarketDataFeedClient(max_levels=50)
+    client.book_manager.reset()
+    deadline = time.perf_counter() + args.seconds
+    counts = [0] * worker_count
+    readers = [Thread(target=read_levels, args=(client, deadline, counts, i)) for i in range(worker_count)]
+    for reader in readers:
+        reader.start()
+    kept_up = feed(client, events, args.rate, deadline)
+    for reader in readers:
+        reader.join()
+    return sum(counts) / args.seconds, kept_up
+
+
+def read_shared_levels(name, seconds, ready, start, counts, index):
+    client = MarketDataFeedClient(shared_book=name)
+    ready.release()
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    counts_local = [0]
+    read_levels(client, deadline, counts_local, 0)
+    counts[index] = counts_local[0]
+    client.book_manager.close()
+
+
+def run_processes(events, worker_count, args):
+    client = MarketDataFeedClient(max_levels=50)
+    client.book_manager.reset()
+    publisher = SharedBookPublisher(client, level_count=50)
+    publisher.publish()
+    publisher.start()
+    ready = multiprocessing.Semaphore(0)
+    start = multiprocessing.Event()
+    counts = multiprocessing.Array('q', worker_count)
+    readers = [multiprocessing.Process(target=read_shared_levels,
+                                       args=(publisher.name, args.seconds, ready, start, counts, i))
+               for i in range(worker_count)]
+    for reader in readers:
+        reader.start()
+    for _ in readers:
+        ready.acquire()
+    start.set()
+    kept_up = feed(client, events, args.rate, time.perf_counter() + args.seconds)
+    for reader in readers:
+        reader.join()
+    publisher.close()
+    return sum(counts) / args.seconds, kept_up
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Shared memory books for multi process API serving')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--rate', type=float, default=20000, help='Feed events per second')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    events = list(generate_events(args.events, args.seed))
+    print('{} cpus, feed at {:,.0f} events/s'.format(os.cpu_count(), args.rate))
+    for worker_count in args.workers:
+        (thread_rate, thread_kept_up) = run_threads(events, worker_count, args)
+        (process_rate, process_kept_up) = run_processes(events, worker_count, args)
+        print('{} workers  threads in feed process {:>9,.0f} reads/s, feed {:>4.0%} on schedule   '
+              'shared memory processes {:>9,.0f} reads/s, feed {:>4.0%} on schedule'.format(
+                  worker_count, thread_rate, thread_kept_up, process_rate, process_kept_up))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# benchmarks/bench_stream.py
+# original author: Jacob Brown
+#
+#
+# Load test for the top of book stream (see level_stream.py) -> the seeded synthetic full channel stream is fed through
+# on_message at a steady rate, with no subscribers and then with hundreds of simulated subscribers reading alongside
+# it, and the feed thread's time per event is compared. Subscribers are a mix of prompt readers, slow readers
+# (conflated) and readers that stop reading altogether (dropped). Run from the repo root with:
+#     python -m benchmarks.bench_stream [--subscribers 300] [--events 200000] [--rate 50000]
+
+import sys
+import time
+import argparse
+from threading import Thread
+from market_data_feed.level_stream import LevelStream
+from market_data_feed.market_data_feed_client import MarketDataFeedClient
+from benchmarks.synthetic_feed import generate_events
+
+
+class SimulatedSubscriber:
+
+    def __init__(self, stream, kind, level_count, conflation_interval, read_delay):
+        self.subscription = stream.subscribe(level_count=level_count, conflation_interval=conflation_interval)
+        self.kind = kind
+        self.read_delay = read_delay  # Seconds each message takes to "send", None to stop after the first
+        self.message_count = 0
+        self.byte_count = 0
+        self.thread = Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        subscription = self.subscription
+        while not subscription.closed:
+            message = subscription.next_message(0.5)
+            if message is None:
+                continue
+            self.message_count += 1
+            self.byte_count += len(message)
+            if self.read_delay is None:
+                return  # Stalled -> never comes back, so the stream drops it
+            if self.read_delay:
+                time.sleep(self.read_delay)
+
+
+def run_feed(events, subscriber_count, args):
+    # Feed thread nanoseconds per event, paced at <args.rate> events/s while <subscriber_count> subscribers read
+    client = MarketDataFeedClient(max_levels=args.levels * 2)
+    client.book_manager.reset()
+    stream = LevelStream(client, stall_timeout=args.stall_timeout, max_subscriptions=subscriber_count + 1)
+    subscribers = []
+    for i in range(subscriber_count):
+        if i % 20 == 0:
+            subscribers.append(SimulatedSubscriber(stream, 'stalled', args.levels, args.interval, None))
+        elif i % 20 < 4:
+            subscribers.append(SimulatedSubscriber(stream, 'slow', args.levels, 0, args.slow_delay))
+        else:
+            subscribers.append(SimulatedSubscriber(stream, 'prompt', args.levels, args.interval, 0))
+
+    on_message = client.on_message
+    batch_size = 100
+    busy = 0.0
+    max_lag = 0.0
+    start = time.perf_counter()
+    for i in range(0, len(events), batch_size):
+        # Waits for each batch's scheduled time, so only time spent in on_message counts as busy
+        lag = time.perf_counter() - start - i / args.rate
+        if lag < 0:
+            time.sleep(-lag)
+        max_lag = max(max_lag, lag)
+        batch_start = time.perf_counter()
+        for event in events[i:i + batch_size]:
+            on_message(event)
+        busy += time.perf_counter() - batch_start
+    elapsed = time.perf_counter() - start
+    stats = stream.get_stats()
+    stream.close()
+    for subscriber in subscribers:
+        subscriber.thread.join()
+    return (busy / len(events) * 1e9, max_lag, elapsed, stats, subscribers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Top of book stream load test')
+    parser.add_argument('--subscribers', type=int, default=300)
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--rate', type=float, default=50000, help='Feed events per second')
+    parser.add_argument('--levels', type=int, default=10)
+    parser.add_argument('--interval', type=float, default=0.1, help='Conflation interval of prompt subscribers')
+    parser.add_argument('--slow-delay', type=float, default=0.5, help='Seconds slow subscribers take per message')
+    parser.add_argument('--stall-timeout', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    events = list(generate_events(args.events, args.seed))
+
+    # Unloaded and loaded runs alternate, so drifting machine load hits both alike, and the best of each is kept
+    baseline_ns = loaded = None
+    for _ in range(args.repeat):
+        elapsed_ns = run_feed(events, 0, args)[0]
+        baseline_ns = elapsed_ns if baseline_ns is None else min(baseline_ns, elapsed_ns)
+        result = run_feed(events, args.subscribers, args)
+        if (loaded is None) or (result[0] < loaded[0]):
+            loaded = result
+    (loaded_ns, max_lag, elapsed, stats, subscribers) = loaded
+
+    print('feed at {:,.0f} events/s for {:.1f} s'.format(args.rate, elapsed))
+    print('feed thread, no subscribers   {:>8,.0f} ns/event'.format(baseline_ns))
+    print('feed thread, {:>4} subscribers {:>8,.0f} ns/event  ({:+.1%}), at most {:,.1f} ms behind schedule'.format(
+        args.subscribers, loaded_ns, loaded_ns / baseline_ns - 1, max_lag * 1000))
+    print('snapshots published {:>8,}, subscribers dropped {:,}, book versions conflated {:,}'.format(
+        stats['publish_count'], stats['dropped_subscription_count'], stats['skipped_version_count']))
+    for kind in ('prompt', 'slow', 'stalled'):
+        group = [subscriber for subscriber in subscribers if subscriber.kind == kind]
+        if not group:
+            continue
+        message_count = sum(subscriber.message_count for subscriber in group)
+        byte_count = sum(subscriber.byte_count for subscriber in group)
+        print('{:<8} x{:<4} messages/subscriber/s {:>7,.1f}  bytes/message {:>6,.0f}'.format(
+            kind, len(group), message_count / len(group) / elapsed, byte_count / max(message_count, 1)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# benchmarks/bench_trade_tape.py
+# original author: Jacob Brown
+#
+#
+# Cost of keeping the trade tape and its OHLCV bars (see trade_tape.py) over the seeded synthetic full channel stream:
+#     apply           -> ProductBook.handle_event per event, with the tape's recording switched off and on, interleaved
+#     record          -> TradeTape.record_match per match event alone
+#     bars query      -> TradeTape.get_bars for the last 60 1m bars, against working the same bars out by scanning
+#                        every kept trade
+# Run from the repo root with:
+#     python -m benchmarks.bench_trade_tape [--events 200000] [--repeat 5]
+
+import sys
+import time
+import argparse
+import numpy as np
+from market_data_feed.order_book import OrderBook
+from market_data_feed.order_book_manager import ProductBook
+from market_data_feed.trade_tape import TradeTape
+from benchmarks.synthetic_feed import generate_events
+
+
+def run_apply(events, record):
+    product_book = ProductBook('BTC-USD', OrderBook(max_levels=15))
+    if not record:
+        product_book.trade_tape.record_match = lambda event: None
+    handle_event = product_book.handle_event
+    start = time.perf_counter()
+    for event in events:
+        handle_event(event)
+    return time.perf_counter() - start
+
+
+def run_record(matches):
+    record_match = TradeTape().record_match
+    start = time.perf_counter()
+    for event in matches:
+        record_match(event)
+    return time.perf_counter() - start
+
+
+def scan_bars(trade_tape, resolution_ns, count):
+    # The last <count> bars worked out from every kept trade, as a consumer of the raw tape would
+    trades = trade_tape.get_trades()
+    starts = trades['time'] - trades['time'] % resolution_ns
+    (bar_starts, first, trade_counts) = np.unique(starts, return_index=True, return_counts=True)
+    last = first + trade_counts - 1
+    prices = trades['price']
+    return list(zip(bar_starts, prices[first], np.maximum.reduceat(prices, first),
+                    np.minimum.reduceat(prices, first), prices[last], np.add.reduceat(trades['size'], first),
+                    trade_counts))[-count:]
+
+
+def time_query(query, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        query()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Trade tape and OHLCV bar overhead')
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    events = list(generate_events(args.events, args.seed))
+    matches = [event for event in events if event['type'] == 'match']
+
+    # Best of <repeat>, configurations interleaved within each round so drift hits them all alike
+    best = {}
+    for _ in range(args.repeat):
+        for (name, run) in [('apply without tape', lambda: run_apply(events, False)),
+                            ('apply with tape', lambda: run_apply(events, True)),
+                            ('record', lambda: run_record(matches))]:
+            elapsed = run()
+            best[name] = min(best.get(name, elapsed), elapsed)
+
+    print('{:,} events, {:,} matches'.format(len(events), len(matches)))
+    for name in ('apply without tape', 'apply with tape'):
+        print('{:<20} {:>8,.0f} ns/event'.format(name, best[name] / len(events) * 1e9))
+    print('{:<20} {:>+8,.0f} ns/event'.format('tape adds', (best['apply with tape'] - best['apply without tape']) /
+                                              len(events) * 1e9))
+    print('{:<20} {:>8,.0f} ns/match'.format('record', best['record'] / len(matches) * 1e9))
+
+    trade_tape = TradeTape()
+    for event in matches:
+        trade_tape.record_match(event)
+    incremental = time_query(lambda: trade_tape.get_bars('1m', 60))
+    scanned = time_query(lambda: scan_bars(trade_tape, 60 * 1000000000, 60))
+    print('{:<20} {:>8,.1f} us incremental  {:>8,.1f} us scanning {:,} trades'.format(
+        '60 1m bars', incremental * 1e6, scanned * 1e6, min(len(matches), trade_tape.capacity)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# benchmarks/feed_stub.py
+# original author: Jacob Brown
+#
+#
+# Local stand-in for the Coinbase WebSocket feed. Every connection that sends a subscribe message gets an endless
+# stream of synthetic full channel frames at a fixed rate. Run from the repo root with:
+#     python -m benchmarks.feed_stub --port 8765 --rate 100
+
+import sys
+import asyncio
+import argparse
+import itertools
+import websockets
+from benchmarks.bench_decode import generate_frames
+
+
+async def serve(host, port, rate, frames):
+    # Frames go out in bursts every 10 ms to keep the server's own timer overhead down
+    burst_interval = 0.01
+    burst_size = max(1, int(rate * burst_interval))
+
+    async def handle(ws, *args):
+        await ws.recv()  # Subscribe message
+        stream = itertools.cycle(frames)
+        try:
+            while True:
+                for frame in itertools.islice(stream, burst_size):
+                    await ws.send(frame)
+                await asyncio.sleep(burst_interval)
+        except websockets.ConnectionClosed:
+            pass
+
+    async with websockets.serve(handle, host, port, max_size=None):
+        await asyncio.Future()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in for the Coinbase WebSocket feed')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=int, default=100, help='Frames per second sent to each connection')
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.rate, generate_frames(10000)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+# benchmarks/run_suite.py
+# original author: Jacob Brown
+#
+#
+# OrderBook benchmark suite over a seeded synthetic feed (see synthetic_feed.py). For each book configuration it
+# measures handle_event throughput, per-event latency percentiles, peak traced memory, and
+# MarketDataFeedClient.get_inside_levels_printout latency. Results are written as JSON so runs can be compared between
+# commits. Run from the repo root with:
+#     python -m benchmarks.run_suite                                  -> benchmarks/results/<commit>.json
+#     python -m benchmarks.run_suite --compare benchmarks/results/<baseline commit>.json
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import subprocess
+import tracemalloc
+from market_data_feed.order_book import OrderBook
+from market_data_feed.market_data_feed_client import MarketDataFeedClient
+from benchmarks.synthetic_feed import generate_events
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+FIXED_POINT = {'tick_size': '0.01', 'lot_size': '0.00000001'}
+
+# List<Pair<String, Dict>> -> ( Scenario Name , OrderBook Keyword Arguments )
+SCENARIOS = [('levels_15', {'max_levels': 15}),
+             ('levels_500', {'max_levels': 500}),
+             ('full_depth', {'full_depth': True}),
+             ('levels_15_fixed', dict(max_levels=15, **FIXED_POINT)),
+             ('levels_500_fixed', dict(max_levels=500, **FIXED_POINT)),
+             ('full_depth_fixed', dict(full_depth=True, **FIXED_POINT))]
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Metrics where a larger value is better, everything else is a cost
+HIGHER_IS_BETTER = ('events_per_sec',)
+
+# Metrics reported by --compare but never flagged -> book shape, and single worst samples (mostly scheduler noise)
+UNGATED_METRICS = ('final_level_count', 'final_order_count')
+UNGATED_PERCENTILES = ('max',)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    summary = {'p{}'.format(p): samples[min(len(samples) - 1, int(len(samples) * p / 100))] for p in PERCENTILES}
+    summary['max'] = samples[-1]
+    return summary
+
+
+def timer_overhead_ns(samples=100000):
+    # Median cost of the perf_counter_ns pair around every timed call, included in every latency reported
+    clock = time.perf_counter_ns
+    costs = []
+    for _ in range(samples):
+        start = clock()
+        costs.append(clock() - start)
+    return sorted(costs)[len(costs) // 2]
+
+
+def measure_throughput(events, book_kwargs, repeat):
+    # Best of <repeat> runs, each on a fresh book, to keep scheduler noise out of the comparison
+    best_elapsed = None
+    for _ in range(repeat):
+        order_book = OrderBook(**book_kwargs)
+        handle_event = order_book.handle_event
+        start = time.perf_counter()
+        for event in events:
+            handle_event(event)
+        elapsed = time.perf_counter() - start
+        if best_elapsed is None or elapsed < best_elapsed:
+            best_elapsed = elapsed
+    return {'events_per_sec': len(events) / best_elapsed,
+            'final_level_count': len(order_book.best_ask_levels) + len(order_book.best_bid_levels),
+            'final_order_count': len(order_book.ask_ids) + len(order_book.bid_ids)}
+
+
+def measure_event_latency(events, book_kwargs):
+    order_book = OrderBook(**book_kwargs)
+    handle_event = order_book.handle_event
+    clock = time.perf_counter_ns
+    latencies = [0] * len(events)
+    for (i, event) in enumerate(events):
+        start = clock()
+        handle_event(event)
+        latencies[i] = clock() - start
+    return {'event_latency_ns': percentiles(latencies)}
+
+
+def measure_memory(events, book_kwargs):
+    # Traced Python allocations while building the book -> peak during the run and what the book retains at the end
+    tracemalloc.start()
+    order_book = OrderBook(**book_kwargs)
+    for event in events:
+        order_book.handle_event(event)
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'peak_memory_bytes': peak, 'retained_memory_bytes': current}
+
+
+def measure_printout_latency(events, book_kwargs, level_count, interval):
+    # Printout after every <interval> events, so the client's cache is (almost) always stale and the rendering is timed
+    client = MarketDataFeedClient(level_count=level_count, max_levels=max(level_count, 15))
+    client.order_book = OrderBook(**book_kwargs)
+    handle_event = client.order_book.handle_event
+    clock = time.perf_counter_ns
+    latencies = []
+    for (i, event) in enumerate(events):
+        handle_event(event)
+        if i % interval == 0:
+            start = clock()
+            client.get_inside_levels_printout(level_count)
+            latencies.append(clock() - start)
+    return percentiles(latencies)
+
+
+def run_suite(event_count, seed, repeat, level_counts, printout_interval, scenario_names=None):
+    events = generate_events(event_count, seed)
+    results = {}
+    for (name, book_kwargs) in SCENARIOS:
+        if scenario_names and name not in scenario_names:
+            continue
+        result = {'book_kwargs': book_kwargs}
+        result.update(measure_throughput(events, book_kwargs, repeat))
+        result.update(measure_event_latency(events, book_kwargs))
+        result.update(measure_memory(events, book_kwargs))
+        for level_count in level_counts:
+            result['printout_latency_ns_{}'.format(level_count)] = measure_printout_latency(
+                events, book_kwargs, level_count, printout_interval)
+        results[name] = result
+        print('{:<18} events/sec={:>10,.0f}  p50={:>5}ns  p99={:>6}ns  peak_memory={:>8,.0f}KB'.format(
+            name, result['events_per_sec'], result['event_latency_ns']['p50'], result['event_latency_ns']['p99'],
+            result['peak_memory_bytes'] / 1e3), flush=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def flatten(result, prefix=''):
+    # Dict<String, Float> -> nested metrics keyed by their path (ex: "event_latency_ns.p99")
+    metrics = {}
+    for (key, value) in result.items():
+        if isinstance(value, dict):
+            if key != 'book_kwargs':
+                metrics.update(flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)):
+            metrics[prefix + key] = value
+    return metrics
+
+
+def compare(baseline, current, threshold):
+    # Prints the change in every metric, flagging those worse than the baseline by more than <threshold> (a fraction).
+    # Returns the number of regressions.
+    regression_count = 0
+    for (name, result) in current['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if baseline_result is None:
+            continue
+        baseline_metrics = flatten(baseline_result)
+        for (metric, value) in flatten(result).items():
+            baseline_value = baseline_metrics.get(metric)
+            if not baseline_value:
+                continue
+            change = (value - baseline_value) / baseline_value
+            (metric_name, _, percentile) = metric.partition('.')
+            worse = -change if metric_name in HIGHER_IS_BETTER else change
+            gated = (metric_name not in UNGATED_METRICS) and (percentile not in UNGATED_PERCENTILES)
+            flag = ''
+            if gated and (worse > threshold):
+                flag = '  <- REGRESSION'
+                regression_count += 1
+            print('{:<18} {:<32} {:>14,.0f} -> {:>14,.0f}  {:>+7.1%}{}'.format(
+                name, metric, baseline_value, value, change, flag))
+    return regression_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='OrderBook benchmark suite')
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scenarios', nargs='+', choices=[name for (name, _) in SCENARIOS])
+    parser.add_argument('--level-counts', type=int, nargs='+', default=[5, 50], help='Printout depths measured')
+    parser.add_argument('--printout-interval', type=int, default=10, help='Events between timed printouts')
+    parser.add_argument('--output', help='Results file, defaults to benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', help='Baseline results file to compare this run against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Change flagged as a regression (0.10 = 10%%)')
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    report = {'commit': commit,
+              'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'settings': {'events': args.events, 'seed': args.seed, 'repeat': args.repeat,
+                           'printout_interval': args.printout_interval},
+              'timer_overhead_ns': timer_overhead_ns()}
+    report['results'] = run_suite(args.events, args.seed, args.repeat, args.level_counts, args.printout_interval,
+                                  args.scenarios)
+
+    output = args.output or os.path.join(RESULTS_DIRECTORY, '{}.json'.format(commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to {}'.format(output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print('\nCompared to {} ({}):'.format(baseline.get('commit'), args.compare))
+        if baseline.get('settings') != report['settings']:
+            print('Warning: baseline ran with different settings {}'.format(baseline.get('settings')))
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# benchmarks/synthetic_feed.py
+# original author: Jacob Brown
+#
+#
+# Seeded generator for a realistic synthetic `full` channel stream of one product. Every limit order arrives as a
+# `received` then `open` pair, and its price offset from the mid falls off geometrically so most resting size sits near
+# the inside. The mid takes a random walk with occasional jumps. Order lifetimes are lognormal, so most orders are
+# cancelled within a few hundred milliseconds and a long tail rests for minutes. Taker orders fill against the best
+# resting order on the other side with `match` events, finishing fully filled makers with a `done`. The same seed
+# always produces the same stream.
+
+import heapq
+import random
+import datetime
+
+_EPOCH = datetime.datetime(2020, 3, 21, 14, 30, tzinfo=datetime.timezone.utc)
+
+
+class SyntheticFeed:
+
+    def __init__(self,
+                 seed=1,
+                 product_id='BTC-USD',
+                 start_price=10000.0,
+                 tick=0.01,
+                 price_places=2,
+                 size_places=8,
+                 depth_ticks=400,  # Mean offset of a new order from the mid, in ticks
+                 volatility_ticks=0.6,  # Standard deviation of the mid's step per event, in ticks
+                 jump_probability=0.0005,  # Chance per event that the mid jumps by ~50 ticks instead
+                 lifetime_median=0.3,  # Median seconds an order rests before being cancelled
+                 lifetime_sigma=2.0,  # Lognormal spread of order lifetimes
+                 taker_probability=0.12,  # Chance per event that a taker order arrives rather than a maker order
+                 events_per_second=2000):  # Mean feed rate, drives the exchange timestamps
+        self.rng = random.Random(seed)
+        self.product_id = product_id
+        self.mid = start_price
+        self.tick = tick
+        self.price_format = '%.{}f'.format(price_places)
+        self.size_format = '%.{}f'.format(size_places)
+        self.depth_ticks = depth_ticks
+        self.volatility_ticks = volatility_ticks
+        self.jump_probability = jump_probability
+        self.lifetime_median = lifetime_median
+        self.lifetime_sigma = lifetime_sigma
+        self.taker_probability = taker_probability
+        self.event_interval = 1.0 / events_per_second
+
+        self.clock = 0.0  # Seconds since _EPOCH
+        self.sequence = 0
+        self.next_order_id = 0
+        self._pending = []  # Events from the current step not handed out yet
+
+        # Dict<String, List> -> {Order Id : [ Side , Price , Remaining Size ]}
+        self.resting = {}
+        # Heap<Tuple<Float, String>> -> ( Cancel Time , Order Id ), entries for filled orders are skipped when popped
+        self._expiries = []
+        # Heap<Tuple<Float, Int, String>> per side -> ( Priority , Arrival , Order Id ), best price first
+        self._best = {'buy': [], 'sell': []}
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # One step can emit several events (ex: received + open) or none, so they're queued and handed out one at a time
+        while not self._pending:
+            self._step()
+        return self._pending.pop(0)
+
+    def _step(self):
+        rng = self.rng
+        self.clock += rng.expovariate(1.0 / self.event_interval)
+
+        if rng.random() < self.jump_probability:
+            self.mid += rng.choice((-50, 50)) * self.tick
+        else:
+            self.mid += rng.gauss(0.0, self.volatility_ticks) * self.tick
+
+        # Cancel every order whose lifetime is up
+        expiries = self._expiries
+        while expiries and expiries[0][0] <= self.clock:
+            (_, order_id) = heapq.heappop(expiries)
+            order = self.resting.pop(order_id, None)
+            if order is not None:
+                self._emit({'type': 'done', 'order_id': order_id, 'side': order[0], 'price': order[1],
+                            'remaining_size': self.size_format % order[2], 'reason': 'canceled'})
+
+        if rng.random() < self.taker_probability:
+            self._take(rng)
+        else:
+            self._make(rng)
+
+    def _make(self, rng):
+        side = 'sell' if rng.random() < 0.5 else 'buy'
+        offset = int(rng.expovariate(1.0 / self.depth_ticks)) + 1
+        price_value = self.mid + offset * self.tick if side == 'sell' else self.mid - offset * self.tick
+        price = self.price_format % price_value
+        size = round(rng.lognormvariate(-2.0, 1.2), 8) + 0.00000001
+        order_id = 'o{}'.format(self.next_order_id)
+        self.next_order_id += 1
+
+        self._emit({'type': 'received', 'order_id': order_id, 'side': side, 'price': price,
+                    'size': self.size_format % size, 'order_type': 'limit'})
+        self._emit({'type': 'open', 'order_id': order_id, 'side': side, 'price': price,
+                    'remaining_size': self.size_format % size})
+
+        self.resting[order_id] = [side, price, size]
+        lifetime = rng.lognormvariate(0.0, self.lifetime_sigma) * self.lifetime_median
+        heapq.heappush(self._expiries, (self.clock + lifetime, order_id))
+        priority = price_value if side == 'sell' else -price_value
+        heapq.heappush(self._best[side], (priority, self.next_order_id, order_id))
+
+    def _take(self, rng):
+        # Taker buys lift the best ask and taker sells hit the best bid, walking the book until filled
+        maker_side = 'sell' if rng.random() < 0.5 else 'buy'
+        remaining = round(rng.lognormvariate(-2.5, 1.0), 8) + 0.00000001
+        best = self._best[maker_side]
+        while remaining > 0 and best:
+            order_id = best[0][2]
+            order = self.resting.get(order_id)
+            if order is None:
+                heapq.heappop(best)  # Already cancelled
+                continue
+
+            fill = min(remaining, order[2])
+            remaining = round(remaining - fill, 8)
+            order[2] = round(order[2] - fill, 8)
+            self._emit({'type': 'match', 'maker_order_id': order_id, 'taker_order_id': 't{}'.format(self.sequence),
+                        'side': maker_side, 'price': order[1], 'size': self.size_format % fill})
+            if order[2] <= 0:
+                heapq.heappop(best)
+                del self.resting[order_id]
+                self._emit({'type': 'done', 'order_id': order_id, 'side': maker_side, 'price': order[1],
+                            'remaining_size': self.size_format % 0, 'reason': 'filled'})
+
+    def _emit(self, event):
+        self.sequence += 1
+        event['product_id'] = self.product_id
+        event['sequence'] = self.sequence
+        event['time'] = (_EPOCH + datetime.timedelta(seconds=self.clock)).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        self._pending.append(event)
+
+
+def generate_events(event_count, seed=1, **feed_kwargs):
+    feed = SyntheticFeed(seed, **feed_kwargs)
+    return [next(feed) for _ in range(event_count)]
@@ -0,0 +1,151 @@
+# market_data_feed/async_websocket_client.py
+# original author: Jacob Brown
+#
+#
+# asyncio counterpart to WebSocketClient with the same on_open/on_message/on_error/on_close hooks. Every client runs as
+# a task on one shared event loop thread rather than a listener and pinger thread pair per connection, and keepalive
+# pings are timers on that loop, so close() returns as soon as the socket has closed.
+
+import json
+import asyncio
+import logging
+from threading import Thread, Lock
+import websockets
+from . import decoders
+
+
+class EventLoopThread:
+    # Background thread running an asyncio event loop that any number of clients can share
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, coroutine):
+        # concurrent.futures.Future, so callers on other threads can wait on the result
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+_shared_loop_thread = None
+_shared_loop_lock = Lock()
+
+
+def get_shared_loop_thread():
+    global _shared_loop_thread
+    with _shared_loop_lock:
+        if _shared_loop_thread is None:
+            _shared_loop_thread = EventLoopThread()
+        return _shared_loop_thread
+
+
+class AsyncWebSocketClient(object):
+    def __init__(
+            self,
+            url="wss://ws-feed.pro.coinbase.com",
+            products=None,
+            message_type="subscribe",
+            channels=None,
+            decoder='auto',  # Decoder name (see decoders.py) or callable taking a raw frame and returning a dict
+            ping_interval=30,  # Seconds between keepalive pings
+            loop_thread=None):  # EventLoopThread to run on, defaults to one shared by every client
+        self.url = url
+        self.products = products
+        self.channels = channels
+        self.type = message_type
+        self.ping_interval = ping_interval
+        self.loop_thread = loop_thread
+        self.stop = True
+        self.error = None
+        self.ws = None
+        self.future = None
+        self.decode_error_count = 0
+        self.decoder = decoders.get_decoder(decoder) if isinstance(decoder, str) else decoder
+
+    def start(self):
+        self.stop = False
+        self.error = None
+        self.on_open()
+        if self.loop_thread is None:
+            self.loop_thread = get_shared_loop_thread()
+        self.future = self.loop_thread.submit(self.run())
+
+    async def run(self):
+        # Can also be awaited directly, to drive clients from an event loop the caller owns
+        self.stop = False
+        try:
+            await self._connect()
+            await self._listen()
+        except Exception as e:
+            self.on_error(e)
+        finally:
+            await self._disconnect()
+
+    async def _connect(self):
+        if self.products is None:
+            self.products = ["BTC-USD"]
+        elif not isinstance(self.products, list):
+            self.products = [self.products]
+
+        if self.url[-1] == "/":
+            self.url = self.url[:-1]
+
+        if self.channels is None:
+            self.channels = [{"name": "ticker", "product_ids": [product_id for product_id in self.products]}]
+        sub_params = {"type": self.type, "product_ids": self.products, "channels": self.channels}
+
+        self.ws = await websockets.connect(self.url, ping_interval=self.ping_interval, max_size=None)
+        await self.ws.send(json.dumps(sub_params))
+
+    async def _listen(self):
+        decode = self.decoder
+        ws = self.ws
+        while not self.stop:
+            try:
+                data = await ws.recv()
+            except websockets.ConnectionClosed as e:
+                if not self.stop:
+                    self.on_error(e)
+                return
+            try:
+                msg = decode(data)
+            except ValueError as e:
+                self.on_decode_error(e, data)
+            else:
+                self.on_message(msg)
+
+    async def _disconnect(self):
+        if self.ws is not None:
+            await self.ws.close()
+        self.on_close()
+
+    def close(self, timeout=5):
+        self.stop = True
+        if (self.future is not None) and (self.ws is not None):
+            # Closing the socket wakes the pending recv, so the run task finishes right away
+            self.loop_thread.submit(self.ws.close())
+        if self.future is not None:
+            self.future.result(timeout)
+
+    def on_open(self):
+        logging.debug("-- Socket Opened --")
+
+    def on_close(self):
+        logging.debug("-- Socket Closed --")
+
+    def on_message(self, msg):
+        logging.debug(msg)
+
+    def on_decode_error(self, e, data):
+        # A malformed frame is skipped, the connection carries on
+        self.decode_error_count += 1
+        logging.warning("Skipping undecodable frame ({}): {}".format(e, data[:200]))
+
+    def on_error(self, e, data=None):
+        self.error = e
+        self.stop = True
+        logging.error("{} - data: {}".format(e, data))
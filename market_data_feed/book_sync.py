@@ -0,0 +1,165 @@
+# market_data_feed/book_sync.py
+# original author: Jacob Brown
+#
+#
+# Keeps an OrderBook consistent with the `full` channel by seeding it from a level 3 snapshot and checking the exchange
+# `sequence` of every event. Events are buffered while a snapshot loads, only those newer than the snapshot are applied,
+# and any gap in the sequence triggers an automatic resync. A failed snapshot load is retried with exponential backoff,
+# and a buffer that outgrows <max_buffered_count> (ex: through a long snapshot outage) is dropped and started over.
+
+import time
+import logging
+from threading import Thread
+from . import time_util
+
+
+class BookSynchronizer:
+
+    def __init__(self,
+                 order_book,
+                 product_id,
+                 snapshot_loader,  # Callable taking a product id and returning a level 3 snapshot dict
+                 retry_delay=0.5,  # Seconds before retrying a failed snapshot load, doubled after every failure
+                 max_retry_delay=30.0,
+                 max_buffered_count=100000,  # Most events buffered while a snapshot loads
+                 background_load=True):  # Load snapshots on a thread of their own, False loads them on the caller's
+        self.order_book = order_book
+        self.product_id = product_id
+        self.snapshot_loader = snapshot_loader
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_buffered_count = max_buffered_count
+        self.background_load = background_load
+
+        self.syncing = False
+        self._buffer = []
+        self._snapshot = None  # Set by the loader once the snapshot has been fetched
+        self._loader_thread = None  # Only with background_load
+        self._sync_start_time = None
+        self._retry_time = None  # Monotonic time the failed snapshot load is retried at, None unless one has failed
+        self._failed_load_count = 0  # Consecutive failed loads, sets the backoff
+
+        # Statistics
+        self.resync_count = 0
+        self.sequence_gap_count = 0
+        self.stale_message_count = 0
+        self.last_resync_time_ms = None
+        self.last_resync_buffered_count = 0
+        self.last_resync_completed_ms = None  # Epoch ms the book was last brought up to date
+        self.failed_load_count = 0
+        self.buffer_overflow_count = 0
+
+    def handle_event(self, event):
+        if self.syncing:
+            # The snapshot is applied on the feed thread, with the first message that arrives after it has loaded
+            if len(self._buffer) >= self.max_buffered_count:
+                # Start the buffer over from this event. A snapshot older than it leaves a gap once replayed, which
+                # resyncs again.
+                self.buffer_overflow_count += 1
+                logging.warning("{} resync buffer passed {} messages, dropped".format(
+                    self.product_id, self.max_buffered_count))
+                self._buffer = []
+            self._buffer.append(event)
+            if self._snapshot is not None:
+                self._finish_resync()
+            elif (not self._loading()) and (self._snapshot is None):
+                # Loader finished without a snapshot (error already logged) -> try again once the backoff is up,
+                # buffering in the meantime. Snapshot is checked again since the loader may have finished between the
+                # two checks.
+                self._retry_load()
+            return
+
+        sequence = event.get('sequence')
+        if sequence is None:
+            return  # Not an order book event (ex: `subscriptions`)
+
+        book_sequence = self.order_book.sequence
+        if book_sequence is None:
+            # Book has never been seeded -> bootstrap from a snapshot
+            self.resync(event)
+        elif sequence <= book_sequence:
+            self.stale_message_count += 1  # Duplicate or reordered message already covered by the book
+        elif sequence != book_sequence + 1:
+            self.sequence_gap_count += 1
+            logging.warning("Sequence gap on {} book: expected {}, received {}".format(
+                self.product_id, book_sequence + 1, sequence))
+            self.resync(event)
+        else:
+            self.order_book.handle_event(event)
+            self.order_book.sequence = sequence
+
+    def resync(self, event=None):
+        self.syncing = True
+        self._buffer = [] if event is None else [event]
+        self._snapshot = None
+        self._sync_start_time = time_util.current_milli_time()
+        if self._retry_time is None:
+            self._start_loader()
+        # Otherwise a failed load is still backing off -> the retry loads the snapshot for this resync
+
+    def get_stats(self):
+        return {'syncing': self.syncing,
+                'sequence': self.order_book.sequence,
+                'resync_count': self.resync_count,
+                'sequence_gap_count': self.sequence_gap_count,
+                'stale_message_count': self.stale_message_count,
+                'last_resync_time_ms': self.last_resync_time_ms,
+                'last_resync_completed_ms': self.last_resync_completed_ms,
+                'last_resync_buffered_count': self.last_resync_buffered_count,
+                'failed_load_count': self.failed_load_count,
+                'buffer_overflow_count': self.buffer_overflow_count}
+
+    def _start_loader(self):
+        # Fetch in the background so the feed thread keeps reading (and buffering) messages while the snapshot loads.
+        # Loaded in place otherwise (ex: replaying a file), so the same events always meet the snapshot at the same
+        # point.
+        if not self.background_load:
+            self._load_snapshot()
+            return
+        self._loader_thread = Thread(target=self._load_snapshot, daemon=True)
+        self._loader_thread.start()
+
+    def _loading(self):
+        return (self._loader_thread is not None) and self._loader_thread.is_alive()
+
+    def _retry_load(self):
+        now = time.monotonic()
+        if self._retry_time is None:
+            self.failed_load_count += 1
+            self._failed_load_count += 1
+            delay = min(self.retry_delay * 2 ** (self._failed_load_count - 1), self.max_retry_delay)
+            self._retry_time = now + delay
+            logging.warning("Retrying {} snapshot load in {:.1f} s".format(self.product_id, delay))
+        if now >= self._retry_time:
+            self._retry_time = None
+            self._start_loader()
+
+    def _load_snapshot(self):
+        try:
+            self._snapshot = self.snapshot_loader(self.product_id)
+        except Exception as e:
+            logging.error("Failed to load {} snapshot: {}".format(self.product_id, e))
+
+    def _finish_resync(self):
+        snapshot = self._snapshot
+        self._snapshot = None
+        self._failed_load_count = 0
+        self.order_book.load_snapshot(snapshot)
+
+        buffered = self._buffer
+        self._buffer = []
+        self.syncing = False
+        for event in buffered:
+            sequence = event.get('sequence')
+            if (sequence is not None) and (sequence > self.order_book.sequence):
+                # Goes through the normal path, so a gap between the snapshot and the buffer restarts the resync
+                self.handle_event(event)
+        if self.syncing:
+            return  # Gap found while replaying the buffer -> stats are recorded once the new resync completes
+
+        self.resync_count += 1
+        self.last_resync_buffered_count = len(buffered)
+        self.last_resync_completed_ms = time_util.current_milli_time()
+        self.last_resync_time_ms = self.last_resync_completed_ms - self._sync_start_time
+        logging.info("Resynced {} book to sequence {} in {} ms, {} messages buffered".format(
+            self.product_id, self.order_book.sequence, self.last_resync_time_ms, self.last_resync_buffered_count))
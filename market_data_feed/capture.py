@@ -0,0 +1,150 @@
+# market_data_feed/capture.py
+# original author: Jacob Brown
+#
+#
+# Raw feed capture. FrameRecorder appends every frame the WebSocketClient receives, with its receive time, to gzip
+# compressed, append-only log files that rotate by size and age. Each line of a capture is
+#     <receive time in ns since the epoch>\t<raw frame>
+# which is safe since compact JSON frames never contain a raw tab or newline. See replay.py to play a capture back.
+# Run a standalone capture with:
+#     market-data-capture --products BTC-USD ETH-USD --directory captures
+
+import os
+import sys
+import gzip
+import glob
+import time
+import logging
+import argparse
+from threading import Lock
+from . import websocket_client as wc
+
+CAPTURE_SUFFIX = '.log.gz'
+
+
+class FrameRecorder:
+
+    def __init__(self,
+                 directory,
+                 prefix='feed',
+                 max_bytes=256 * 1024 * 1024,  # Uncompressed bytes written before rotating to a new file
+                 max_seconds=3600,  # Age of a file before rotating to a new one
+                 flush_interval=1.0,  # Seconds between flushes, bounding what a crash can lose
+                 compress_level=1):  # Capture runs on the receive thread, so favour speed over ratio
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.flush_interval = flush_interval
+        self.compress_level = compress_level
+
+        self.path = None
+        self._file = None
+        self._lock = Lock()  # record() may be called from several client threads
+        self._bytes_written = 0
+        self._opened_at = 0.0
+        self._last_flush = 0.0
+
+        # Statistics
+        self.frame_count = 0
+        self.file_count = 0
+
+    def record(self, frame, receive_time_ns=None):
+        if receive_time_ns is None:
+            receive_time_ns = time.time_ns()
+        if isinstance(frame, bytes):
+            frame = frame.decode('utf-8')
+        line = '{}\t{}\n'.format(receive_time_ns, frame).encode('utf-8')
+
+        with self._lock:
+            now = time.monotonic()
+            if ((self._file is None) or (self._bytes_written >= self.max_bytes) or
+                    (now - self._opened_at >= self.max_seconds)):
+                self._rotate(now)
+            self._file.write(line)
+            self._bytes_written += len(line)
+            self.frame_count += 1
+            if now - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = now
+
+    def close(self):
+        # Next record() starts a new file
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _rotate(self, now):
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Names sort in capture order -> <prefix>-<UTC start time>-<file number>.log.gz
+        self.file_count += 1
+        name = '{}-{}-{:04d}{}'.format(self.prefix, time.strftime('%Y%m%dT%H%M%S', time.gmtime()), self.file_count,
+                                       CAPTURE_SUFFIX)
+        self.path = os.path.join(self.directory, name)
+        self._file = gzip.open(self.path, 'ab', compresslevel=self.compress_level)
+        self._bytes_written = 0
+        self._opened_at = now
+        self._last_flush = now
+        logging.info("Capturing feed to {}".format(self.path))
+
+
+def list_capture_files(path):
+    # A single capture file, or every capture file in a directory in capture order
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*' + CAPTURE_SUFFIX)))
+    return [path]
+
+
+def read_capture(paths):
+    # Iterator<Pair<Int, String>> -> ( receive time ns , raw frame ) for every frame in <paths>, in order. A line cut
+    # short by a crash mid-write ends its file.
+    if isinstance(paths, str):
+        paths = list_capture_files(paths)
+    for path in paths:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    (receive_time_ns, tab, frame) = line.rstrip('\n').partition('\t')
+                    if not tab:
+                        break
+                    yield int(receive_time_ns), frame
+            except EOFError:
+                logging.warning("Capture file {} is truncated".format(path))
+
+
+class CaptureClient(wc.WebSocketClient):
+    # Records the `full` channel without maintaining any books
+
+    def on_message(self, msg):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Capture raw Coinbase full channel frames to rotating gzip logs')
+    parser.add_argument('--products', nargs='+', default=['BTC-USD'])
+    parser.add_argument('--directory', default='captures')
+    parser.add_argument('--prefix', default='feed')
+    parser.add_argument('--max-mb', type=int, default=256, help='Uncompressed MB per file before rotating')
+    parser.add_argument('--max-minutes', type=int, default=60, help='Minutes per file before rotating')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)7s - %(message)s', level=logging.INFO)
+    recorder = FrameRecorder(args.directory, args.prefix, args.max_mb * 1024 * 1024, args.max_minutes * 60)
+    client = CaptureClient(products=args.products, channels=['full'], recorder=recorder)
+    client.start()
+    try:
+        while not client.stop:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        client.close()
+    recorder.close()
+    logging.info("Captured {} frames in {} files".format(recorder.frame_count, recorder.file_count))
+    return 1 if client.error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
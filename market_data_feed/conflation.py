@@ -0,0 +1,172 @@
+# market_data_feed/conflation.py
+# original author: Jacob Brown
+#
+#
+# Conflation stage between the order books and whatever consumes their top levels (ex: the client's level logging).
+# The feed thread reports each applied event, and at most <max_publish_rate> times a second per product the inside
+# levels are compared with the ones last published. Everything that changed since then goes out as one net delta per
+# price level, however many book updates made it up, and counters track how many raw updates were collapsed.
+#
+# The first change after a quiet spell is published straight away. Changes inside the window go out with the next event
+# after it closes or, when the book goes quiet before then, from a timer set for the window's close, so listeners always
+# end up with the trailing levels.
+
+import logging
+from time import monotonic
+from threading import RLock, Timer, current_thread
+
+
+def level_changes(sent, levels, removed_size=0):
+    # List<Pair> -> ( Price , Size ) of every level in <levels> that's new or resized since <sent> (Dict -> {Price :
+    # Size}), then ( Price , <removed_size> ) for every level in <sent> that's gone
+    changes = [level for level in levels if sent.get(level[0]) != level[1]]
+    if len(sent) > len(levels) - len(changes):
+        current = {price for (price, _) in levels}
+        changes.extend((price, removed_size) for price in sent if price not in current)
+    return changes
+
+
+class LevelUpdate:
+    # Net change to one product's inside levels since its previous LevelUpdate
+
+    __slots__ = ('product_id', 'version', 'asks', 'bids', 'update_count')
+
+    def __init__(self, product_id, version, asks, bids, update_count):
+        self.product_id = product_id
+        self.version = version  # Book version the levels were read at
+        self.asks = asks  # List<Pair<Decimal, Decimal>> -> ( Price , Size ) per changed level, size 0 when removed
+        self.bids = bids
+        self.update_count = update_count  # Raw book updates conflated into this one
+
+    def __repr__(self):
+        return "LevelUpdate({}, version={}, asks={}, bids={}, update_count={})".format(
+            self.product_id, self.version, self.asks, self.bids, self.update_count)
+
+
+class ConflatedPublisher:
+
+    def __init__(self,
+                 book_manager,  # OrderBookManager or ShardedOrderBookManager
+                 products,
+                 level_count=5,  # Inside levels per side watched for changes
+                 max_publish_rate=10.0):  # Most LevelUpdates per second per product, None to publish every change
+        self.book_manager = book_manager
+        self.level_count = level_count
+        self.max_publish_rate = max_publish_rate
+        self.publish_interval = 0.0 if max_publish_rate is None else 1.0 / max_publish_rate
+        self.listeners = []  # Callables taking a LevelUpdate, called on the feed thread (or the window close timer's)
+
+        # Dict<String, List> -> {Product Id : [ Next Publish Time , Pending Update Count , Book Version ,
+        #                                       Published Asks , Published Bids , Window Close Timer ]}, levels as
+        # Dict -> {Price : Size}, timer None unless changes are waiting on it
+        self._products = {product_id: [0.0, 0, None, {}, {}, None] for product_id in products}
+
+        # Serializes publishes from the feed thread and the timers. Reentrant, so a listener may call flush(). Pending
+        # update counts are bumped outside it, so a count may be off when a timer races the feed thread.
+        self._lock = RLock()
+
+        # Statistics, raw updates are counted once they've been published or collapsed
+        self.publish_count = 0
+        self.published_level_count = 0
+        self.collapsed_update_count = 0  # Raw updates that didn't get a LevelUpdate of their own
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def on_update(self, product_id):
+        # Called on the feed thread once an event for <product_id> has been applied to its book
+        state = self._products.get(product_id)
+        if state is None:
+            return  # Not a book event (ex: `subscriptions`)
+        # The lock is only taken to publish or set a timer, about once per window. Any change applied before this
+        # call is either read by a publish that starts after it or left to a timer set after it.
+        state[1] += 1
+        now = monotonic()
+        if now >= state[0]:
+            with self._lock:
+                if now >= state[0]:  # Not just published by the window close timer
+                    self._publish(product_id, state, now)
+        elif state[5] is None:
+            # Inside the window -> make sure it's published at the close even if no event follows
+            with self._lock:
+                if state[5] is None:
+                    timer = state[5] = Timer(state[0] - now, self._close_window, (product_id,))
+                    timer.daemon = True
+                    timer.start()
+
+    def flush(self, product_id=None):
+        # Publishes pending changes now, regardless of the rate limit
+        with self._lock:
+            now = monotonic()
+            for (pid, state) in self._products.items():
+                if ((product_id is None) or (pid == product_id)) and state[1]:
+                    self._publish(pid, state, now)
+
+    def reset(self):
+        # Next update of each product is published straight away (ex: once its book has been rebuilt), as a delta
+        # against the levels last published so listeners also see the levels that went away
+        with self._lock:
+            for state in self._products.values():
+                state[0] = 0.0
+
+    def close(self):
+        # Cancels the window close timers, pending changes stay pending until the next event or flush()
+        with self._lock:
+            for state in self._products.values():
+                if state[5] is not None:
+                    state[5].cancel()
+                    state[5] = None
+
+    def get_stats(self):
+        pending_update_count = sum(state[1] for state in self._products.values())
+        return {'max_publish_rate': self.max_publish_rate,
+                'update_count': self.publish_count + self.collapsed_update_count + pending_update_count,
+                'publish_count': self.publish_count,
+                'published_level_count': self.published_level_count,
+                'collapsed_update_count': self.collapsed_update_count,
+                'pending_update_count': pending_update_count}
+
+    def _close_window(self, product_id):
+        # Window close timer -> publishes whatever changed in the window, unless an event has already done so
+        with self._lock:
+            state = self._products[product_id]
+            if state[5] is not current_thread():
+                return  # Cancelled, or the window was published (and maybe a new one opened) while this one waited
+            self._publish(product_id, state, monotonic())
+
+    def _publish(self, product_id, state, now):
+        # Checked again at the earliest one interval on, whether or not the watched levels changed, so updates deeper
+        # in the book don't cost a level read each. Called holding the lock.
+        state[0] = now + self.publish_interval
+        if state[5] is not None:
+            # Cleared before the levels are read, so a change applied after the read sets a new timer
+            state[5].cancel()
+            state[5] = None
+        (version, asks, bids) = self.book_manager.get_inside_levels(product_id, self.level_count, state[2])
+        update_count = state[1]
+        state[1] = 0
+        if version == state[2]:
+            self.collapsed_update_count += update_count
+            return
+
+        ask_changes = level_changes(state[3], asks)
+        bid_changes = level_changes(state[4], bids)
+        state[2] = version
+        if (not ask_changes) and (not bid_changes):
+            self.collapsed_update_count += update_count
+            return
+        state[3] = dict(asks)
+        state[4] = dict(bids)
+        self.publish_count += 1
+        self.published_level_count += len(ask_changes) + len(bid_changes)
+        self.collapsed_update_count += update_count - 1
+
+        update = LevelUpdate(product_id, version, ask_changes, bid_changes, update_count)
+        for listener in self.listeners:
+            try:
+                listener(update)
+            except Exception as e:
+                logging.error("Level update listener failed: {}".format(e))
@@ -0,0 +1,81 @@
+# market_data_feed/decoders.py
+# original author: Jacob Brown
+#
+#
+# Frame decoders for WebSocketClient. Each is a callable taking one raw JSON frame and returning the message dict.
+# orjson is used when it's installed and the stdlib json module otherwise. The selective decoder skips the full decode
+# for the high volume message types the OrderBook ignores (ex: `received`, half of the `full` channel) and only skims
+# them for the few fields used for counting, routing and sequence checks.
+
+import re
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Message types the OrderBook has no use for beyond their sequence -> skimmed rather than decoded. Everything else
+# (including `error` and `subscriptions`) is decoded in full.
+SKIMMED_EVENT_TYPES = frozenset(('received', 'activate', 'heartbeat'))
+
+DECODER_NAMES = ('auto', 'json', 'orjson', 'selective')
+
+_TYPE_KEY = '"type":"'
+_PRODUCT_ID_KEY = '"product_id":"'
+_SEQUENCE_PATTERN = re.compile(r'"sequence":(\d+)')
+
+
+def get_loads(name='auto'):
+    # Full decoder by name, 'auto' picking the fastest one installed
+    if name == 'json':
+        return json.loads
+    if name == 'orjson':
+        if orjson is None:
+            raise ValueError("orjson decoder requested but orjson is not installed")
+        return orjson.loads
+    if name == 'auto':
+        return json.loads if orjson is None else orjson.loads
+    raise ValueError("Unknown decoder ({}), expected one of {}".format(name, DECODER_NAMES[:3]))
+
+
+def get_decoder(name='auto'):
+    if name == 'selective':
+        return selective_decoder()
+    return get_loads(name)
+
+
+def selective_decoder(loads=None,  # Full decoder for everything not skimmed, defaults to get_loads('auto')
+                      skimmed_event_types=SKIMMED_EVENT_TYPES):
+    # Skimming is pure Python, so it only beats a full stdlib json decode (by ~1/3 on `received` frames). With orjson
+    # installed a full decode is already cheaper than the skim.
+    loads = loads or get_loads()
+    type_key_length = len(_TYPE_KEY)
+    product_id_key_length = len(_PRODUCT_ID_KEY)
+    search_sequence = _SEQUENCE_PATTERN.search
+
+    def decode(frame):
+        # Frames from the feed are compact JSON, so the skim looks for exact `"key":` prefixes. Anything it doesn't
+        # recognize (ex: whitespace, bytes) falls back to a full decode.
+        if not isinstance(frame, str):
+            return loads(frame)
+        start = frame.find(_TYPE_KEY)
+        if start < 0:
+            return loads(frame)
+        start += type_key_length
+        event_type = frame[start:frame.find('"', start)]
+        if event_type not in skimmed_event_types:
+            return loads(frame)
+
+        # Dict<String, Object> -> only the fields needed to count, route and sequence check the message
+        msg = {'type': event_type}
+        start = frame.find(_PRODUCT_ID_KEY)
+        if start >= 0:
+            start += product_id_key_length
+            msg['product_id'] = frame[start:frame.find('"', start)]
+        match = search_sequence(frame)
+        if match is not None:
+            msg['sequence'] = int(match.group(1))
+        return msg
+
+    return decode
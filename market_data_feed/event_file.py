@@ -0,0 +1,324 @@
+# market_data_feed/event_file.py
+# original author: Jacob Brown
+#
+#
+# Compact binary file of one product's order book events, read through mmap so any point of a trading day can be reached
+# without decompressing or parsing what comes before it. Layout, all little endian:
+#     header        -> magic, then a JSON metadata block, padded to HEADER_SIZE bytes
+#     records       -> RECORD_DTYPE, one fixed-width record per `open`, `done`, `match` and `change` event
+#     order ids     -> interned order id table, fixed-width ASCII; records refer to orders by their index in it
+#     index         -> INDEX_DTYPE, exchange time and sequence of every <index_interval>th record, for seeking
+# Prices and sizes are stored as integer ticks and lots of the product's tick and lot size (see fixed_point.py).
+# Convert a raw capture (see capture.py) with:
+#     market-data-convert captures/ BTC-USD.events --product BTC-USD --tick-size 0.01 --lot-size 0.00000001
+
+import sys
+import json
+import logging
+import mmap
+import argparse
+import numpy as np
+from . import capture
+from . import decoders
+from .fixed_point import FixedPointScale
+from .time_util import parse_exchange_time, format_exchange_time
+
+MAGIC = b'MDFEVT01'
+HEADER_SIZE = 4096
+FORMAT_VERSION = 1
+
+# Event type codes
+OPEN = 1
+DONE = 2
+MATCH = 3
+CHANGE = 4
+
+EVENT_TYPE_CODES = {'open': OPEN, 'done': DONE, 'match': MATCH, 'change': CHANGE}
+EVENT_TYPES = {code: event_type for (event_type, code) in EVENT_TYPE_CODES.items()}
+
+# Side codes, indexing SIDES
+BUY = 0
+SELL = 1
+SIDES = ('buy', 'sell')
+
+RECORD_DTYPE = np.dtype([('time', '<i8'),  # Exchange time, ns since the epoch, never decreasing (see append)
+                         ('sequence', '<i8'),
+                         ('price', '<i8'),  # Ticks, 0 when the event has no price (ex: `done` for a market order)
+                         ('size', '<i8'),  # Lots -> `remaining_size` (open/done), `size` (match), `new_size` (change)
+                         ('order_id', '<u4'),  # Index into the order id table, the maker order for a match
+                         ('type', 'u1'),
+                         ('side', 'u1'),
+                         ('_pad', 'V2')])
+
+INDEX_DTYPE = np.dtype([('time', '<i8'), ('sequence', '<i8'), ('record', '<i8')])
+
+
+class EventFileWriter:
+
+    def __init__(self,
+                 path,
+                 product_id,
+                 tick_size,
+                 lot_size,
+                 index_interval=4096,
+                 buffer_size=65536):  # Records held in memory before being written out
+        self.path = path
+        self.product_id = product_id
+        self.tick_size = tick_size
+        self.lot_size = lot_size
+        self.index_interval = index_interval
+        self.buffer_size = buffer_size
+        self.price_scale = FixedPointScale(tick_size)
+        self.size_scale = FixedPointScale(lot_size)
+
+        # Dict<String, Int> -> {Order Id : Index in the order id table}
+        self.order_id_indexes = {}
+        self.record_count = 0
+        self._last_time_ns = 0
+        self._buffer = []
+        self._index = []
+
+        self._file = open(path, 'wb')
+        self._file.write(b'\0' * HEADER_SIZE)  # Filled in by close(), once the section sizes are known
+
+    def append(self, event, receive_time_ns=0):
+        # Returns False (and writes nothing) for events that don't change the book
+        type_code = EVENT_TYPE_CODES.get(event.get('type'))
+        if type_code is None:
+            return False
+
+        if type_code == MATCH:
+            order_id = event['maker_order_id']
+            size = event['size']
+        elif type_code == CHANGE:
+            order_id = event['order_id']
+            size = event.get('new_size')
+        else:
+            order_id = event['order_id']
+            size = event.get('remaining_size')
+        order_id_index = self.order_id_indexes.get(order_id)
+        if order_id_index is None:
+            order_id_index = len(self.order_id_indexes)
+            self.order_id_indexes[order_id] = order_id_index
+
+        price = event.get('price')
+        exchange_time = event.get('time')
+        # Messages without a time fall back to their receive time, which can be behind the exchange time before it ->
+        # held at the latest time written, so find_time can binary search the records
+        time_ns = max(parse_exchange_time(exchange_time) if exchange_time else receive_time_ns, self._last_time_ns)
+        self._last_time_ns = time_ns
+        record = (time_ns,
+                  event.get('sequence', 0),
+                  self.price_scale.to_units(price) if price else 0,
+                  self.size_scale.to_units(size) if size else 0,
+                  order_id_index,
+                  type_code,
+                  SELL if event['side'] == 'sell' else BUY,
+                  b'')
+
+        if self.record_count % self.index_interval == 0:
+            self._index.append((record[0], record[1], self.record_count))
+        self._buffer.append(record)
+        self.record_count += 1
+        if len(self._buffer) >= self.buffer_size:
+            self._flush()
+        return True
+
+    def close(self):
+        self._flush()
+        records_offset = HEADER_SIZE
+        f = self._file
+
+        order_ids = sorted(self.order_id_indexes, key=self.order_id_indexes.get)
+        order_id_width = max((len(order_id) for order_id in order_ids), default=1)
+        order_ids_offset = self._align(f)
+        np.array([order_id.encode('ascii') for order_id in order_ids], dtype='S{}'.format(order_id_width)).tofile(f)
+
+        index_offset = self._align(f)
+        np.array(self._index, dtype=INDEX_DTYPE).tofile(f)
+
+        metadata = {'format': FORMAT_VERSION,
+                    'product_id': self.product_id,
+                    'tick_size': self.tick_size,
+                    'lot_size': self.lot_size,
+                    'record_count': self.record_count,
+                    'records_offset': records_offset,
+                    'order_id_count': len(order_ids),
+                    'order_id_width': order_id_width,
+                    'order_ids_offset': order_ids_offset,
+                    'index_count': len(self._index),
+                    'index_interval': self.index_interval,
+                    'index_offset': index_offset}
+        header = MAGIC + json.dumps(metadata).encode('ascii')
+        assert len(header) < HEADER_SIZE
+        f.seek(0)
+        f.write(header)
+        f.close()
+
+    def _flush(self):
+        if self._buffer:
+            np.array(self._buffer, dtype=RECORD_DTYPE).tofile(self._file)
+            self._buffer = []
+
+    @staticmethod
+    def _align(f, alignment=8):
+        offset = f.tell()
+        padding = -offset % alignment
+        f.write(b'\0' * padding)
+        return offset + padding
+
+
+class EventFile:
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = self._mmap[:HEADER_SIZE]
+        if not header.startswith(MAGIC):
+            raise ValueError("{} is not an event file".format(path))
+        self.metadata = json.loads(header[len(MAGIC):].rstrip(b'\0'))
+        if self.metadata['format'] != FORMAT_VERSION:
+            raise ValueError("Unsupported event file format {}".format(self.metadata['format']))
+        self.product_id = self.metadata['product_id']
+        self.tick_size = self.metadata['tick_size']
+        self.lot_size = self.metadata['lot_size']
+        self.price_scale = FixedPointScale(self.tick_size)
+        self.size_scale = FixedPointScale(self.lot_size)
+
+        # Zero-copy views of the mapped file
+        self.records = self._view(RECORD_DTYPE, 'records_offset', 'record_count')
+        self.order_ids = self._view(np.dtype('S{}'.format(self.metadata['order_id_width'])), 'order_ids_offset',
+                                    'order_id_count')
+        self.index = self._view(INDEX_DTYPE, 'index_offset', 'index_count')
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        # Views must be dropped before the map can close
+        self.records = self.order_ids = self.index = None
+        self._mmap.close()
+
+    def order_id(self, order_id_index):
+        return self.order_ids[order_id_index].decode('ascii')
+
+    def find_time(self, time_ns):
+        # Index of the first record at or after <time_ns> (exchange time, ns since the epoch)
+        return self._find('time', time_ns)
+
+    def find_sequence(self, sequence):
+        # Index of the first record at or after <sequence>
+        return self._find('sequence', sequence)
+
+    def order_book_kwargs(self):
+        # OrderBook keyword arguments for a fixed point book in this file's units, as apply_to requires
+        return {'tick_size': self.tick_size, 'lot_size': self.lot_size}
+
+    def apply_to(self, order_book, start=0, stop=None):
+        # Apply records [start, stop) straight to a fixed point <order_book> with this file's tick and lot size,
+        # skipping all string parsing. Orders are keyed by their index in the order id table (see order_id). Returns the
+        # number of records applied.
+        if ((order_book.price_scale is None) or (order_book.price_scale.increment != self.price_scale.increment) or
+                (order_book.size_scale.increment != self.size_scale.increment)):
+            raise ValueError("apply_to needs a fixed point OrderBook with tick_size={} and lot_size={}".format(
+                self.tick_size, self.lot_size))
+
+        records = self.records[start:stop]
+        open_order = order_book.open_order
+        done_order = order_book.done_order
+        match_order = order_book.match_order
+        sides = SIDES
+        # tolist() converts each column to Python ints in one C loop, far cheaper than indexing records one by one
+        for (type_code, side, price, size, order_id) in zip(records['type'].tolist(), records['side'].tolist(),
+                                                             records['price'].tolist(), records['size'].tolist(),
+                                                             records['order_id'].tolist()):
+            if type_code == OPEN:
+                open_order(order_id, sides[side], price, size)
+            elif type_code == DONE:
+                done_order(order_id, sides[side])
+            elif type_code == MATCH:
+                match_order(order_id, sides[side], size, price)
+        if len(records):
+            order_book.sequence = int(records['sequence'][-1])
+        return len(records)
+
+    def iter_events(self, start=0, stop=None):
+        # Feed-style event dicts for records [start, stop), for consumers that need the original message shape (ex: a
+        # Decimal mode OrderBook or MarketDataFeedClient.on_message)
+        price_scale = self.price_scale
+        size_scale = self.size_scale
+        records = self.records[start:stop]
+        for (time_ns, sequence, price, size, order_id, type_code, side) in zip(
+                records['time'].tolist(), records['sequence'].tolist(), records['price'].tolist(),
+                records['size'].tolist(), records['order_id'].tolist(), records['type'].tolist(),
+                records['side'].tolist()):
+            event = {'type': EVENT_TYPES[type_code], 'side': SIDES[side], 'product_id': self.product_id,
+                     'sequence': sequence, 'time': format_exchange_time(time_ns)}
+            if price:
+                event['price'] = str(price_scale.to_decimal(price))  # Stored as 0 when the event had none
+            order_id = self.order_id(order_id)
+            if type_code == MATCH:
+                event['maker_order_id'] = order_id
+                event['size'] = str(size_scale.to_decimal(size))
+            else:
+                event['order_id'] = order_id
+                size_key = 'new_size' if type_code == CHANGE else 'remaining_size'
+                event[size_key] = str(size_scale.to_decimal(size))
+            yield event
+
+    def _view(self, dtype, offset_key, count_key):
+        return np.frombuffer(self._mmap, dtype=dtype, count=self.metadata[count_key],
+                             offset=self.metadata[offset_key])
+
+    def _find(self, field, value):
+        # Sparse index narrows the search to one block, so only that block of the mapped records is paged in
+        index = self.index
+        if len(index) == 0:
+            return 0
+        block = int(np.searchsorted(index[field], value, side='right')) - 1
+        if block < 0:
+            return 0
+        block_start = int(index['record'][block])
+        block_stop = int(index['record'][block + 1]) if block + 1 < len(index) else len(self.records)
+        return block_start + int(np.searchsorted(self.records[field][block_start:block_stop], value, side='left'))
+
+
+def convert_capture(capture_path, path, product_id, tick_size, lot_size, index_interval=4096):
+    # Raw capture (file or directory, see capture.py) -> event file of <product_id>'s book events. Returns the number of
+    # records written.
+    decode = decoders.get_loads()
+    writer = EventFileWriter(path, product_id, tick_size, lot_size, index_interval)
+    try:
+        for (receive_time_ns, frame) in capture.read_capture(capture_path):
+            try:
+                event = decode(frame)
+            except ValueError:
+                continue  # Truncated tail of a capture
+            if event.get('product_id') == product_id:
+                writer.append(event, receive_time_ns)
+    finally:
+        writer.close()
+    return writer.record_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert a raw feed capture to a binary event file')
+    parser.add_argument('capture', help='Capture file, or directory of capture files')
+    parser.add_argument('output')
+    parser.add_argument('--product', default='BTC-USD')
+    parser.add_argument('--tick-size', default='0.01')
+    parser.add_argument('--lot-size', default='0.00000001')
+    parser.add_argument('--index-interval', type=int, default=4096)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)7s - %(message)s', level=logging.INFO)
+    record_count = convert_capture(args.capture, args.output, args.product, args.tick_size, args.lot_size,
+                                   args.index_interval)
+    logging.info("Wrote {:,} {} records to {}".format(record_count, args.product, args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
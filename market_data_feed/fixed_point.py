@@ -0,0 +1,51 @@
+# market_data_feed/fixed_point.py
+# original author: Jacob Brown
+#
+#
+# Conversion between the decimal strings sent by the CoinBase Pro Market Feed API and integer multiples of a product's
+# price tick or size lot, so that the OrderBook hot path can key and do arithmetic on plain ints.
+
+from decimal import Decimal as D
+
+_FLOAT_EXACT_LIMIT = float(2 ** 50)
+
+
+class FixedPointScale:
+
+    def __init__(self, increment):
+        # Ex: "0.01" -> places = 2, step = 1 ; "0.05" -> places = 2, step = 5 ; "10" -> places = 0, step = 10
+        self.increment = D(increment)
+        self.places = max(-self.increment.as_tuple().exponent, 0)
+        self.step = int(self.increment.scaleb(self.places))
+        self._multiplier = float(10 ** self.places)
+
+    def to_units(self, text):
+        # Fast path through float -> a string of at most 15 significant digits parses to the nearest double, and
+        # scaling it stays within 0.5 of the true integer while the result is well below 2^53
+        if len(text) <= 16:
+            units = float(text) * self._multiplier
+            if -_FLOAT_EXACT_LIMIT < units < _FLOAT_EXACT_LIMIT:
+                units = round(units)
+                if self.step != 1:
+                    units //= self.step
+                return units
+        return self._to_units_exact(text)
+
+    def _to_units_exact(self, text):
+        # Parse straight from the string rather than through Decimal. Digits beyond the increment's precision are
+        # truncated, which is safe since the exchange only sends multiples of the product's increments.
+        (whole, _, fraction) = text.partition('.')
+        places = self.places
+        if len(fraction) != places:
+            fraction = fraction[:places].ljust(places, '0')
+        units = int(whole + fraction)
+        if self.step != 1:
+            units //= self.step
+        return units
+
+    def to_decimal(self, units):
+        return D(units * self.step).scaleb(-self.places)
+
+    def to_float(self, units):
+        # Single correctly rounded division, so the result is the closest float to the exact decimal value
+        return units * self.step / self._multiplier
@@ -0,0 +1,104 @@
+# market_data_feed/frame_queue.py
+# original author: Jacob Brown
+#
+#
+# Bounded FIFO handing raw WebSocket frames from the receive thread to the worker thread that decodes them and applies
+# them to the book, so a slow book update never holds up reading the socket. What happens when the worker falls behind
+# and the queue fills up is set by its overflow policy.
+
+from collections import deque
+from threading import Condition
+
+BLOCK = 'block'  # Receive thread waits for room -> nothing is lost, but the socket isn't read while it waits
+DROP_OLDEST = 'drop-oldest'  # Oldest queued frame is discarded to make room
+FAIL_AND_RESYNC = 'fail-and-resync'  # Every queued frame is discarded and the worker is told to rebuild its book
+
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, FAIL_AND_RESYNC)
+
+# Queued in place of the discarded frames under FAIL_AND_RESYNC
+RESYNC = object()
+
+# Queued by the receive thread ahead of the frames of a replacement connection (see WebSocketClient)
+RECONNECTED = object()
+
+
+class FrameQueue:
+
+    def __init__(self,
+                 capacity=10000,
+                 overflow_policy=BLOCK):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy ({}), expected one of {}".format(overflow_policy,
+                                                                                      OVERFLOW_POLICIES))
+        self.capacity = capacity
+        self.overflow_policy = overflow_policy
+        self.closed = False
+        self._frames = deque()
+        self._condition = Condition()
+
+        # Statistics
+        self.high_water_mark = 0
+        self.put_count = 0
+        self.dropped_count = 0
+        self.overflow_count = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, frame):
+        with self._condition:
+            frames = self._frames
+            if len(frames) >= self.capacity:
+                self.overflow_count += 1
+                if self.overflow_policy == BLOCK:
+                    while (len(frames) >= self.capacity) and (not self.closed):
+                        self._condition.wait()
+                elif self.overflow_policy == DROP_OLDEST:
+                    # Sentinels are never dropped, the oldest frame behind them goes instead
+                    for (i, queued) in enumerate(frames):
+                        if (queued is not RESYNC) and (queued is not RECONNECTED):
+                            del frames[i]
+                            self.dropped_count += 1
+                            break
+                else:
+                    sentinels = [queued for queued in frames if (queued is RESYNC) or (queued is RECONNECTED)]
+                    self.dropped_count += len(frames) - len(sentinels)
+                    frames.clear()
+                    frames.extend(sentinel for sentinel in sentinels if sentinel is RECONNECTED)
+                    frames.append(RESYNC)
+            if self.closed:
+                return
+
+            frames.append(frame)
+            self.put_count += 1
+            depth = len(frames)
+            if depth > self.high_water_mark:
+                self.high_water_mark = depth
+            if depth == 1:
+                self._condition.notify_all()  # Worker may be waiting on an empty queue
+
+    def get_batch(self):
+        # List<Object> -> every queued frame, oldest first, waiting until there's at least one. Taking the whole
+        # backlog at once keeps the lock traffic per frame low when the worker falls behind. None once closed and empty.
+        with self._condition:
+            while (not self._frames) and (not self.closed):
+                self._condition.wait()
+            if not self._frames:
+                return None
+            batch = list(self._frames)
+            self._frames.clear()
+            self._condition.notify_all()  # Receive thread may be blocked on a full queue
+            return batch
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def get_stats(self):
+        return {'depth': len(self._frames),
+                'capacity': self.capacity,
+                'high_water_mark': self.high_water_mark,
+                'put_count': self.put_count,
+                'dropped_count': self.dropped_count,
+                'overflow_count': self.overflow_count}
@@ -0,0 +1,66 @@
+# market_data_feed/level_arrays.py
+# original author: Jacob Brown
+#
+#
+# NumPy export of an OrderBook's inside levels (or a BookSnapshot's) for analytics. Levels are written into preallocated
+# structured arrays of shape (2, level_count), asks in row 0 and bids in row 1, best level first on each side.
+
+import numpy as np
+
+# One inside level -> price and size as floats, plus the number of resting orders at the level
+LEVEL_DTYPE = np.dtype([('price', np.float64), ('size', np.float64), ('order_count', np.int64)])
+
+ASK_ROW = 0
+BID_ROW = 1
+
+
+def new_inside_levels_array(level_count, sample_count=None):
+    # (2, level_count), or (sample_count, 2, level_count) for a batch of snapshots
+    shape = (2, level_count) if sample_count is None else (sample_count, 2, level_count)
+    return np.zeros(shape, dtype=LEVEL_DTYPE)
+
+
+def fill_inside_levels_array(order_book, out):
+    # Overwrite <out> in place. Levels the book doesn't have (ex: when it first opens) get a NaN price and zero size
+    # and order count.
+    level_count = out.shape[-1]
+    prices = out['price']
+    sizes = out['size']
+    order_counts = out['order_count']
+
+    for (row, records) in ((ASK_ROW, order_book.get_inside_ask_level_records(level_count)),
+                           (BID_ROW, order_book.get_inside_bid_level_records(level_count))):
+        for (i, (price, level)) in enumerate(records):
+            prices[row, i] = order_book.to_float_price(price)
+            sizes[row, i] = order_book.to_float_size(level.quantity)
+            order_counts[row, i] = len(level.order_ids)
+
+        filled_count = len(records)
+        prices[row, filled_count:] = np.nan
+        sizes[row, filled_count:] = 0.0
+        order_counts[row, filled_count:] = 0
+
+    return out
+
+
+def fill_snapshot_levels_array(snapshot, out):
+    # fill_inside_levels_array from a BookSnapshot, so both rows are of one book version wherever the book lives
+    level_count = out.shape[-1]
+    prices = out['price']
+    sizes = out['size']
+    order_counts = out['order_count']
+
+    for (row, levels, level_order_counts) in ((ASK_ROW, snapshot.asks, snapshot.ask_order_counts),
+                                              (BID_ROW, snapshot.bids, snapshot.bid_order_counts)):
+        filled_count = min(len(levels), level_count)
+        for i in range(filled_count):
+            (price, size) = levels[i]
+            prices[row, i] = float(price)
+            sizes[row, i] = float(size)
+            order_counts[row, i] = level_order_counts[i]
+
+        prices[row, filled_count:] = np.nan
+        sizes[row, filled_count:] = 0.0
+        order_counts[row, filled_count:] = 0
+
+    return out
@@ -0,0 +1,258 @@
+# market_data_feed/level_stream.py
+# original author: Jacob Brown
+#
+#
+# Pushes top of book changes to streaming subscribers (see api.py's /stream Server-Sent Events route). A sampler thread
+# polls each product's book version and, when it has moved on, publishes the inside levels as an immutable snapshot.
+# The feed thread does no extra work per message. Each subscriber is sent compact deltas against the levels it was last
+# sent, at most once per its own conflation interval, so a slow subscriber simply skips intermediate books. What's
+# pending for a subscriber is never more than one diff of its levels, however far behind it falls, and one that hasn't
+# taken anything for <stall_timeout> seconds is dropped. Subscribers sharing a depth and position in the stream share
+# the serialized delta.
+#
+# Messages are JSON with prices and sizes as strings, levels best first:
+#     {"type":"snapshot","product_id":"BTC-USD","version":7,"asks":[["100.01","0.5"]],"bids":[["99.99","1.2"]]}
+#     {"type":"update","product_id":"BTC-USD","version":9,"asks":[["100.01","0"]],"bids":[["99.98","0.3"]]}
+# An update lists the levels whose size changed, a size of "0" removing the level.
+
+import json
+import time
+import logging
+from threading import Thread, Condition
+from .conflation import level_changes
+
+
+class LevelSnapshot:
+    # Inside levels of one product at one book version, never modified once published
+
+    __slots__ = ('product_id', 'version', 'asks', 'bids')
+
+    def __init__(self, product_id, version, asks, bids):
+        self.product_id = product_id
+        self.version = version
+        self.asks = asks  # Tuple<Pair<String, String>> -> ( Price , Size ), best first
+        self.bids = bids
+
+
+class Subscription:
+
+    def __init__(self,
+                 stream,
+                 product_id,
+                 level_count,
+                 conflation_interval):  # Minimum seconds between messages, changes in between are merged
+        self.stream = stream
+        self.product_id = product_id
+        self.level_count = level_count
+        self.conflation_interval = conflation_interval
+        self.closed = False
+        self.waiting = False  # Inside next_message, so not stalled however long the book stays still
+        self.last_active = time.monotonic()  # Last time the subscriber came back for a message, for stall detection
+        self._next_send_time = 0.0
+
+        # Levels last sent, Dict<String, String> -> {Price : Size} per side
+        self._version = None
+        self._asks = {}
+        self._bids = {}
+
+        # Statistics
+        self.message_count = 0
+        self.skipped_version_count = 0  # Book versions merged into later messages by conflation
+
+    def next_message(self, timeout=None):
+        # String -> next JSON message, waiting until the book has changed and the conflation interval has passed.
+        # None when <timeout> passes first (ex: time for a keep alive) or the subscription is closed.
+        self.waiting = True
+        try:
+            delay = self._next_send_time - time.monotonic()
+            if delay > 0:
+                if (timeout is not None) and (delay > timeout):
+                    time.sleep(timeout)
+                    return None
+                time.sleep(delay)
+                timeout = None if timeout is None else timeout - delay
+            snapshot = self.stream.wait_for_change(self.product_id, self._version, timeout)
+            if (snapshot is None) or self.closed:
+                return None
+            return self._take(snapshot)
+        finally:
+            self.waiting = False
+            self.last_active = time.monotonic()
+
+    def events(self, keep_alive_interval=15.0):
+        # Server-Sent Events stream of messages, with comment lines as keep alives, until the subscription is closed
+        try:
+            while not self.closed:
+                message = self.next_message(keep_alive_interval)
+                if message is not None:
+                    yield 'data: {}\n\n'.format(message)
+                elif not self.closed:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.stream.unsubscribe(self)
+
+    def _take(self, snapshot):
+        if self._version is None:
+            message = self.stream.render_snapshot(snapshot, self.level_count)
+        else:
+            message = self.stream.render_delta(self._version, snapshot, self.level_count, self._asks, self._bids)
+            self.skipped_version_count += max(0, snapshot.version - self._version - 1)
+        self._version = snapshot.version
+        self._asks = dict(snapshot.asks[:self.level_count])
+        self._bids = dict(snapshot.bids[:self.level_count])
+        self._next_send_time = time.monotonic() + self.conflation_interval
+        self.message_count += 1
+        return message
+
+
+class LevelStream:
+
+    def __init__(self,
+                 client,  # MarketDataFeedClient whose books are streamed
+                 max_level_count=50,  # Deepest level count a subscriber can ask for
+                 sample_interval=0.01,  # Seconds between checks of the book versions
+                 stall_timeout=30.0,  # Seconds a subscriber can go without taking a message before it's dropped
+                 max_subscriptions=1000):
+        self.client = client
+        self.max_level_count = max_level_count
+        self.sample_interval = sample_interval
+        self.stall_timeout = stall_timeout
+        self.max_subscriptions = max_subscriptions
+        self.subscriptions = set()
+        self.thread = None
+        self.stop = True
+        self._condition = Condition()
+
+        # Dict<String, LevelSnapshot> -> {Product Id : Latest Snapshot}, replaced (never modified) on every change
+        self._snapshots = {}
+
+        # Dict<Tuple, String> -> {( From Version , To Version , Level Count , Product Id ) : Serialized Delta}, only
+        # for the latest versions, so subscribers in step with each other serialize each delta once
+        self._delta_cache = {}
+
+        # Statistics
+        self.publish_count = 0
+        self.dropped_subscription_count = 0
+
+    def start(self):
+        if self.thread is None:
+            self.stop = False
+            self.thread = Thread(target=self._sample, daemon=True)
+            self.thread.start()
+
+    def close(self):
+        self.stop = True
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for subscription in list(self.subscriptions):
+            subscription.close()
+        with self._condition:
+            self._condition.notify_all()
+
+    def subscribe(self, product_id=None, level_count=5, conflation_interval=0.1):
+        product_id = product_id or self.client.products[0]
+        if product_id not in self.client.products:
+            raise ValueError("Unknown product ({}), expected one of {}".format(product_id, self.client.products))
+        if not 1 <= level_count <= self.max_level_count:
+            raise ValueError("Level count must be between 1 and {}".format(self.max_level_count))
+        with self._condition:
+            if len(self.subscriptions) >= self.max_subscriptions:
+                raise ValueError("Subscription limit ({}) reached".format(self.max_subscriptions))
+            subscription = Subscription(self, product_id, level_count, conflation_interval)
+            self.subscriptions.add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._condition:
+            self.subscriptions.discard(subscription)
+            self._condition.notify_all()  # Wakes the subscription's own wait, if it's in one
+
+    def wait_for_change(self, product_id, known_version, timeout=None):
+        # LevelSnapshot -> latest snapshot of <product_id> once it's newer than <known_version>, None on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                snapshot = self._snapshots.get(product_id)
+                if (snapshot is not None) and (snapshot.version != known_version):
+                    return snapshot
+                if self.stop and (self.thread is None):
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if (remaining is not None) and (remaining <= 0):
+                    return None
+                self._condition.wait(remaining)
+
+    def render_snapshot(self, snapshot, level_count):
+        return json.dumps({'type': 'snapshot', 'product_id': snapshot.product_id, 'version': snapshot.version,
+                           'asks': snapshot.asks[:level_count], 'bids': snapshot.bids[:level_count]},
+                          separators=(',', ':'))
+
+    def render_delta(self, from_version, snapshot, level_count, sent_asks, sent_bids):
+        key = (from_version, snapshot.version, level_count, snapshot.product_id)
+        message = self._delta_cache.get(key)
+        if message is None:
+            message = json.dumps({'type': 'update', 'product_id': snapshot.product_id, 'version': snapshot.version,
+                                  'asks': level_changes(sent_asks, snapshot.asks[:level_count], '0'),
+                                  'bids': level_changes(sent_bids, snapshot.bids[:level_count], '0')},
+                                 separators=(',', ':'))
+            self._delta_cache[key] = message
+        return message
+
+    def get_stats(self):
+        subscriptions = list(self.subscriptions)
+        return {'subscription_count': len(subscriptions),
+                'publish_count': self.publish_count,
+                'dropped_subscription_count': self.dropped_subscription_count,
+                'message_count': sum(subscription.message_count for subscription in subscriptions),
+                'skipped_version_count': sum(subscription.skipped_version_count for subscription in subscriptions)}
+
+    def _sample(self):
+        # Sampler thread -> publishes a new snapshot whenever a subscribed product's book has changed
+        book_manager = self.client.book_manager
+        last_stall_check = time.monotonic()
+        while not self.stop:
+            product_ids = {subscription.product_id for subscription in list(self.subscriptions)}
+            published = False
+            for product_id in product_ids:
+                previous = self._snapshots.get(product_id)
+                try:
+                    (version, asks, bids) = book_manager.get_inside_levels(
+                        product_id, self.max_level_count, None if previous is None else previous.version)
+                except Exception as e:
+                    # Ex: shard worker query failed -> try again next sample
+                    logging.debug("Sampling {} levels failed: {}".format(product_id, e))
+                    continue
+                if (previous is not None) and (version == previous.version):
+                    continue
+                snapshot = LevelSnapshot(product_id, version,
+                                         tuple((str(price), str(size)) for (price, size) in asks),
+                                         tuple((str(price), str(size)) for (price, size) in bids))
+                with self._condition:
+                    self._snapshots[product_id] = snapshot
+                    self._delta_cache = {}
+                published = True
+            if published:
+                self.publish_count += 1
+                with self._condition:
+                    self._condition.notify_all()
+
+            now = time.monotonic()
+            if now - last_stall_check >= 1.0:
+                last_stall_check = now
+                self._drop_stalled(now)
+            time.sleep(self.sample_interval)
+
+    def _drop_stalled(self, now):
+        for subscription in list(self.subscriptions):
+            if (not subscription.waiting) and (now - subscription.last_active > self.stall_timeout):
+                logging.warning("Dropping {} level stream subscriber, stalled for {:.0f} s".format(
+                    subscription.product_id, now - subscription.last_active))
+                self.dropped_subscription_count += 1
+                subscription.close()
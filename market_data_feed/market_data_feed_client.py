@@ -7,12 +7,16 @@
 # https://github.com/danpaquin/coinbasepro-python/blob/master/cbpro/websocket_client.py
 
 import sys
+import json
 import time
-import copy
 import logging
 from . import websocket_client as wc
-from .order_book import OrderBook
-from decimal import Decimal as D
+from . import level_arrays as la
+from . import frame_queue as fq
+from . import shared_book as sb
+from .metrics import FeedMetrics
+from .conflation import ConflatedPublisher
+from .order_book_manager import OrderBookManager, ShardedOrderBookManager
 
 
 class MarketDataFeedClient(wc.WebSocketClient):
@@ -20,13 +24,81 @@ class MarketDataFeedClient(wc.WebSocketClient):
     def __init__(self,
                  level_count=5,  # Number of inside levels to output
                  max_levels=15,  # Number of inside levels to track in the OrderBook, must be greater than level_count
-                 logging_enabled=False):
+                 logging_enabled=False,  # Log the inside levels as they change, conflated to <max_publish_rate>
+                 full_depth=False,  # Track every resting order in the OrderBook rather than only <max_levels> levels
+                 tick_size=None,  # Product's price increment (ex: "0.01"), enables the OrderBook's fixed point mode
+                 lot_size=None,  # Product's size increment (ex: "0.00000001"), enables the fixed point mode
+                 imbalance_depth=5,  # Best levels per side summed for the microstructure's depth imbalance
+                 snapshot_loader=None,  # Level 3 snapshot loader (see snapshot_loader.py), enables sequence resync
+                 background_snapshot_load=True,  # False loads snapshots before the next message, ex: when replaying
+                 products=None,  # Product ids to subscribe to, each gets its own OrderBook. First one is the default.
+                 shard_count=0,  # Worker processes to shard the products' books across, 0 keeps them in this process
+                 pipeline=False,  # Decode and apply messages on a worker thread, see WebSocketClient
+                 queue_size=10000,
+                 overflow_policy=fq.BLOCK,
+                 decoder='auto',  # Frame decoder, 'selective' skips fully decoding messages the books ignore
+                 recorder=None,  # FrameRecorder to capture the raw feed to (see capture.py)
+                 metrics_enabled=False,  # Keep latency histograms of the hot path (see metrics.py)
+                 metrics_sample_interval=64,  # Time one message in this many when metrics are enabled
+                 prefilter=None,  # FramePrefilter dropping frames the books don't need undecoded (see prefilter.py)
+                 url="wss://ws-feed.pro.coinbase.com/",
+                 reconnect=True,  # Reconnect with backoff when the feed drops, books are rebuilt (see on_reconnect)
+                 receive_timeout=None,  # Seconds without a frame before the connection is replaced
+                 max_publish_rate=10.0,  # Most level updates per second per product for publisher listeners
+                 trade_tape_capacity=65536,  # Most recent trades kept per product, see trade_tape.py
+                 shared_book=None):  # Shared memory segment name -> read books another process publishes, no feed
         assert(max_levels >= level_count)
-        super().__init__()
+        if (prefilter is not None) and (snapshot_loader is not None):
+            raise ValueError("A prefilter leaves gaps in the sequence, so it can't be used with a snapshot_loader. "
+                             "Use decoder='selective' to cut the cost of ignored messages instead.")
+        shared_book_manager = None
+        if shared_book is not None:
+            # Products are whatever the publishing process has, see shared_book.py
+            shared_book_manager = sb.SharedBookManager(shared_book)
+            products = shared_book_manager.products
+        super().__init__(url=url, products=products or ["BTC-USD"], channels=["full"], pipeline=pipeline,
+                         queue_size=queue_size, overflow_policy=overflow_policy, decoder=decoder, recorder=recorder,
+                         prefilter=prefilter, reconnect=reconnect, receive_timeout=receive_timeout)
         self.level_count = level_count
-        self.order_book = OrderBook(max_levels=max_levels)
+        self.snapshot_loader = snapshot_loader
+        self.shared_book = shared_book
+
+        book_kwargs = {'max_levels': max_levels, 'full_depth': full_depth, 'tick_size': tick_size,
+                       'lot_size': lot_size, 'imbalance_depth': imbalance_depth}
+        tape_kwargs = {'capacity': trade_tape_capacity}
+        sync_kwargs = {'background_load': background_snapshot_load}
+        if shared_book_manager is not None:
+            self.book_manager = shared_book_manager
+        elif shard_count > 0:
+            self.book_manager = ShardedOrderBookManager(self.products, shard_count, book_kwargs, snapshot_loader,
+                                                        tape_kwargs=tape_kwargs, sync_kwargs=sync_kwargs)
+        else:
+            self.book_manager = OrderBookManager(self.products, book_kwargs, snapshot_loader, tape_kwargs, sync_kwargs)
+
+        # Conflated inside level changes, only tracked while something listens (see conflation.py)
+        self.publisher = ConflatedPublisher(self.book_manager, self.products, level_count, max_publish_rate)
         self.logging_enabled = logging_enabled
 
+        if (prefilter is not None) and (prefilter.price_band is not None) and (prefilter.mid_source is None):
+            prefilter.mid_source = self.get_mid_price
+
+        # Hot path telemetry, decode time is measured by wrapping the decoder
+        self.metrics = FeedMetrics(metrics_sample_interval) if metrics_enabled else None
+        if self.metrics is not None:
+            self.decoder = self.metrics.timed_decoder(self.decoder)
+
+        # Dict<Int, ndarray> -> {Level Count : reusable buffer for get_inside_levels_array}
+        self._level_array_buffers = {}
+
+        # Dict<Pair<String, Int>, Tuple<Int, List, List, String>>
+        # {( Product Id , Level Count ) : ( Book Version , Best Ask Levels , Best Bid Levels , Printout ) }
+        # Inside levels and their printout are only recomputed once the book's version has moved on
+        self._inside_levels_cache = {}
+
+        # Dict<Pair<String, Int>, Pair<Int, String>> -> {( Product Id , Level Count ) : ( Book Version , JSON )}
+        # Serialized levels, so repeated polls of an unchanged book are serialized once
+        self._inside_levels_json_cache = {}
+
         # Statistics
         self.message_type_count = {'subscriptions': 0,
                                    'received': 0,
@@ -37,44 +109,208 @@ class MarketDataFeedClient(wc.WebSocketClient):
                                    'activate': 0}
         self.total_message_count = 0
 
+    @property
+    def order_book(self):
+        # Default product's book. Only available when books live in this process.
+        return self.book_manager.get_order_book(self.products[0])
+
+    @order_book.setter
+    def order_book(self, order_book):
+        self.book_manager.set_order_book(self.products[0], order_book)
+        self._inside_levels_cache = {}
+        self._inside_levels_json_cache = {}
+
+    @property
+    def logging_enabled(self):
+        return self._log_level_update in self.publisher.listeners
+
+    @logging_enabled.setter
+    def logging_enabled(self, logging_enabled):
+        if logging_enabled and (not self.logging_enabled):
+            self.publisher.add_listener(self._log_level_update)
+        elif (not logging_enabled) and self.logging_enabled:
+            self.publisher.remove_listener(self._log_level_update)
+
+    def start(self):
+        if self.shared_book is not None:
+            raise ValueError("Books are read from shared memory ({}), the publishing process runs the feed".format(
+                self.shared_book))
+        super().start()
+
     def on_open(self):
-        self.url = "wss://ws-feed.pro.coinbase.com/"
-        self.products = ["BTC-USD"]
-        self.channels = ["full"]
+        self.book_manager.start()
+        self.book_manager.reset()
 
     def on_message(self, msg):
         if 'type' in msg:
-            self.message_type_count[msg['type']] += 1
-            self.order_book.handle_event(msg)
-            if self.logging_enabled:
-                logging.debug(self.get_inside_levels_printout(self.level_count) + "\n")
+            msg_type = msg['type']
+            self.message_type_count[msg_type] = self.message_type_count.get(msg_type, 0) + 1
+            metrics = self.metrics
+            if (metrics is None) or (self.total_message_count % metrics.sample_interval):
+                self.book_manager.handle_event(msg)
+            else:
+                # With sharded books this times handing the event to its shard, not the apply in the worker process
+                start = time.perf_counter_ns()
+                self.book_manager.handle_event(msg)
+                end = time.perf_counter_ns()
+                metrics.record_apply(msg_type, end - start, msg.get('time'), time.time_ns())
+            publisher = self.publisher
+            if publisher.listeners:
+                publisher.on_update(msg.get('product_id'))
         self.total_message_count += 1
 
-    def get_inside_levels_printout(self, level_count):
-        best_ask_levels = copy.deepcopy(self.order_book.best_ask_levels)
-        best_bid_levels = copy.deepcopy(self.order_book.best_bid_levels)
+    def on_close(self):
+        super().on_close()
+        self.publisher.close()
+
+    def on_resync(self):
+        # Frames were discarded, so the books can't be trusted -> rebuild them from fresh snapshots
+        super().on_resync()
+        self.book_manager.reset()
+        self.publisher.reset()
+
+    def on_reconnect(self):
+        # Messages were missed while the feed was down -> rebuild the books, as on_resync
+        super().on_reconnect()
+        self.book_manager.reset()
+        self.publisher.reset()
+        self._inside_levels_cache = {}
+        self._inside_levels_json_cache = {}
+
+    def get_recovery_stats(self):
+        # Connection stats, plus how long each product's book took to be current again after the last disconnect
+        # (disconnect -> reconnect -> snapshot loaded and buffered messages applied). Recovery is None until that has
+        # happened, and always None without a snapshot loader since the books are only cleared.
+        stats = self.get_connection_stats()
+        disconnect_time_ms = stats['last_disconnect_time_ms']
+        stats['book_recovery_time_ms'] = {}
+        for product_id in self.products:
+            book_sync_stats = self.book_manager.get_stats(product_id).get('book_sync') or {}
+            completed_ms = book_sync_stats.get('last_resync_completed_ms')
+            if (disconnect_time_ms is None) or (completed_ms is None) or (completed_ms < disconnect_time_ms):
+                stats['book_recovery_time_ms'][product_id] = None
+            else:
+                stats['book_recovery_time_ms'][product_id] = completed_ms - disconnect_time_ms
+        return stats
+
+    def get_inside_levels(self, level_count, product_id=None):
+        # Pair<List<Pair<Decimal, Decimal>>, List<Pair<Decimal, Decimal>>> -> rounded ( quantity , price ) per level,
+        # best level first, for asks and bids
+        return self._get_cached_inside_levels(level_count, product_id)[1:3]
 
-        sorted_ask_level_prices = sorted(best_ask_levels.keys())
-        sorted_bid_level_prices = sorted(best_bid_levels.keys(), reverse=True)
+    def get_book_snapshot(self, level_count, product_id=None):
+        # BookSnapshot -> immutable inside levels of both sides at one book version, shared by readers until the book
+        # changes (see order_book_manager.py)
+        return self.book_manager.get_snapshot(product_id or self.products[0], level_count)
 
-        best_ask_levels = self._get_best_levels(sorted_ask_level_prices, best_ask_levels, level_count)
-        best_bid_levels = self._get_best_levels(sorted_bid_level_prices, best_bid_levels, level_count)
+    def get_inside_levels_json(self, level_count, product_id=None):
+        # Pair<Int, String> -> ( Book Version , JSON ) of the inside levels, prices and sizes as strings, best first:
+        # {"product_id":"BTC-USD","version":7,"time":"2021-...Z","asks":[["100.01","0.5"]],"bids":[["99.99","1.2"]]}
+        product_id = product_id or self.products[0]
+        key = (product_id, level_count)
+        snapshot = self.book_manager.get_snapshot(product_id, level_count)
+        cached = self._inside_levels_json_cache.get(key)
+        if (cached is not None) and (cached[0] == snapshot.version):
+            return cached
 
-        return self._format_inside_levels(best_ask_levels, best_bid_levels)
+        cached = (snapshot.version, json.dumps(
+            {'product_id': product_id, 'version': snapshot.version, 'time': snapshot.time,
+             'asks': [(str(price), str(size)) for (price, size) in snapshot.asks[:level_count]],
+             'bids': [(str(price), str(size)) for (price, size) in snapshot.bids[:level_count]]},
+            separators=(',', ':')))
+        self._inside_levels_json_cache[key] = cached
+        return cached
+
+    def get_inside_levels_printout(self, level_count, product_id=None):
+        return self._get_cached_inside_levels(level_count, product_id)[3]
+
+    def get_mid_price(self, product_id=None):
+        # Decimal halfway between the best ask and bid, None unless both sides have a level
+        (_, ask_levels, bid_levels) = self.book_manager.get_inside_levels(product_id or self.products[0], 1)
+        if (not ask_levels) or (not bid_levels):
+            return None
+        return (ask_levels[0][0] + bid_levels[0][0]) / 2
+
+    def get_microstructure(self, product_id=None):
+        # Dict -> mid, spread, microprice, depth imbalance and session VWAP as Decimals (None until both sides, or a
+        # trade, are there), kept up to date by the book as it goes (see OrderBook.get_microstructure)
+        return self.book_manager.get_microstructure(product_id or self.products[0])
+
+    def get_trades(self, count=100, product_id=None):
+        # ndarray<TRADE_DTYPE> -> last <count> trades, oldest first (see trade_tape.py)
+        return self.book_manager.get_trades(product_id or self.products[0], count)
+
+    def get_bars(self, resolution='1m', count=60, product_id=None):
+        # ndarray<BAR_DTYPE> -> last <count> OHLCV bars at <resolution> (ex: "1s", "1m", "5m"), oldest first, the last
+        # one still open
+        return self.book_manager.get_bars(product_id or self.products[0], resolution, count)
+
+    def get_publisher_stats(self):
+        return self.publisher.get_stats()
+
+    def get_product_stats(self, product_id=None):
+        return self.book_manager.get_stats(product_id or self.products[0])
+
+    def get_all_product_stats(self):
+        # Dict<String, Dict> -> {Product Id : Stats}
+        return {product_id: self.book_manager.get_stats(product_id) for product_id in self.products}
+
+    def _get_cached_inside_levels(self, level_count, product_id=None):
+        product_id = product_id or self.products[0]
+        key = (product_id, level_count)
+        cached = self._inside_levels_cache.get(key)
+
+        # Manager skips rebuilding the levels when the book is still at the cached version
+        (version, ask_levels, bid_levels) = self.book_manager.get_inside_levels(
+            product_id, level_count, None if cached is None else cached[0])
+        if (cached is not None) and (cached[0] == version):
+            return cached
+
+        best_ask_levels = self._get_best_levels(ask_levels)
+        best_bid_levels = self._get_best_levels(bid_levels)
+        printout = self._format_inside_levels(best_ask_levels, best_bid_levels)
+
+        cached = (version, best_ask_levels, best_bid_levels, printout)
+        self._inside_levels_cache[key] = cached
+        return cached
+
+    def get_inside_levels_array(self, level_count, out=None, product_id=None):
+        # Inside levels as a (2, level_count) NumPy structured array of (price, size, order_count), asks in row 0 and
+        # bids in row 1 (see level_arrays.py), from one book snapshot. Without <out>, a buffer kept per level_count is
+        # refilled on every call, so copy the result if it needs to outlive the next call.
+        if out is None:
+            out = self._level_array_buffers.get(level_count)
+            if out is None:
+                out = la.new_inside_levels_array(level_count)
+                self._level_array_buffers[level_count] = out
+        snapshot = self.book_manager.get_snapshot(product_id or self.products[0], level_count)
+        return la.fill_snapshot_levels_array(snapshot, out)
+
+    def sample_inside_levels_array(self, level_count, sample_count, interval, out=None, product_id=None):
+        # Batch of <sample_count> snapshots taken <interval> seconds apart, as one (sample_count, 2, level_count) array
+        product_id = product_id or self.products[0]
+        if out is None:
+            out = la.new_inside_levels_array(level_count, sample_count)
+        start = time.monotonic()
+        for i in range(sample_count):
+            delay = start + (i * interval) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            la.fill_snapshot_levels_array(self.book_manager.get_snapshot(product_id, level_count), out[i])
+        return out
+
+    def _log_level_update(self, update):
+        logging.debug("{} inside levels, {} updates conflated:\n{}\n".format(
+            update.product_id, update.update_count,
+            self.get_inside_levels_printout(self.level_count, update.product_id)))
 
     @staticmethod
-    def _get_best_levels(sorted_prices, level_map, level_count):
+    def _get_best_levels(inside_levels):
         levels = []
         quantity_precision = 5
         price_precision = 2
-        for i in range(level_count):
-            if i >= len(sorted_prices):
-                pass  # Edge case when book first opens
-            else:
-                target_price = sorted_prices[i]
-                target_price_decimal = D(target_price)
-                levels.append((round(level_map[target_price][0], quantity_precision),
-                               round(target_price_decimal, price_precision)))
+        for (price, quantity) in inside_levels:
+            levels.append((round(quantity, quantity_precision), round(price, price_precision)))
         return levels
 
     @staticmethod
@@ -82,14 +318,10 @@ class MarketDataFeedClient(wc.WebSocketClient):
         longest_quantity_length = 0
         longest_price_length = 0
 
-        for i in range(len(best_ask_levels)):
-            cur_ask_quantity_len = len(str(best_ask_levels[i][0]))
-            cur_ask_price_len = len(str(best_ask_levels[i][1]))
-            cur_bid_quantity_len = len(str(best_bid_levels[i][0]))
-            cur_bid_price_len = len(str(best_bid_levels[i][1]))
-
-            longest_quantity_length = max(longest_quantity_length, cur_ask_quantity_len, cur_bid_quantity_len)
-            longest_price_length = max(longest_price_length, cur_ask_price_len, cur_bid_price_len)
+        # Sides are measured separately since one may have fewer levels than the other (ex: when the book first opens)
+        for (quantity, price) in best_ask_levels + best_bid_levels:
+            longest_quantity_length = max(longest_quantity_length, len(str(quantity)))
+            longest_price_length = max(longest_price_length, len(str(price)))
 
         # Begin constructing output string
         output = ''
@@ -122,6 +354,14 @@ def main():
             logging.info(mdf_client.get_inside_levels_printout(5) + "\n")
             logging.info("\nTotal Messages = %i, Breakdown = %s\n" %
                          (mdf_client.total_message_count, str(mdf_client.message_type_count)))
+            for (product_id, stats) in mdf_client.get_all_product_stats().items():
+                logging.info("%s = %s\n" % (product_id, str(stats)))
+            if mdf_client.pipeline:
+                logging.info("Frame Queue = %s\n" % str(mdf_client.get_queue_stats()))
+            if mdf_client.prefilter is not None:
+                logging.info("Prefilter = %s\n" % str(mdf_client.get_prefilter_stats()))
+            logging.info("Connection = %s\n" % str(mdf_client.get_recovery_stats()))
+            logging.info("Publisher = %s\n" % str(mdf_client.get_publisher_stats()))
             time.sleep(5)
     except KeyboardInterrupt:
         mdf_client.close()
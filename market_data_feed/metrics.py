@@ -0,0 +1,220 @@
+# market_data_feed/metrics.py
+# original author: Jacob Brown
+#
+#
+# Hot path telemetry for MarketDataFeedClient -> per message type apply latency, frame decode time and the lag from a
+# message's exchange `time` to it being applied, each kept in an HDR-style log-linear histogram, plus message rates.
+# Timing a message (clock reads, exchange time parse, histogram updates) costs several times a cheap book update, so
+# only one message in <sample_interval> is timed; message counts stay exact. Everything renders in the Prometheus text
+# exposition format for api.py's /metrics route.
+
+import time
+from .time_util import ExchangeTimeParser
+
+
+class LatencyHistogram:
+    # Log-linear buckets, HDR histogram style -> values below 2^(sub_bucket_bits + 1) get a bucket each, every power of
+    # two above that is split into 2^sub_bucket_bits buckets, so any value is resolved to within 1 / 2^sub_bucket_bits
+    # of itself (0.8% with the default 7 bits) in a fixed, small array. Recording is a few int operations.
+
+    def __init__(self,
+                 sub_bucket_bits=7,
+                 max_value_bits=40):  # Values are clamped to 2^max_value_bits (~18 minutes in ns)
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.max_value = (1 << max_value_bits) - 1
+        self.counts = [0] * ((max_value_bits - sub_bucket_bits + 1) << sub_bucket_bits)
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        if value > self.max:
+            if value > self.max_value:
+                value = self.max_value
+            self.max = value
+        elif value < 0:
+            value = 0
+        self.total += value
+        if value < self.sub_bucket_count:
+            self.counts[value] += 1
+        else:
+            shift = value.bit_length() - self.sub_bucket_bits - 1
+            self.counts[((shift + 1) << self.sub_bucket_bits) + (value >> shift) - self.sub_bucket_count] += 1
+
+    def bucket_value(self, index):
+        # Midpoint of the range of values counted in bucket <index>
+        if index < (self.sub_bucket_count << 1):
+            return index
+        shift = (index >> self.sub_bucket_bits) - 1
+        mantissa = (index & (self.sub_bucket_count - 1)) + self.sub_bucket_count
+        return (mantissa << shift) + ((1 << shift) >> 1)
+
+    def count(self):
+        return sum(self.counts)
+
+    def percentiles(self, percents):
+        # List<Int> -> value at each of <percents> (ascending, 0 - 100), all in one pass over the buckets
+        counts = list(self.counts)  # Copy, since the feed thread may be recording into it
+        total_count = sum(counts)
+        values = []
+        if total_count == 0:
+            return [0 for _ in percents]
+        cumulative = 0
+        index = 0
+        for percent in percents:
+            target = max(1, -(-total_count * percent // 100))  # Rank of the sample at <percent>, rounded up
+            while cumulative + counts[index] < target:
+                cumulative += counts[index]
+                index += 1
+            values.append(min(self.bucket_value(index), self.max))
+        return values
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+        self.max = 0
+
+
+class FeedMetrics:
+
+    # Quantiles exposed for each histogram
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self,
+                 sample_interval=64):  # Time every <sample_interval>th message and frame, 1 times them all
+        self.sample_interval = sample_interval
+
+        # Dict<String, LatencyHistogram> -> {Message Type : ns from handing a message to the books to it being applied}
+        self.apply_latency = {}
+        self.decode_latency = LatencyHistogram()  # ns per frame
+        self.exchange_lag = LatencyHistogram()  # ns from the message's exchange `time` to it being applied
+        self.negative_lag_count = 0  # Messages stamped in our future, i.e. local clock behind the exchange's
+        self._parse_exchange_time = ExchangeTimeParser()
+
+        # Previous scrape, for the message rate
+        self._rate_time = time.monotonic()
+        self._rate_count = 0
+
+    def timed_decoder(self, decode):
+        # Wraps a frame decoder so every <sample_interval>th call is recorded in decode_latency
+        clock = time.perf_counter_ns
+        record = self.decode_latency.record
+        sample_interval = self.sample_interval
+        countdown = sample_interval
+
+        def timed_decode(frame):
+            nonlocal countdown
+            countdown -= 1
+            if countdown:
+                return decode(frame)
+            countdown = sample_interval
+            start = clock()
+            msg = decode(frame)
+            record(clock() - start)
+            return msg
+
+        return timed_decode
+
+    def record_apply(self, msg_type, elapsed_ns, exchange_time, applied_time_ns):
+        histogram = self.apply_latency.get(msg_type)
+        if histogram is None:
+            histogram = self.apply_latency[msg_type] = LatencyHistogram()
+        histogram.record(elapsed_ns)
+
+        if exchange_time is not None:
+            lag = applied_time_ns - self._parse_exchange_time(exchange_time)
+            if lag < 0:
+                self.negative_lag_count += 1
+            else:
+                self.exchange_lag.record(lag)
+
+    def message_rate(self, total_message_count):
+        # Messages per second since the previous call
+        now = time.monotonic()
+        elapsed = now - self._rate_time
+        rate = (total_message_count - self._rate_count) / elapsed if elapsed > 0 else 0.0
+        self._rate_time = now
+        self._rate_count = total_message_count
+        return rate
+
+    def reset(self):
+        self.apply_latency = {}
+        self.decode_latency.reset()
+        self.exchange_lag.reset()
+        self.negative_lag_count = 0
+
+
+def render_prometheus(client):
+    # Prometheus text exposition (version 0.0.4) of <client>'s message counts, book sizes and, when it has a
+    # FeedMetrics, its latency histograms as summaries in seconds
+    lines = []
+
+    def metric(name, metric_type, help_text, samples):
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, metric_type))
+        for (suffix, labels, value) in samples:
+            label_text = ','.join('{}="{}"'.format(key, label) for (key, label) in labels)
+            lines.append('{}{}{} {}'.format(name, suffix, '{' + label_text + '}' if label_text else '', value))
+
+    def summary(name, help_text, histograms):
+        # Dict<Tuple, LatencyHistogram> -> {( ( Label , Value ) ... ) : Histogram}
+        samples = []
+        quantiles = FeedMetrics.QUANTILES
+        for (labels, histogram) in histograms.items():
+            values = histogram.percentiles([q * 100 for q in quantiles])
+            for (quantile, value) in zip(quantiles, values):
+                samples.append(('', labels + (('quantile', quantile),), value / 1e9))
+            samples.append(('_sum', labels, histogram.total / 1e9))
+            samples.append(('_count', labels, histogram.count()))
+        metric(name, 'summary', help_text, samples)
+
+    metric('mdf_messages_total', 'counter', 'Messages received from the feed, by type.',
+           [('', (('type', msg_type),), count) for (msg_type, count) in sorted(client.message_type_count.items())])
+
+    for product_id in client.products:
+        stats = client.get_product_stats(product_id)
+        for (name, help_text, keys) in (('mdf_book_levels', 'Price levels held in the order book.',
+                                         ('bid_level_count', 'ask_level_count')),
+                                        ('mdf_book_orders', 'Resting orders held in the order book.',
+                                         ('bid_order_count', 'ask_order_count'))):
+            metric(name, 'gauge', help_text, [('', (('product_id', product_id), ('side', side)), stats[key])
+                                              for (side, key) in zip(('buy', 'sell'), keys)])
+
+    queue_stats = client.get_queue_stats()
+    if queue_stats is not None:
+        metric('mdf_frame_queue_depth', 'gauge', 'Frames waiting to be decoded.', [('', (), queue_stats['depth'])])
+        metric('mdf_frame_queue_high_water_mark', 'gauge', 'Deepest the frame queue has been.',
+               [('', (), queue_stats['high_water_mark'])])
+        metric('mdf_frame_queue_dropped_total', 'counter', 'Frames discarded on queue overflow.',
+               [('', (), queue_stats['dropped_count'])])
+
+    prefilter_stats = client.get_prefilter_stats()
+    if prefilter_stats is not None:
+        metric('mdf_prefilter_dropped_total', 'counter', 'Frames dropped before decoding, by type or by price band.',
+               [('', (('reason', 'type'), ('type', event_type)), count)
+                for (event_type, count) in sorted(prefilter_stats['dropped_type_count'].items())] +
+               [('', (('reason', 'price_band'), ('type', 'open')), prefilter_stats['band_dropped_count'])])
+
+    publisher_stats = client.get_publisher_stats()
+    metric('mdf_level_updates_published_total', 'counter', 'Conflated inside level updates handed to listeners.',
+           [('', (), publisher_stats['publish_count'])])
+    metric('mdf_level_updates_collapsed_total', 'counter',
+           'Book updates merged into another level update rather than published on their own.',
+           [('', (), publisher_stats['collapsed_update_count'])])
+
+    metrics = client.metrics
+    if metrics is not None:
+        metric('mdf_message_rate', 'gauge', 'Messages per second since the previous scrape.',
+               [('', (), round(metrics.message_rate(client.total_message_count), 3))])
+        metric('mdf_latency_sample_interval', 'gauge', 'One message in this many is timed by the latency summaries.',
+               [('', (), metrics.sample_interval)])
+        summary('mdf_apply_latency_seconds', 'Time to apply a message to the order books, by type.',
+                {(('type', msg_type),): histogram for (msg_type, histogram) in sorted(metrics.apply_latency.items())})
+        summary('mdf_decode_latency_seconds', 'Time to decode a raw frame.', {(): metrics.decode_latency})
+        summary('mdf_exchange_lag_seconds', 'Time from a message\'s exchange timestamp to it being applied.',
+                {(): metrics.exchange_lag})
+        metric('mdf_exchange_lag_negative_total', 'counter',
+               'Messages timestamped after they were applied (local clock behind the exchange).',
+               [('', (), metrics.negative_lag_count)])
+
+    return '\n'.join(lines) + '\n'
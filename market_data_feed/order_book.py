@@ -4,36 +4,265 @@
 #
 # Class for maintaining pertinent data for outputting inside bid and ask levels from the CoinBase Pro Market Feed API.
 
+import sys
 import json
 import logging
 from decimal import Decimal as D
+from .price_ladder import PriceLadder
+from .fixed_point import FixedPointScale
+
+
+class Order:
+    # Mutable record for a resting order, updated in place on partial fills
+    __slots__ = ('price', 'size')
+
+    def __init__(self, price, size):
+        self.price = price  # Key of the level the order rests at
+        self.size = size
+
+    def __repr__(self):
+        return 'Order({!r}, {!r})'.format(self.price, self.size)
+
+
+class PriceLevel:
+    # Mutable record for a price level, updated in place as orders join, fill or leave it
+    __slots__ = ('quantity', 'order_ids', 'inside')
+
+    def __init__(self, quantity, order_ids, inside=False):
+        self.quantity = quantity
+        self.order_ids = order_ids
+        self.inside = inside  # One of its side's best <imbalance_depth> levels, kept by the OrderBook
+
+    def __repr__(self):
+        return 'PriceLevel({!r}, {!r})'.format(self.quantity, self.order_ids)
 
 
 class OrderBook:
 
     def __init__(self,
                  max_levels=5,
-                 logging_enabled=False):
+                 logging_enabled=False,
+                 full_depth=False,
+                 tick_size=None,
+                 lot_size=None,
+                 imbalance_depth=5):  # Best levels per side summed for the depth imbalance
         # Feature for space efficiency -> only track the best <max_levels> levels
-        # Also has minor impact on time efficiency for whenever the levels need to be sorted
         self.max_levels = max_levels
 
+        # Keep every resting order instead of only the best <max_levels> levels, so the inside levels can refill from
+        # deeper orders after a sweep. Inside level queries stay cheap since they only read the top of each ladder.
+        self.full_depth = full_depth
+
         self.logging_enabled = logging_enabled
 
-        # Dict<String, Pair<Decimal, Set<String>>>
-        # {Level Price : ( Level Quantity , { Order Ids } ) }
-        # Ex: {"100.00" : ( 1.5, {"a1", "b2", "c3"} ) }
+        # Fixed point mode -> given the product's tick and lot size, prices and sizes are parsed once into integer
+        # multiples of them, so level keys are ints and all book arithmetic is int arithmetic. Use to_decimal_price and
+        # to_decimal_size to convert back when rendering.
+        if (tick_size is not None) and (lot_size is not None):
+            self.price_scale = FixedPointScale(tick_size)
+            self.size_scale = FixedPointScale(lot_size)
+            self._parse_price = self.price_scale.to_units
+            self._parse_size = self.size_scale.to_units
+            self._ladder_price = int  # Level keys are already numeric
+            self._no_price = -1
+        else:
+            self.price_scale = None
+            self.size_scale = None
+            self._parse_price = sys.intern  # Interned so every order at a level shares one price string with the key
+            self._parse_size = D
+            self._ladder_price = D
+            self._no_price = D('-1.0')
+
+        # Incremented after every change to the book's contents, so readers can tell whether anything they derived from
+        # the book (ex: a rendered printout of the inside levels) is still current
+        self.version = 0
+
+        # Microstructure, kept up to date as events are applied so reading it is O(1) (see get_microstructure)
+        # Quantity resting in the best <imbalance_depth> levels of each side, adjusted whenever one of those levels
+        # changes, or a level enters or leaves them
+        self.imbalance_depth = imbalance_depth
+        self.ask_inside_quantity = self._parse_size('0')
+        self.bid_inside_quantity = self._parse_size('0')
+        # Every `match` since the book was created, whether or not its maker was in the book -> session VWAP. Kept
+        # across clear(), since a resync doesn't undo trades. Sizes and notional are in the book's units.
+        self.trade_count = 0
+        self.traded_volume = self._parse_size('0')
+        self.traded_notional = self._parse_size('0')
+
+        # Sorted price index for each side -> O(1) best/worst level lookups, O(log n) level insertion/removal
+        self._ask_ladder = PriceLadder()
+        self._bid_ladder = PriceLadder(descending=True)
+
+        # Dict<String, PriceLevel<Decimal, Set<String>>> (Dict<Int, PriceLevel<Int, Set<String>>> in fixed point mode)
+        # {Level Price : PriceLevel( Level Quantity , { Order Ids } ) }
+        # Ex: {"100.00" : PriceLevel( 1.5, {"a1", "b2", "c3"} ) }
         self.best_ask_levels = {}
         self.best_bid_levels = {}
 
-        # Dict<String, Pair<String, Decimal>>
-        # {Order Id : ( Order Price , Order Quantity ) }
-        # Ex: {"a1" : ( "100.00", 0.5 ) }
+        # Dict<String, Order<String, Decimal>> (Dict<String, Order<Int, Int>> in fixed point mode)
+        # {Order Id : Order( Order Price , Order Quantity ) }
+        # Ex: {"a1" : Order( "100.00", 0.5 ) }
         self.ask_ids = {}
         self.bid_ids = {}
 
-        self.worst_ask_price = D('-1.0')
-        self.worst_bid_price = D('-1.0')
+        self.worst_ask_price = self._no_price
+        self.worst_bid_price = self._no_price
+
+        # Exchange sequence number of the last event applied to the book, None until the book is seeded by a snapshot
+        self.sequence = None
+
+    # Level dicts can be swapped out wholesale (e.g. when seeding a book), so keep each side's ladder in sync with them
+
+    @property
+    def best_ask_levels(self):
+        return self._best_ask_levels
+
+    @best_ask_levels.setter
+    def best_ask_levels(self, levels):
+        self._best_ask_levels = levels
+        self._ask_ladder.rebuild((self._ladder_price(price), price) for price in levels)
+        self.ask_inside_quantity = self._mark_inside_levels(self._ask_ladder, levels)
+        self.version += 1
+
+    @property
+    def best_bid_levels(self):
+        return self._best_bid_levels
+
+    @best_bid_levels.setter
+    def best_bid_levels(self, levels):
+        self._best_bid_levels = levels
+        self._bid_ladder.rebuild((self._ladder_price(price), price) for price in levels)
+        self.bid_inside_quantity = self._mark_inside_levels(self._bid_ladder, levels)
+        self.version += 1
+
+    # Accessors
+
+    def to_decimal_price(self, price):
+        if self.price_scale is None:
+            return D(price)
+        return self.price_scale.to_decimal(price)
+
+    def to_decimal_size(self, size):
+        if self.size_scale is None:
+            return size
+        return self.size_scale.to_decimal(size)
+
+    def to_float_price(self, price):
+        if self.price_scale is None:
+            return float(price)
+        return self.price_scale.to_float(price)
+
+    def to_float_size(self, size):
+        if self.size_scale is None:
+            return float(size)
+        return self.size_scale.to_float(size)
+
+    def get_inside_ask_levels(self, level_count):
+        # List<Pair<String, Decimal>> (List<Pair<Int, Int>> in fixed point mode), best level first
+        # Ex: [ ( "100.00", 1.5 ), ( "100.01", 0.25 ) ]
+        return self._get_inside_levels(self._ask_ladder, self._best_ask_levels, level_count)
+
+    def get_inside_bid_levels(self, level_count):
+        # List<Pair<String, Decimal>> (List<Pair<Int, Int>> in fixed point mode), best level first
+        # Ex: [ ( "99.99", 2.0 ), ( "99.98", 0.75 ) ]
+        return self._get_inside_levels(self._bid_ladder, self._best_bid_levels, level_count)
+
+    def get_inside_ask_level_records(self, level_count):
+        # List<Pair<String, PriceLevel>> (List<Pair<Int, PriceLevel>> in fixed point mode), best level first
+        return self._get_inside_level_records(self._ask_ladder, self._best_ask_levels, level_count)
+
+    def get_inside_bid_level_records(self, level_count):
+        # List<Pair<String, PriceLevel>> (List<Pair<Int, PriceLevel>> in fixed point mode), best level first
+        return self._get_inside_level_records(self._bid_ladder, self._best_bid_levels, level_count)
+
+    def get_microstructure(self):
+        # Dict -> Decimals from the best levels and the running sums, None where a side (or any trade) is missing
+        # Ex: {"mid": D("100.005"), "spread": D("0.01"), "microprice": D("100.0075"), "imbalance": D("0.5"),
+        #      "imbalance_depth": 5, "ask_depth": D("1.0"), "bid_depth": D("3.0"), "vwap": D("100.0042"),
+        #      "traded_volume": D("12.5"), "trade_count": 40}
+        # imbalance is (bid depth - ask depth) / (bid depth + ask depth) over the best <imbalance_depth> levels, from
+        # -1 (all asks) to 1 (all bids). microprice is the best prices weighted by the opposite side's best quantity.
+        best_ask = self._ask_ladder.best()
+        best_bid = self._bid_ladder.best()
+        ask_depth = self.to_decimal_size(self.ask_inside_quantity)
+        bid_depth = self.to_decimal_size(self.bid_inside_quantity)
+        microstructure = {'mid': None, 'spread': None, 'microprice': None, 'imbalance': None,
+                          'imbalance_depth': self.imbalance_depth, 'ask_depth': ask_depth, 'bid_depth': bid_depth,
+                          'vwap': None, 'traded_volume': self.to_decimal_size(self.traded_volume),
+                          'trade_count': self.trade_count}
+        if (best_ask is not None) and (best_bid is not None):
+            ask_price = self.to_decimal_price(best_ask)
+            bid_price = self.to_decimal_price(best_bid)
+            ask_quantity = self.to_decimal_size(self._best_ask_levels[best_ask].quantity)
+            bid_quantity = self.to_decimal_size(self._best_bid_levels[best_bid].quantity)
+            microstructure['mid'] = (ask_price + bid_price) / 2
+            microstructure['spread'] = ask_price - bid_price
+            if ask_quantity + bid_quantity > 0:
+                microstructure['microprice'] = ((ask_price * bid_quantity + bid_price * ask_quantity) /
+                                                (ask_quantity + bid_quantity))
+        if ask_depth + bid_depth > 0:
+            microstructure['imbalance'] = (bid_depth - ask_depth) / (bid_depth + ask_depth)
+        if self.traded_volume:
+            vwap = D(self.traded_notional) / self.traded_volume
+            if self.price_scale is not None:
+                # Notional is in ticks x lots -> ticks, then a price
+                vwap = vwap * self.price_scale.increment
+            microstructure['vwap'] = vwap
+        return microstructure
+
+    @staticmethod
+    def _get_inside_levels(ladder, level_map, level_count):
+        levels = []
+        for price in ladder.top(level_count):
+            level = level_map.get(price)
+            if level is not None:  # Level may have been removed by the feed thread since the ladder was read
+                levels.append((price, level.quantity))
+        return levels
+
+    @staticmethod
+    def _get_inside_level_records(ladder, level_map, level_count):
+        records = []
+        for price in ladder.top(level_count):
+            level = level_map.get(price)
+            if level is not None:  # Level may have been removed by the feed thread since the ladder was read
+                records.append((price, level))
+        return records
+
+    # Snapshots
+
+    def clear(self):
+        self.best_ask_levels = {}
+        self.best_bid_levels = {}
+        self.ask_ids = {}
+        self.bid_ids = {}
+        self.worst_ask_price = self._no_price
+        self.worst_bid_price = self._no_price
+        self.sequence = None
+        self.version += 1
+
+    def load_snapshot(self, snapshot):
+        # Replace the book's contents with a level 3 snapshot from the REST API
+        # Ex: {"sequence": 3, "asks": [ [ "100.01", "0.5", "a1" ] ], "bids": [ [ "99.99", "1.0", "b2" ] ]}
+        self.clear()
+        for (side, orders) in (('sell', snapshot['asks']), ('buy', snapshot['bids'])):
+            for (price, size, order_id) in orders:
+                self._open({'order_id': order_id, 'side': side, 'price': price, 'remaining_size': size})
+        self.sequence = int(snapshot['sequence'])
+
+    # Batches
+
+    def apply_batch(self, events):
+        # Apply a list or iterator of events in one go (ex: when rebuilding a book from captured messages). Dispatch is a
+        # single dict lookup and no-op types (`received`, `activate`) fall straight through. Returns the number of
+        # events applied.
+        handlers = {'open': self._open, 'done': self._done, 'match': self._match, 'change': self._change}
+        applied_count = 0
+        for event in events:
+            handler = handlers.get(event.get('type'))
+            if handler is not None:
+                handler(event)
+                applied_count += 1
+        return applied_count
 
     def handle_event(self, event):
         if 'type' not in event:
@@ -64,77 +293,75 @@ class OrderBook:
         pass  # Do nothing for `received` events in this project
 
     def _open(self, event):
+        self.open_order(event['order_id'], event['side'], self._parse_price(event['price']),
+                        self._parse_size(event['remaining_size']))
+
+    def _done(self, event):
+        self.done_order(event['order_id'], event['side'])
+
+    def _match(self, event):
+        # Only care about maker id since that's the resting order
+        self.match_order(event['maker_order_id'], event['side'], self._parse_size(event['size']),
+                         self._parse_price(event['price']))
+
+    def _change(self, event):
+        pass  # TODO: While change orders are important, in practice they essentially never occur -> deprioritize
+
+    def _activate(self, event):
+        pass  # Do nothing for `activate` events in this project
+
+    # Parsed Event Handlers -> price and size already in the book's units (Ex: integer ticks and lots in fixed point
+    # mode), so events decoded elsewhere (ex: from an EventFile, see event_file.py) skip the string parsing
 
-        order_id = event['order_id']
-        order_side = event['side']
-        order_price = event['price']
-        order_price_float = D(order_price)
-        order_size = D(event['remaining_size'])
+    def open_order(self, order_id, order_side, order_price, order_size):
 
         if 'sell' == order_side:
-            if order_price not in self.best_ask_levels:
+            level = self._best_ask_levels.get(order_price)
+            if level is None:
+                order_price_value = self._ladder_price(order_price)
 
-                if len(self.best_ask_levels) < self.max_levels:
-                    # Our book is not full, so simply add the new level and update class variables
-                    self.best_ask_levels[order_price] = (order_size, {order_id})
-                    self.ask_ids[order_id] = (order_price, order_size)
-                    if self.worst_ask_price < order_price_float:
-                        self.worst_ask_price = order_price_float
+                if self.full_depth or len(self._best_ask_levels) < self.max_levels:
+                    # Our book is not full (or is unbounded), so simply add the new level
+                    self._add_sell_level(order_price, order_price_value, order_id, order_size)
 
-                elif self.worst_ask_price > order_price_float:
+                elif self._ask_ladder.worst_price() > order_price_value:
                     # Our book is full but the new level is better than our worst, so add it and remove the worst
-                    self.best_ask_levels[order_price] = (order_size, {order_id})
-                    self.ask_ids[order_id] = (order_price, order_size)
+                    self._add_sell_level(order_price, order_price_value, order_id, order_size)
 
-                    sorted_ask_prices = sorted(self.best_ask_levels.keys())
-                    to_remove_price = sorted_ask_prices[-1]
-                    self.worst_ask_price = D(sorted_ask_prices[-2])
-
-                    # Remove orders from ask_ids dictionary for the level we will be removing, then remove that level
-                    for order_id in self.best_ask_levels[to_remove_price][1]:
-                        del self.ask_ids[order_id]
-                    del self.best_ask_levels[to_remove_price]
+                    self._evict_worst_sell_level()
 
             else:
-                (quantity, order_ids) = self.best_ask_levels[order_price]
-                order_ids.add(order_id)
-                self.best_ask_levels[order_price] = (quantity + order_size, order_ids)
-                self.ask_ids[order_id] = (order_price, order_size)
+                level.quantity += order_size
+                if level.inside:
+                    self.ask_inside_quantity += order_size
+                level.order_ids.add(order_id)
+                self.ask_ids[order_id] = Order(order_price, order_size)
+                self.version += 1
 
         elif 'buy' == order_side:
-            if order_price not in self.best_bid_levels:
+            level = self._best_bid_levels.get(order_price)
+            if level is None:
+                order_price_value = self._ladder_price(order_price)
 
-                if len(self.best_bid_levels) < self.max_levels:
-                    # Our book is not full, so simply add the new level and update class variables
-                    self.best_bid_levels[order_price] = (order_size, {order_id})
-                    self.bid_ids[order_id] = (order_price, order_size)
-                    if (self.worst_bid_price > order_price_float) or (self.worst_bid_price == D("-1.0")):
-                        self.worst_bid_price = order_price_float
+                if self.full_depth or len(self._best_bid_levels) < self.max_levels:
+                    # Our book is not full (or is unbounded), so simply add the new level
+                    self._add_buy_level(order_price, order_price_value, order_id, order_size)
 
-                elif self.worst_bid_price < order_price_float:
+                elif self._bid_ladder.worst_price() < order_price_value:
                     # Our book is full but the new level is better than our worst, so add it and remove the worst
-                    self.best_bid_levels[order_price] = (order_size, {order_id})
-                    self.bid_ids[order_id] = (order_price, order_size)
-
-                    sorted_bid_prices = sorted(self.best_bid_levels.keys())
-                    to_remove_price = sorted_bid_prices[0]
-                    self.worst_bid_price = D(sorted_bid_prices[1])
+                    self._add_buy_level(order_price, order_price_value, order_id, order_size)
 
-                    # Remove orders from bid_ids dictionary for the level we will be removing, then remove that level
-                    for order_id in self.best_bid_levels[to_remove_price][1]:
-                        del self.bid_ids[order_id]
-                    del self.best_bid_levels[to_remove_price]
+                    self._evict_worst_buy_level()
 
             else:
-                (quantity, order_ids) = self.best_bid_levels[order_price]
-                order_ids.add(order_id)
-                self.best_bid_levels[order_price] = (quantity + order_size, order_ids)
-                self.bid_ids[order_id] = (order_price, order_size)
-
-    def _done(self, event):
+                level.quantity += order_size
+                if level.inside:
+                    self.bid_inside_quantity += order_size
+                level.order_ids.add(order_id)
+                self.bid_ids[order_id] = Order(order_price, order_size)
+                self.version += 1
 
-        order_id = event['order_id']
-        order_side = event['side']
+    def done_order(self, order_id, order_side):
 
         if ('sell' == order_side) and (order_id in self.ask_ids):
             self._remove_sell_order(order_id)
@@ -142,92 +369,172 @@ class OrderBook:
         if ('buy' == order_side) and (order_id in self.bid_ids):
             self._remove_buy_order(order_id)
 
-    def _match(self, event):
-
-        order_id = event['maker_order_id']  # Only care about maker id since that's the resting order
-        order_side = event['side']
-        order_size = D(event['size'])
+    def match_order(self, order_id, order_side, order_size, trade_price=None):
 
-        if ('sell' == order_side) and (order_id in self.ask_ids):
-            (price, quantity) = self.ask_ids[order_id]
-            if quantity == order_size:
-                # Maker order was completely filled -> remove from book
-                self._remove_sell_order(order_id)
-            else:
-                # Maker order was partially filled -> adjust respective data structures
-                self._adjust_sell_order(order_id, D(order_size))
-
-        elif ('buy' == order_side) and (order_id in self.bid_ids):
-            (price, quantity) = self.bid_ids[order_id]
-            if quantity == order_size:
-                # Maker order was completely filled -> remove from book
-                self._remove_buy_order(order_id)
-            else:
-                # Maker order was partially filled -> adjust respective data structures
-                self._adjust_buy_order(order_id, D(order_size))
+        if trade_price is not None:
+            self.trade_count += 1
+            self.traded_volume += order_size
+            self.traded_notional += self._ladder_price(trade_price) * order_size
 
-    def _change(self, event):
-        pass  # TODO: While change orders are important, in practice they essentially never occur -> deprioritize
+        if 'sell' == order_side:
+            order = self.ask_ids.get(order_id)
+            if order is not None:
+                if order.size == order_size:
+                    # Maker order was completely filled -> remove from book
+                    self._remove_sell_order(order_id)
+                else:
+                    # Maker order was partially filled -> adjust respective data structures
+                    self._adjust_sell_order(order, order_size)
 
-    def _activate(self, event):
-        pass  # Do nothing for `activate` events in this project
+        elif 'buy' == order_side:
+            order = self.bid_ids.get(order_id)
+            if order is not None:
+                if order.size == order_size:
+                    # Maker order was completely filled -> remove from book
+                    self._remove_buy_order(order_id)
+                else:
+                    # Maker order was partially filled -> adjust respective data structures
+                    self._adjust_buy_order(order, order_size)
 
     # Helpers
 
+    def _add_sell_level(self, price, price_value, order_id, order_size):
+        level = self._best_ask_levels[price] = PriceLevel(order_size, {order_id})
+        self.ask_ids[order_id] = Order(price, order_size)
+        index = self._ask_ladder.add(price_value, price)
+        if index == len(self._ask_ladder) - 1:
+            self.worst_ask_price = price_value
+        if index < self.imbalance_depth:
+            self.ask_inside_quantity += self._enter_inside_levels(self._ask_ladder, self._best_ask_levels, level)
+        self.version += 1
+
+    def _add_buy_level(self, price, price_value, order_id, order_size):
+        level = self._best_bid_levels[price] = PriceLevel(order_size, {order_id})
+        self.bid_ids[order_id] = Order(price, order_size)
+        index = self._bid_ladder.add(price_value, price)
+        if index == len(self._bid_ladder) - 1:
+            self.worst_bid_price = price_value
+        if index < self.imbalance_depth:
+            self.bid_inside_quantity += self._enter_inside_levels(self._bid_ladder, self._best_bid_levels, level)
+        self.version += 1
+
+    def _evict_worst_sell_level(self):
+        # Remove orders from ask_ids dictionary for the level we will be removing, then remove that level
+        to_remove_price = self._ask_ladder.pop_worst()
+        level = self._best_ask_levels.pop(to_remove_price)
+        for order_id in level.order_ids:
+            del self.ask_ids[order_id]
+        if level.inside:
+            self.ask_inside_quantity += self._leave_inside_levels(self._ask_ladder, self._best_ask_levels, level)
+        self.worst_ask_price = self._ask_ladder.worst_price() if len(self._ask_ladder) else self._no_price
+        self.version += 1
+
+    def _evict_worst_buy_level(self):
+        # Remove orders from bid_ids dictionary for the level we will be removing, then remove that level
+        to_remove_price = self._bid_ladder.pop_worst()
+        level = self._best_bid_levels.pop(to_remove_price)
+        for order_id in level.order_ids:
+            del self.bid_ids[order_id]
+        if level.inside:
+            self.bid_inside_quantity += self._leave_inside_levels(self._bid_ladder, self._best_bid_levels, level)
+        self.worst_bid_price = self._bid_ladder.worst_price() if len(self._bid_ladder) else self._no_price
+        self.version += 1
+
     def _remove_sell_order(self, order_id):
-        (price, quantity) = self.ask_ids[order_id]
-        (level_quantity, level_ids) = self.best_ask_levels[price]
+        order = self.ask_ids.pop(order_id)
+        price = order.price
+        level = self._best_ask_levels[price]
 
-        level_ids.remove(order_id)
+        level.order_ids.remove(order_id)
 
-        if len(level_ids) == 0:
+        if len(level.order_ids) == 0:
             # This is only order in level -> Remove entire level and update worst level if needed
-            sorted_ask_prices = sorted(self.best_ask_levels.keys())
-            if D(price) == self.worst_ask_price:
-                if len(sorted_ask_prices) == 1:
+            if self._ask_ladder.remove(self._ladder_price(price), price) == len(self._ask_ladder):
+                if len(self._ask_ladder) == 0:
                     # This is only ask level -> reset globals
-                    self.worst_ask_price = D("-1.0")
+                    self.worst_ask_price = self._no_price
                 else:
-                    self.worst_ask_price = D(sorted_ask_prices[-2])
-            del self.best_ask_levels[price]
+                    self.worst_ask_price = self._ask_ladder.worst_price()
+            del self._best_ask_levels[price]
+            if level.inside:
+                self.ask_inside_quantity += self._leave_inside_levels(self._ask_ladder, self._best_ask_levels, level)
         else:
-            level_quantity -= quantity
-            self.best_ask_levels[price] = (level_quantity, level_ids)
-
-        del self.ask_ids[order_id]
+            level.quantity -= order.size
+            if level.inside:
+                self.ask_inside_quantity -= order.size
+        self.version += 1
 
     def _remove_buy_order(self, order_id):
-        (price, quantity) = self.bid_ids[order_id]
-        (level_quantity, level_ids) = self.best_bid_levels[price]
+        order = self.bid_ids.pop(order_id)
+        price = order.price
+        level = self._best_bid_levels[price]
 
-        level_ids.remove(order_id)
+        level.order_ids.remove(order_id)
 
-        if len(level_ids) == 0:
+        if len(level.order_ids) == 0:
             # This is only order in level -> Remove entire level and update worst level if needed
-            sorted_bid_prices = sorted(self.best_bid_levels.keys())
-            if D(price) == self.worst_bid_price:
-                if len(sorted_bid_prices) == 1:
+            if self._bid_ladder.remove(self._ladder_price(price), price) == len(self._bid_ladder):
+                if len(self._bid_ladder) == 0:
                     # This is only bid level -> reset globals
-                    self.worst_bid_price = D("-1.0")
+                    self.worst_bid_price = self._no_price
                 else:
-                    self.worst_bid_price = D(sorted_bid_prices[1])
-            del self.best_bid_levels[price]
+                    self.worst_bid_price = self._bid_ladder.worst_price()
+            del self._best_bid_levels[price]
+            if level.inside:
+                self.bid_inside_quantity += self._leave_inside_levels(self._bid_ladder, self._best_bid_levels, level)
         else:
-            level_quantity -= quantity
-            self.best_bid_levels[price] = (level_quantity, level_ids)
-
-        del self.bid_ids[order_id]
-
-    def _adjust_sell_order(self, order_id, quantity_delta):
-        (price, quantity) = self.ask_ids[order_id]
-        self.ask_ids[order_id] = (price, quantity - quantity_delta)
-
-        (level_quantity, level_ids) = self.best_ask_levels[price]
-        self.best_ask_levels[price] = (level_quantity - quantity_delta, level_ids)
-
-    def _adjust_buy_order(self, order_id, quantity_delta):
-        (price, quantity) = self.bid_ids[order_id]
-        self.bid_ids[order_id] = (price, quantity - quantity_delta)
-
-        (level_quantity, level_ids) = self.best_bid_levels[price]
-        self.best_bid_levels[price] = (level_quantity - quantity_delta, level_ids)
+            level.quantity -= order.size
+            if level.inside:
+                self.bid_inside_quantity -= order.size
+        self.version += 1
+
+    def _adjust_sell_order(self, order, quantity_delta):
+        order.size -= quantity_delta
+        level = self._best_ask_levels[order.price]
+        level.quantity -= quantity_delta
+        if level.inside:
+            self.ask_inside_quantity -= quantity_delta
+        self.version += 1
+
+    def _adjust_buy_order(self, order, quantity_delta):
+        order.size -= quantity_delta
+        level = self._best_bid_levels[order.price]
+        level.quantity -= quantity_delta
+        if level.inside:
+            self.bid_inside_quantity -= quantity_delta
+        self.version += 1
+
+    # Inside level sums -> a side's best <imbalance_depth> levels are flagged `inside`. Each helper returns the change
+    # to the side's inside quantity, and only the one level crossing the boundary ever has to be looked up. Called
+    # with <level_map> already in step with <ladder>, so its (C level) len stands in for the ladder's.
+
+    def _enter_inside_levels(self, ladder, level_map, level):
+        # <level> was just added to <ladder> among the best levels, pushing the level behind them out
+        level.inside = True
+        depth = self.imbalance_depth
+        if len(level_map) > depth:
+            pushed_out = level_map[ladder.key_at(depth)]
+            pushed_out.inside = False
+            return level.quantity - pushed_out.quantity
+        return level.quantity
+
+    def _leave_inside_levels(self, ladder, level_map, level):
+        # <level>, one of the best levels, was just removed from <ladder>, pulling the next level in
+        level.inside = False
+        depth = self.imbalance_depth
+        if len(level_map) >= depth:
+            pulled_in = level_map[ladder.key_at(depth - 1)]
+            pulled_in.inside = True
+            return pulled_in.quantity - level.quantity
+        return -level.quantity
+
+    def _mark_inside_levels(self, ladder, level_map):
+        # Flags from scratch after a wholesale swap of <level_map> -> the side's inside quantity
+        for level in level_map.values():
+            level.inside = False
+        quantity = self._parse_size('0')
+        for price in ladder.top(self.imbalance_depth):
+            level = level_map[price]
+            level.inside = True
+            quantity += level.quantity
+        return quantity
@@ -0,0 +1,451 @@
+# market_data_feed/order_book_manager.py
+# original author: Jacob Brown
+#
+#
+# Owns one OrderBook per product and routes each `full` channel message to its product's book by `product_id`. Books can
+# either live in this process (OrderBookManager) or be sharded across worker processes that each own a subset of the
+# products (ShardedOrderBookManager) for when one core can't keep up with the whole feed.
+#
+# Other threads (ex: API requests) read a book through a seqlock rather than a lock -> the feed thread bumps the
+# product's write sequence before and after every update, so it's odd mid update, and a reader retries until it has read
+# both sides without the sequence moving. What it read is published as an immutable BookSnapshot with a single reference
+# swap, which later readers share until the book changes again.
+
+import time
+import logging
+import multiprocessing
+from threading import Lock, Thread, Event
+from multiprocessing.connection import wait
+from .order_book import OrderBook
+from .book_sync import BookSynchronizer
+from .trade_tape import TradeTape
+
+
+class BookSnapshot:
+    # Inside levels of both sides of one product's book, read at one version and never modified once published
+
+    __slots__ = ('product_id', 'version', 'time', 'write_sequence', 'level_count', 'asks', 'bids', 'ask_order_counts',
+                 'bid_order_counts')
+
+    def __init__(self, product_id, version, time, write_sequence, level_count, asks, bids, ask_order_counts,
+                 bid_order_counts):
+        self.product_id = product_id
+        self.version = version
+        self.time = time  # Exchange timestamp of the last event applied to the book, None before the first
+        self.write_sequence = write_sequence
+        self.level_count = level_count  # Levels per side asked for, a side may have fewer
+        self.asks = asks  # Tuple<Pair<Decimal, Decimal>> -> ( Price , Quantity ), best level first
+        self.bids = bids
+        self.ask_order_counts = ask_order_counts  # Tuple<Int> -> resting orders per level, in the order of <asks>
+        self.bid_order_counts = bid_order_counts
+
+    def __repr__(self):
+        return "BookSnapshot({}, version={}, asks={}, bids={})".format(self.product_id, self.version, self.asks,
+                                                                       self.bids)
+
+
+class ProductBook:
+
+    def __init__(self,
+                 product_id,
+                 order_book,
+                 snapshot_loader=None,
+                 trade_tape=None,  # TradeTape recording the product's `match` events, a default one when None
+                 sync_kwargs=None):  # Keyword arguments for the BookSynchronizer (ex: background_load)
+        self.product_id = product_id
+        self.order_book = order_book
+        self.snapshot_loader = snapshot_loader
+        self.sync_kwargs = sync_kwargs or {}
+        self.book_sync = None
+        # Trades outlive book resets and resyncs, since those don't undo them
+        self.trade_tape = trade_tape if trade_tape is not None else TradeTape()
+
+        self.write_sequence = 0  # Seqlock, odd while an update is being applied
+        self._snapshot = None  # Latest BookSnapshot read
+        self.last_event_time = None
+
+        # Statistics
+        self.message_type_count = {}
+        self.total_message_count = 0
+        self.snapshot_retry_count = 0  # Reads started again because an update landed part way through
+
+    def reset(self):
+        # Fresh connection, or messages were lost -> with a snapshot loader, the book is rebuilt from a new snapshot on
+        # the first message. Without one it starts over empty and fills back up from new orders, rather than keeping
+        # orders whose `done` may have been missed.
+        self.write_sequence += 1
+        try:
+            self.order_book.clear()
+            if self.snapshot_loader is not None:
+                self.book_sync = BookSynchronizer(self.order_book, self.product_id, self.snapshot_loader,
+                                                  **self.sync_kwargs)
+        finally:
+            self.write_sequence += 1
+
+    def set_order_book(self, order_book):
+        self.order_book = order_book
+        self.write_sequence += 2
+
+    def handle_event(self, event):
+        event_type = event.get('type')
+        self.message_type_count[event_type] = self.message_type_count.get(event_type, 0) + 1
+        self.total_message_count += 1
+
+        self.write_sequence += 1
+        try:
+            self.last_event_time = event.get('time')
+            if event_type == 'match':
+                self.trade_tape.record_match(event)
+            if self.book_sync is None:
+                self.order_book.handle_event(event)
+            else:
+                self.book_sync.handle_event(event)
+        finally:
+            self.write_sequence += 1
+
+    def get_snapshot(self, level_count):
+        # BookSnapshot of at least <level_count> levels a side, consistent across both sides. Safe from any thread but
+        # the feed thread in the middle of an update, which would wait on itself.
+        snapshot = self._snapshot
+        if snapshot is not None:
+            # Version is checked too, for books updated directly rather than through handle_event (ex: in tests)
+            if ((snapshot.write_sequence == self.write_sequence) and (snapshot.version == self.order_book.version) and
+                    (snapshot.level_count >= level_count)):
+                return snapshot
+            level_count = max(level_count, snapshot.level_count)  # Deepest reader's depth, so readers don't thrash
+
+        while True:
+            sequence = self.write_sequence
+            if sequence & 1:
+                time.sleep(0)  # Update in progress -> let the feed thread finish it
+                continue
+            order_book = self.order_book
+            try:
+                version = order_book.version
+                event_time = self.last_event_time
+                ask_records = order_book.get_inside_ask_level_records(level_count)
+                bid_records = order_book.get_inside_bid_level_records(level_count)
+                asks = tuple((order_book.to_decimal_price(price), order_book.to_decimal_size(level.quantity))
+                             for (price, level) in ask_records)
+                bids = tuple((order_book.to_decimal_price(price), order_book.to_decimal_size(level.quantity))
+                             for (price, level) in bid_records)
+                ask_order_counts = tuple(len(level.order_ids) for (_, level) in ask_records)
+                bid_order_counts = tuple(len(level.order_ids) for (_, level) in bid_records)
+            except (RuntimeError, KeyError, IndexError):
+                # Structures changed under the read (ex: dictionary changed size during iteration) -> retried below
+                sequence = None
+            if sequence == self.write_sequence:
+                break
+            self.snapshot_retry_count += 1
+
+        snapshot = BookSnapshot(self.product_id, version, event_time, sequence, level_count, asks, bids,
+                                ask_order_counts, bid_order_counts)
+        self._snapshot = snapshot
+        return snapshot
+
+    def get_inside_levels(self, level_count, known_version=None):
+        # Triple<Int, List<Pair<Decimal, Decimal>>, List<Pair<Decimal, Decimal>>>
+        # ( Book Version , [ ( Ask Price , Ask Quantity ) ] , [ ( Bid Price , Bid Quantity ) ] ), best level first.
+        # Levels are None when the book is still at <known_version>.
+        if self.order_book.version == known_version:
+            return known_version, None, None
+        snapshot = self.get_snapshot(level_count)
+        return snapshot.version, list(snapshot.asks[:level_count]), list(snapshot.bids[:level_count])
+
+    def get_microstructure(self):
+        # OrderBook.get_microstructure as of one book version
+        order_book = self.order_book
+        (version, microstructure) = self._read(lambda: (order_book.version, order_book.get_microstructure()))
+        microstructure['product_id'] = self.product_id
+        microstructure['version'] = version
+        return microstructure
+
+    def get_trades(self, count=None):
+        # ndarray<TRADE_DTYPE> -> copy of the last <count> trades, oldest first (see trade_tape.py)
+        return self._read(lambda: self.trade_tape.get_trades(count))
+
+    def get_bars(self, resolution, count=None):
+        # ndarray<BAR_DTYPE> -> copy of the last <count> OHLCV bars at <resolution> (ex: "1m"), oldest first
+        if resolution not in self.trade_tape.resolution_names:
+            raise ValueError("Unknown resolution ({}), expected one of {}".format(
+                resolution, self.trade_tape.resolution_names))
+        return self._read(lambda: self.trade_tape.get_bars(resolution, count))
+
+    def _read(self, read):
+        # Result of <read> run without an update landing part way through, through the seqlock like get_snapshot
+        while True:
+            sequence = self.write_sequence
+            if sequence & 1:
+                time.sleep(0)  # Update in progress -> let the feed thread finish it
+                continue
+            try:
+                result = read()
+            except (RuntimeError, KeyError, IndexError):
+                sequence = None  # Structures changed under the read -> retried below
+            if sequence == self.write_sequence:
+                return result
+            self.snapshot_retry_count += 1
+
+    def get_stats(self):
+        order_book = self.order_book
+        stats = {'product_id': self.product_id,
+                 'total_message_count': self.total_message_count,
+                 'message_type_count': dict(self.message_type_count),
+                 'ask_level_count': len(order_book.best_ask_levels),
+                 'bid_level_count': len(order_book.best_bid_levels),
+                 'ask_order_count': len(order_book.ask_ids),
+                 'bid_order_count': len(order_book.bid_ids),
+                 'version': order_book.version,
+                 'sequence': order_book.sequence,
+                 'snapshot_retry_count': self.snapshot_retry_count,
+                 'trade_tape': self.trade_tape.get_stats()}
+        if self.book_sync is not None:
+            stats['book_sync'] = self.book_sync.get_stats()
+        return stats
+
+
+class OrderBookManager:
+
+    def __init__(self,
+                 products,
+                 book_kwargs=None,  # Keyword arguments for each product's OrderBook (ex: max_levels, tick_size)
+                 snapshot_loader=None,
+                 tape_kwargs=None,  # Keyword arguments for each product's TradeTape (ex: capacity)
+                 sync_kwargs=None):  # Keyword arguments for each product's BookSynchronizer (ex: background_load)
+        self.products = list(products)
+        self.book_kwargs = book_kwargs or {}
+        self.tape_kwargs = tape_kwargs or {}
+        self.sync_kwargs = sync_kwargs or {}
+
+        # Dict<String, ProductBook> -> {Product Id : ProductBook}
+        self.product_books = {product_id: ProductBook(product_id, OrderBook(**self.book_kwargs), snapshot_loader,
+                                                      TradeTape(**self.tape_kwargs), self.sync_kwargs)
+                              for product_id in self.products}
+
+    def start(self):
+        pass  # Nothing to start, books live in this process
+
+    def close(self):
+        pass
+
+    def reset(self):
+        for product_book in self.product_books.values():
+            product_book.reset()
+
+    def handle_event(self, event):
+        product_book = self.product_books.get(event.get('product_id'))
+        if product_book is not None:
+            product_book.handle_event(event)
+
+    def get_order_book(self, product_id):
+        return self.product_books[product_id].order_book
+
+    def set_order_book(self, product_id, order_book):
+        self.product_books[product_id].set_order_book(order_book)
+
+    def get_snapshot(self, product_id, level_count):
+        return self.product_books[product_id].get_snapshot(level_count)
+
+    def get_inside_levels(self, product_id, level_count, known_version=None):
+        return self.product_books[product_id].get_inside_levels(level_count, known_version)
+
+    def get_microstructure(self, product_id):
+        return self.product_books[product_id].get_microstructure()
+
+    def get_trades(self, product_id, count=None):
+        return self.product_books[product_id].get_trades(count)
+
+    def get_bars(self, product_id, resolution, count=None):
+        return self.product_books[product_id].get_bars(resolution, count)
+
+    def get_stats(self, product_id):
+        return self.product_books[product_id].get_stats()
+
+
+class ShardedOrderBookManager:
+
+    def __init__(self,
+                 products,
+                 shard_count,
+                 book_kwargs=None,  # Keyword arguments for each product's OrderBook (ex: max_levels, tick_size)
+                 snapshot_loader=None,  # Must be picklable, since it's handed to the worker processes
+                 batch_size=64,  # Messages sent to a worker together, amortizing the pickling and pipe overhead
+                 max_batch_delay=0.005,  # Seconds a message may wait for its batch to fill before being sent anyway
+                 tape_kwargs=None,  # Keyword arguments for each product's TradeTape (ex: capacity)
+                 sync_kwargs=None):  # Keyword arguments for each product's BookSynchronizer (ex: background_load)
+        self.products = list(products)
+        self.shard_count = min(shard_count, len(self.products))
+        self.book_kwargs = book_kwargs or {}
+        self.tape_kwargs = tape_kwargs or {}
+        self.sync_kwargs = sync_kwargs or {}
+        self.snapshot_loader = snapshot_loader
+        self.batch_size = batch_size
+        self.max_batch_delay = max_batch_delay
+
+        # Dict<String, Int> -> {Product Id : Shard Index}, products dealt out round robin
+        self.shard_by_product = {product_id: i % self.shard_count for (i, product_id) in enumerate(self.products)}
+        self._shards = []
+        self._flusher = None
+        self._closing = Event()
+
+    def start(self):
+        if self._shards:
+            return
+        for shard_index in range(self.shard_count):
+            products = [product_id for (product_id, i) in self.shard_by_product.items() if i == shard_index]
+            self._shards.append(_Shard(products, self.book_kwargs, self.snapshot_loader, self.tape_kwargs,
+                                       self.sync_kwargs))
+        self._closing.clear()
+        self._flusher = Thread(target=self._flush_idle, args=(self._shards,), daemon=True)
+        self._flusher.start()
+
+    def close(self):
+        self._closing.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        for shard in self._shards:
+            shard.close()
+        self._shards = []
+
+    def reset(self):
+        self.start()
+        for shard in self._shards:
+            shard.query('reset')
+
+    def handle_event(self, event):
+        shard_index = self.shard_by_product.get(event.get('product_id'))
+        if shard_index is not None:
+            shard = self._shards[shard_index]
+            with shard.lock:
+                shard.pending.append(event)
+                if ((len(shard.pending) >= self.batch_size) or
+                        (time.monotonic() - shard.last_send_time >= self.max_batch_delay)):
+                    shard.send_pending()
+
+    def flush(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.send_pending()
+
+    def get_order_book(self, product_id):
+        raise ValueError("{} book lives in a shard worker process".format(product_id))
+
+    def set_order_book(self, product_id, order_book):
+        raise ValueError("{} book lives in a shard worker process".format(product_id))
+
+    def get_snapshot(self, product_id, level_count):
+        return self._product_query(product_id, 'get_snapshot', level_count)
+
+    def get_inside_levels(self, product_id, level_count, known_version=None):
+        return self._product_query(product_id, 'get_inside_levels', level_count, known_version)
+
+    def get_microstructure(self, product_id):
+        return self._product_query(product_id, 'get_microstructure')
+
+    def get_trades(self, product_id, count=None):
+        trades = self._product_query(product_id, 'get_trades', count)
+        if trades is None:
+            # Worker logs and answers None when a query raises, ex: for a negative count
+            raise ValueError("{} last {} trades not available".format(product_id, count))
+        return trades
+
+    def get_bars(self, product_id, resolution, count=None):
+        bars = self._product_query(product_id, 'get_bars', resolution, count)
+        if bars is None:
+            # Worker logs and answers None when a query raises, ex: for an unknown resolution
+            raise ValueError("{} bars at {} resolution not available".format(product_id, resolution))
+        return bars
+
+    def get_stats(self, product_id):
+        stats = self._product_query(product_id, 'get_stats')
+        if stats is None:
+            raise ValueError("{} stats not available".format(product_id))
+        stats['shard'] = self.shard_by_product[product_id]
+        return stats
+
+    def _product_query(self, product_id, method, *args):
+        self.start()
+        shard = self._shards[self.shard_by_product[product_id]]
+        with shard.lock:
+            shard.send_pending()  # Make sure the worker has seen everything received so far
+        return shard.query(method, product_id, *args)
+
+    def _flush_idle(self, shards):
+        # Flusher thread -> sends batches left partly filled once they're <max_batch_delay> old, since the feed thread
+        # only checks on the next event, which a quiet product may not get for a long while
+        while not self._closing.wait(self.max_batch_delay):
+            for shard in shards:
+                with shard.lock:
+                    if shard.pending and (time.monotonic() - shard.last_send_time >= self.max_batch_delay):
+                        shard.send_pending()
+
+
+class _Shard:
+
+    def __init__(self, products, book_kwargs, snapshot_loader, tape_kwargs, sync_kwargs):
+        (self._event_reader, self._event_writer) = multiprocessing.Pipe(duplex=False)
+        (self._query_conn, worker_query_conn) = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_run_shard,
+            args=(products, book_kwargs, snapshot_loader, tape_kwargs, sync_kwargs, self._event_reader,
+                  worker_query_conn),
+            daemon=True)
+        self.process.start()
+
+        self.lock = Lock()  # Guards pending and the event pipe, shared by the feed thread and query threads
+        self.pending = []
+        self.last_send_time = time.monotonic()
+        self._query_lock = Lock()
+
+    def send_pending(self):
+        if self.pending:
+            self._event_writer.send(self.pending)
+            self.pending = []
+        self.last_send_time = time.monotonic()
+
+    def query(self, method, *args):
+        with self._query_lock:
+            self._query_conn.send((method, args))
+            return self._query_conn.recv()
+
+    def close(self):
+        with self.lock:
+            self.send_pending()
+            self._event_writer.send(None)
+        self.process.join(timeout=5)
+
+
+def _run_shard(products, book_kwargs, snapshot_loader, tape_kwargs, sync_kwargs, event_conn, query_conn):
+    # Worker process main loop -> applies batches of events to its own books and answers queries about them
+    manager = OrderBookManager(products, book_kwargs, snapshot_loader, tape_kwargs, sync_kwargs)
+    while True:
+        for conn in wait([event_conn, query_conn]):
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+
+            if conn is event_conn:
+                if message is None:
+                    return
+                for event in message:
+                    manager.handle_event(event)
+            else:
+                # Every batch sent before the query is already in the event pipe, but wait() doesn't order the two
+                # pipes -> apply those batches first, so the answer covers them
+                try:
+                    while event_conn.poll():
+                        batch = event_conn.recv()
+                        if batch is None:
+                            return
+                        for event in batch:
+                            manager.handle_event(event)
+                except EOFError:
+                    return
+                (method, args) = message
+                try:
+                    query_conn.send(getattr(manager, method)(*args))
+                except Exception as e:
+                    logging.error("Shard query {} failed: {}".format(method, e))
+                    query_conn.send(None)
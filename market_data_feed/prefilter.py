@@ -0,0 +1,107 @@
+# market_data_feed/prefilter.py
+# original author: Jacob Brown
+#
+#
+# Frame prefilter for WebSocketClient -> looks at the start of each raw JSON frame and drops the ones the books don't
+# need before they're decoded, counted or dispatched. Drops every frame of the given message types (by default
+# `received` and `activate`, which the OrderBook ignores and which make up about half of the `full` channel) and,
+# optionally, `open` orders priced outside a band around their product's current mid. Like a book bounded to
+# <max_levels>, an order dropped by the band is never added later if the mid moves towards it. Since dropped frames
+# leave holes in the sequence, a prefilter can't be combined with sequence resyncs (see book_sync.py).
+
+import logging
+
+DEFAULT_DROPPED_EVENT_TYPES = frozenset(('received', 'activate'))
+
+# The feed always sends `type` as the first key of its compact JSON, so a message's type can be told from the start of
+# the frame alone
+_TYPE_PREFIX = '{"type":"'
+_TYPE_PREFIX_LENGTH = len(_TYPE_PREFIX)
+_OPEN_PREFIX = _TYPE_PREFIX + 'open"'
+_PRODUCT_ID_KEY = '"product_id":"'
+_PRODUCT_ID_KEY_LENGTH = len(_PRODUCT_ID_KEY)
+_PRICE_KEY = '"price":"'
+_PRICE_KEY_LENGTH = len(_PRICE_KEY)
+
+
+class FramePrefilter:
+
+    def __init__(self,
+                 dropped_event_types=DEFAULT_DROPPED_EVENT_TYPES,
+                 price_band=None,  # Fraction of the mid (ex: 0.01 -> within 1%) an `open` must be priced within
+                 mid_source=None,  # Callable taking a product id, returning its mid price or None for an empty book
+                 band_refresh_interval=1000):  # `open` frames per product between mid lookups
+        self.dropped_event_types = frozenset(dropped_event_types)
+        self._dropped_prefixes = tuple(_TYPE_PREFIX + event_type + '"' for event_type in self.dropped_event_types)
+        self.price_band = price_band
+        self.mid_source = mid_source
+        self.band_refresh_interval = band_refresh_interval
+
+        # Dict<String, List> -> {Product Id : [ Lowest Price , Highest Price , Frames Until Refresh ]}, prices None
+        # while the mid is unknown
+        self._bands = {}
+
+        # Statistics
+        self.dropped_type_count = {event_type: 0 for event_type in self.dropped_event_types}
+        self.band_dropped_count = 0
+
+    def accept(self, frame):
+        # False when <frame> should be dropped. Anything that doesn't start the usual way (ex: bytes, whitespace, keys
+        # in another order) is let through to be decoded, so a frame is only ever dropped on an exact match.
+        try:
+            if frame.startswith(self._dropped_prefixes):
+                self.dropped_type_count[frame[_TYPE_PREFIX_LENGTH:frame.find('"', _TYPE_PREFIX_LENGTH)]] += 1
+                return False
+            if (self.price_band is not None) and frame.startswith(_OPEN_PREFIX):
+                return self._in_band(frame)
+        except TypeError:
+            pass  # Binary frame
+        return True
+
+    def _in_band(self, frame):
+        start = frame.find(_PRODUCT_ID_KEY)
+        if start < 0:
+            return True
+        start += _PRODUCT_ID_KEY_LENGTH
+        product_id = frame[start:frame.find('"', start)]
+        band = self._bands.get(product_id)
+        if band is None:
+            band = self._bands[product_id] = [None, None, 0]
+        band[2] -= 1
+        if band[2] <= 0:
+            self._refresh_band(product_id, band)
+        if band[0] is None:
+            return True  # Mid unknown (ex: book still empty) -> keep everything
+
+        start = frame.find(_PRICE_KEY)
+        if start < 0:
+            return True
+        start += _PRICE_KEY_LENGTH
+        try:
+            price = float(frame[start:frame.find('"', start)])
+        except ValueError:
+            return True  # Malformed price -> left for the decoder to judge
+        if band[0] <= price <= band[1]:
+            return True
+        self.band_dropped_count += 1
+        return False
+
+    def _refresh_band(self, product_id, band):
+        band[2] = self.band_refresh_interval
+        try:
+            mid = self.mid_source(product_id)
+        except Exception as e:
+            # Books may be mid update on another thread (pipeline mode) -> keep the previous band until the next refresh
+            logging.debug("Price band refresh for {} failed: {}".format(product_id, e))
+            return
+        if mid is None:
+            band[0] = band[1] = None
+        else:
+            mid = float(mid)
+            band[0] = mid * (1 - self.price_band)
+            band[1] = mid * (1 + self.price_band)
+
+    def get_stats(self):
+        return {'dropped_type_count': dict(self.dropped_type_count),
+                'band_dropped_count': self.band_dropped_count,
+                'dropped_count': sum(self.dropped_type_count.values()) + self.band_dropped_count}
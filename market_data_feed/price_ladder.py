@@ -0,0 +1,86 @@
+# market_data_feed/price_ladder.py
+# original author: Jacob Brown
+#
+#
+# Sorted index over the price levels of one side of an OrderBook. Level prices are kept in a bisect-maintained array so
+# the best and worst levels are O(1) lookups and finding a level to add or remove is an O(log n) search.
+
+from bisect import bisect_left
+
+
+class PriceLadder:
+
+    def __init__(self, descending=False):
+        # Descending ladders (bids) store negated prices so index 0 is always the best level regardless of side
+        self.descending = descending
+
+        # List<Number>, sorted ascending -> numeric sort value of each level (negated when descending)
+        # Ex: [D("1.00"), D("2.00")]
+        self._values = []
+
+        # List<Key>, parallel to _values -> the key the OrderBook uses for that level in its level dict
+        # Ex: ["1.00", "2.00"]
+        self._keys = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, price, key):
+        # Returns the index the level was inserted at, 0 being the best level
+        value = -price if self.descending else price
+        index = bisect_left(self._values, value)
+        self._values.insert(index, value)
+        self._keys.insert(index, key)
+        return index
+
+    def remove(self, price, key):
+        # Returns the index the level was removed from, 0 being the best level
+        index = self.index(price, key)
+        del self._values[index]
+        del self._keys[index]
+        return index
+
+    def index(self, price, key):
+        value = -price if self.descending else price
+        index = bisect_left(self._values, value)
+        # Distinct keys can share a numeric value (e.g. "100.0" and "100.00"), so walk the run of equal values
+        while self._keys[index] != key:
+            index += 1
+        return index
+
+    def pop_worst(self):
+        self._values.pop()
+        return self._keys.pop()
+
+    def best(self):
+        return self._keys[0] if self._keys else None
+
+    def worst(self):
+        return self._keys[-1] if self._keys else None
+
+    def best_price(self):
+        if not self._values:
+            return None
+        return -self._values[0] if self.descending else self._values[0]
+
+    def worst_price(self):
+        if not self._values:
+            return None
+        return -self._values[-1] if self.descending else self._values[-1]
+
+    def top(self, count):
+        return self._keys[:count]
+
+    def key_at(self, index):
+        return self._keys[index]
+
+    def rebuild(self, prices_and_keys):
+        # Replace the whole ladder at once, used when a level dict is swapped out wholesale
+        sign = -1 if self.descending else 1
+        entries = sorted((sign * price, key) for (price, key) in prices_and_keys)
+        self._values = [value for (value, key) in entries]
+        self._keys = [key for (value, key) in entries]
+
+    def clear(self):
+        self._values = []
+        self._keys = []
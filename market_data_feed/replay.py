@@ -0,0 +1,105 @@
+# market_data_feed/replay.py
+# original author: Jacob Brown
+#
+#
+# Replays a raw feed capture (see capture.py) through MarketDataFeedClient.on_message, either as fast as possible or
+# paced to the original receive times. Frames are applied in capture order on the calling thread, so a replay always
+# rebuilds the same books. Run with:
+#     market-data-replay captures/ --products BTC-USD --paced --speed 10
+
+import sys
+import time
+import logging
+import argparse
+from . import capture
+from . import decoders
+from .market_data_feed_client import MarketDataFeedClient
+from .snapshot_loader import FileSnapshotLoader
+
+
+class ReplayResult:
+
+    def __init__(self):
+        self.frame_count = 0
+        self.decode_error_count = 0
+        self.elapsed = 0.0  # Wall clock seconds
+        self.captured_span = 0.0  # Seconds between the first and last frame when captured
+
+    def get_stats(self):
+        return {'frame_count': self.frame_count,
+                'decode_error_count': self.decode_error_count,
+                'elapsed': self.elapsed,
+                'captured_span': self.captured_span,
+                'frames_per_second': self.frame_count / self.elapsed if self.elapsed > 0 else None}
+
+
+def replay(frames,  # Iterable of ( receive time ns , raw frame ), ex: capture.read_capture(path)
+           client,  # MarketDataFeedClient, or anything else with an on_message(msg)
+           paced=False,  # Sleep to reproduce the original gaps between frames
+           speed=1.0,  # Paced mode only, 2.0 replays twice as fast as captured
+           decoder='auto'):
+    decode = decoders.get_decoder(decoder) if isinstance(decoder, str) else decoder
+    result = ReplayResult()
+    first_receive_time_ns = None
+    receive_time_ns = None
+    start = time.perf_counter()
+
+    for (receive_time_ns, frame) in frames:
+        if first_receive_time_ns is None:
+            first_receive_time_ns = receive_time_ns
+        elif paced:
+            delay = (receive_time_ns - first_receive_time_ns) / 1e9 / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        try:
+            msg = decode(frame)
+        except ValueError as e:
+            result.decode_error_count += 1
+            logging.warning("Skipping undecodable frame ({}): {}".format(e, frame[:200]))
+            continue
+        client.on_message(msg)
+        result.frame_count += 1
+
+    result.elapsed = time.perf_counter() - start
+    if first_receive_time_ns is not None:
+        result.captured_span = (receive_time_ns - first_receive_time_ns) / 1e9
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a raw feed capture through MarketDataFeedClient')
+    parser.add_argument('capture', help='Capture file, or directory of capture files')
+    parser.add_argument('--products', nargs='+', default=['BTC-USD'])
+    parser.add_argument('--paced', action='store_true', help='Reproduce the captured timing')
+    parser.add_argument('--speed', type=float, default=1.0, help='Paced replay speed multiplier')
+    parser.add_argument('--level-count', type=int, default=5)
+    parser.add_argument('--full-depth', action='store_true')
+    parser.add_argument('--tick-size')
+    parser.add_argument('--lot-size')
+    parser.add_argument('--snapshot', help='Level 3 snapshot file to seed the books from, may contain {} for the '
+                                           'product id')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)7s - %(message)s', level=logging.INFO)
+    client = MarketDataFeedClient(level_count=args.level_count, max_levels=max(15, args.level_count),
+                                  full_depth=args.full_depth, tick_size=args.tick_size, lot_size=args.lot_size,
+                                  products=args.products,
+                                  snapshot_loader=FileSnapshotLoader(args.snapshot) if args.snapshot else None,
+                                  background_snapshot_load=False)  # Same snapshot point on every replay
+    client.book_manager.start()
+    client.book_manager.reset()
+
+    result = replay(capture.read_capture(args.capture), client, args.paced, args.speed)
+
+    for product_id in client.products:
+        logging.info("{} inside levels:\n{}\n".format(
+            product_id, client.get_inside_levels_printout(args.level_count, product_id)))
+        logging.info("{} = {}\n".format(product_id, client.get_product_stats(product_id)))
+    logging.info("Replay = {}".format(result.get_stats()))
+    client.book_manager.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+# market_data_feed/shared_book.py
+# original author: Jacob Brown
+#
+#
+# Publishes the books of one feed process into a multiprocessing.shared_memory segment so other processes (ex: API
+# workers under gunicorn) can read them without a feed connection of their own. SharedBookPublisher runs in the feed
+# process and copies each product's inside levels into the segment whenever the book version moves on, plus the
+# product's stats every <stats_interval> seconds. SharedBookManager reads them back in place, as a drop-in for the
+# client's OrderBookManager (see MarketDataFeedClient's shared_book parameter).
+#
+# Every product has its own slot behind a seqlock -> the writer makes the slot's sequence odd, writes, then makes it
+# even again, and a reader retries until it has read the slot without the sequence moving. Neither side ever waits on
+# the other. A reader only decodes a slot once per sequence, so polling an unchanged book costs a single header read.
+#
+# Layout, little endian:
+#     Segment header   -> SEGMENT_HEADER (magic, layout version, product count, level count, slot size), then
+#                         a PRODUCT_ID entry per product
+#     Slot per product -> SLOT_HEADER, then 2 x <level count> LEVELs (asks then bids, best first), then the book's
+#                         microstructure and the product stats, each as JSON
+# Prices and sizes are kept as Decimal coefficient and exponent, so they read back exactly as the book held them,
+# alongside each level's resting order count.
+#
+# Run a feed process that publishes with:
+#     market-data-publish --name mdf-books --products BTC-USD ETH-USD
+# then point the API workers at it with MDF_SHARED_BOOK=mdf-books (see api.py).
+
+import sys
+import json
+import time
+import struct
+import logging
+import argparse
+from decimal import Decimal
+from threading import Thread
+from multiprocessing import shared_memory, resource_tracker
+from .order_book_manager import BookSnapshot
+from . import market_data_feed_client as mdf
+
+MAGIC = b'MDFB'
+LAYOUT_VERSION = 3
+
+# Magic , Layout Version , Product Count , Level Count , Slot Size
+SEGMENT_HEADER = struct.Struct('<4sIIII')
+PRODUCT_ID = struct.Struct('<32s')
+
+# Sequence , Book Version , Publish Time (epoch seconds) , Last Event Time , Ask Count , Bid Count ,
+# Microstructure Length , Stats Length
+SLOT_HEADER = struct.Struct('<QQd32sIIII')
+SEQUENCE = struct.Struct('<Q')
+
+# Price Coefficient , Size Coefficient , Price Exponent , Size Exponent , Order Count
+LEVEL = struct.Struct('<qqbbI2x')
+
+MICROSTRUCTURE_CAPACITY = 1024  # Bytes of microstructure JSON per product
+STATS_CAPACITY = 4096  # Bytes of stats JSON per product
+MAX_READ_ATTEMPTS = 3  # Reads of a product's levels per publish pass, to get them at the microstructure's version
+
+# Microstructure values written as strings, read back as Decimals
+DECIMAL_MICROSTRUCTURE_KEYS = ('mid', 'spread', 'microprice', 'imbalance', 'ask_depth', 'bid_depth', 'vwap',
+                               'traded_volume')
+
+# Segments created by a publisher in this process (or the process it was forked from), which share its resource tracker
+_published_names = set()
+
+
+def _slot_size(level_count):
+    return SLOT_HEADER.size + 2 * level_count * LEVEL.size + MICROSTRUCTURE_CAPACITY + STATS_CAPACITY
+
+
+def _levels_struct(level_count):
+    # Every level of a slot in one pack or unpack call
+    return struct.Struct('<' + 'qqbbI2x' * (2 * level_count))
+
+
+def _encode(value):
+    # Decimal -> ( Coefficient , Exponent )
+    exponent = value.as_tuple().exponent
+    return int(value.scaleb(-exponent)), exponent
+
+
+class SharedBookPublisher:
+
+    def __init__(self,
+                 client,  # MarketDataFeedClient whose books are published
+                 name=None,  # Segment name, generated when None (see .name)
+                 level_count=50,  # Inside levels per side published
+                 sample_interval=0.005,  # Seconds between checks of the book versions
+                 stats_interval=1.0):  # Seconds between stats updates
+        self.client = client
+        self.level_count = level_count
+        self.sample_interval = sample_interval
+        self.stats_interval = stats_interval
+        self.products = list(client.products)
+        self.slot_size = _slot_size(level_count)
+        self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                              size=self._slot_offset(len(self.products)))
+        self.name = self.shm.name
+        self.thread = None
+        self.stop = True
+        _published_names.add(self.shm._name)
+
+        self._levels_struct = _levels_struct(level_count)
+        self._versions = {}  # Dict<String, Int> -> {Product Id : Book Version last published}
+        self._last_stats_time = 0.0
+
+        # Statistics
+        self.publish_count = 0
+        self.skipped_publish_count = 0  # Products left to the next pass, the book moving on under every read
+
+        buf = self.shm.buf
+        SEGMENT_HEADER.pack_into(buf, 0, MAGIC, LAYOUT_VERSION, len(self.products), level_count, self.slot_size)
+        for (i, product_id) in enumerate(self.products):
+            PRODUCT_ID.pack_into(buf, SEGMENT_HEADER.size + i * PRODUCT_ID.size, product_id.encode())
+
+    def start(self):
+        if self.thread is None:
+            self.stop = False
+            self.thread = Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def close(self):
+        self.stop = True
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def publish(self):
+        # One pass over the products -> levels of every book that changed, and stats when they're due
+        now = time.time()
+        publish_stats = now - self._last_stats_time >= self.stats_interval
+        if publish_stats:
+            self._last_stats_time = now
+        for (i, product_id) in enumerate(self.products):
+            snapshot = self.client.get_book_snapshot(self.level_count, product_id)
+            if publish_stats or (snapshot.version != self._versions.get(product_id)):
+                stats = self.client.get_product_stats(product_id) if publish_stats else None
+                # Levels and microstructure are separate reads, so the book may move on between them -> read the
+                # levels again until both are of one version, or leave the product to the next pass
+                for _ in range(MAX_READ_ATTEMPTS):
+                    microstructure = self.client.get_microstructure(product_id)
+                    if microstructure['version'] == snapshot.version:
+                        break
+                    snapshot = self.client.get_book_snapshot(self.level_count, product_id)
+                else:
+                    self.skipped_publish_count += 1
+                    continue
+                self._write_slot(self._slot_offset(i), snapshot, microstructure, stats, now)
+                self._versions[product_id] = snapshot.version
+                self.publish_count += 1
+
+    def get_stats(self):
+        return {'name': self.name,
+                'size': self.shm.size,
+                'publish_count': self.publish_count,
+                'skipped_publish_count': self.skipped_publish_count}
+
+    def _slot_offset(self, index):
+        return SEGMENT_HEADER.size + len(self.products) * PRODUCT_ID.size + index * self.slot_size
+
+    def _run(self):
+        while not self.stop:
+            try:
+                self.publish()
+            except Exception as e:
+                logging.error("Shared book publish failed: {}".format(e))
+            time.sleep(self.sample_interval)
+
+    def _write_slot(self, offset, snapshot, microstructure, stats, now):
+        buf = self.shm.buf
+        level_count = self.level_count
+        asks = snapshot.asks[:level_count]
+        bids = snapshot.bids[:level_count]
+        values = []
+        for (side, order_counts) in ((asks, snapshot.ask_order_counts), (bids, snapshot.bid_order_counts)):
+            for ((price, size), order_count) in zip(side, order_counts):
+                (price_coefficient, price_exponent) = _encode(price)
+                (size_coefficient, size_exponent) = _encode(size)
+                values += (price_coefficient, size_coefficient, price_exponent, size_exponent, order_count)
+            values += (0, 0, 0, 0, 0) * (level_count - len(side))
+
+        microstructure_json = json.dumps(microstructure, default=str).encode()
+        if len(microstructure_json) > MICROSTRUCTURE_CAPACITY:
+            logging.warning("{} microstructure ({} bytes) doesn't fit the shared book, skipped".format(
+                snapshot.product_id, len(microstructure_json)))
+            microstructure_json = b''
+
+        (sequence,) = SEQUENCE.unpack_from(buf, offset)
+        stats_length = SLOT_HEADER.unpack_from(buf, offset)[7]
+        if stats is not None:
+            stats_json = json.dumps(stats, default=str).encode()
+            if len(stats_json) > STATS_CAPACITY:
+                logging.warning("{} stats ({} bytes) don't fit the shared book, skipped".format(
+                    snapshot.product_id, len(stats_json)))
+                stats = None
+            else:
+                stats_length = len(stats_json)
+
+        SEQUENCE.pack_into(buf, offset, sequence + 1)  # Odd -> readers retry until the slot is written
+        self._levels_struct.pack_into(buf, offset + SLOT_HEADER.size, *values)
+        microstructure_offset = offset + SLOT_HEADER.size + self._levels_struct.size
+        buf[microstructure_offset:microstructure_offset + len(microstructure_json)] = microstructure_json
+        if stats is not None:
+            stats_offset = microstructure_offset + MICROSTRUCTURE_CAPACITY
+            buf[stats_offset:stats_offset + stats_length] = stats_json
+        SLOT_HEADER.pack_into(buf, offset, sequence + 1, snapshot.version, now, (snapshot.time or '').encode(),
+                              len(asks), len(bids), len(microstructure_json), stats_length)
+        SEQUENCE.pack_into(buf, offset, sequence + 2)
+
+
+class SharedBookManager:
+    # Read only book manager over a segment written by SharedBookPublisher in another process
+
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        if self.shm._name not in _published_names:
+            # Attaching registers the segment with this process' resource tracker, which would unlink it on exit out
+            # from under the publisher (fixed in Python 3.13 by track=False)
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.name = name
+
+        buf = self.shm.buf
+        (magic, layout_version, product_count, level_count, slot_size) = SEGMENT_HEADER.unpack_from(buf, 0)
+        if (magic != MAGIC) or (layout_version != LAYOUT_VERSION):
+            self.shm.close()
+            raise ValueError("{} is not a version {} shared book segment".format(name, LAYOUT_VERSION))
+        self.level_count = level_count
+        self.slot_size = slot_size
+        self.products = [PRODUCT_ID.unpack_from(buf, SEGMENT_HEADER.size + i * PRODUCT_ID.size)[0]
+                         .rstrip(b'\0').decode() for i in range(product_count)]
+        first_slot_offset = SEGMENT_HEADER.size + product_count * PRODUCT_ID.size
+        self._offsets = {product_id: first_slot_offset + i * slot_size for (i, product_id) in enumerate(self.products)}
+        self._levels_struct = _levels_struct(level_count)
+
+        # Dict<String, Triple<BookSnapshot, Dict, Dict>> -> {Product Id : ( Snapshot , Microstructure , Stats )} as of
+        # the sequence last read
+        self._cache = {}
+
+        # Statistics
+        self.read_retry_count = 0
+
+    def start(self):
+        pass  # Books are fed by the publishing process
+
+    def close(self):
+        self.shm.close()
+
+    def reset(self):
+        pass
+
+    def handle_event(self, event):
+        pass
+
+    def get_order_book(self, product_id):
+        raise ValueError("{} book lives in the shared book publisher process".format(product_id))
+
+    def set_order_book(self, product_id, order_book):
+        raise ValueError("{} book lives in the shared book publisher process".format(product_id))
+
+    def get_snapshot(self, product_id, level_count):
+        # BookSnapshot of up to the published level count per side
+        return self._read_slot(product_id)[0]
+
+    def get_inside_levels(self, product_id, level_count, known_version=None):
+        snapshot = self._read_slot(product_id)[0]
+        if snapshot.version == known_version:
+            return known_version, None, None
+        return snapshot.version, list(snapshot.asks[:level_count]), list(snapshot.bids[:level_count])
+
+    def get_microstructure(self, product_id):
+        # As of the book's last published version
+        return dict(self._read_slot(product_id)[1])
+
+    def get_trades(self, product_id, count=None):
+        raise ValueError("{} trade tape isn't published to shared memory".format(product_id))
+
+    def get_bars(self, product_id, resolution, count=None):
+        raise ValueError("{} trade tape isn't published to shared memory".format(product_id))
+
+    def get_stats(self, product_id):
+        stats = dict(self._read_slot(product_id)[2])
+        stats['shared_book'] = {'name': self.name, 'read_retry_count': self.read_retry_count}
+        return stats
+
+    def _read_slot(self, product_id):
+        offset = self._offsets[product_id]
+        buf = self.shm.buf
+        while True:
+            (sequence,) = SEQUENCE.unpack_from(buf, offset)
+            if sequence & 1:
+                time.sleep(0)  # Write in progress
+                continue
+            cached = self._cache.get(product_id)
+            if (cached is not None) and (cached[0].write_sequence == sequence):
+                return cached
+
+            (_, version, _, event_time, ask_count, bid_count, microstructure_length,
+             stats_length) = SLOT_HEADER.unpack_from(buf, offset)
+            values = self._levels_struct.unpack_from(buf, offset + SLOT_HEADER.size)
+            microstructure_offset = offset + SLOT_HEADER.size + self._levels_struct.size
+            microstructure_json = bytes(buf[microstructure_offset:microstructure_offset + microstructure_length])
+            stats_offset = microstructure_offset + MICROSTRUCTURE_CAPACITY
+            stats_json = bytes(buf[stats_offset:stats_offset + stats_length])
+            if SEQUENCE.unpack_from(buf, offset)[0] == sequence:
+                break
+            self.read_retry_count += 1
+
+        levels = [(Decimal(values[i]).scaleb(values[i + 2]), Decimal(values[i + 1]).scaleb(values[i + 3]))
+                  for i in range(0, len(values), 5)]
+        order_counts = values[4::5]
+        event_time = event_time.rstrip(b'\0').decode() or None
+        bid_start = self.level_count
+        snapshot = BookSnapshot(product_id, version, event_time, sequence, self.level_count,
+                                tuple(levels[:ask_count]), tuple(levels[bid_start:bid_start + bid_count]),
+                                tuple(order_counts[:ask_count]), tuple(order_counts[bid_start:bid_start + bid_count]))
+        microstructure = json.loads(microstructure_json) if microstructure_json else {'product_id': product_id}
+        for key in DECIMAL_MICROSTRUCTURE_KEYS:
+            if microstructure.get(key) is not None:
+                microstructure[key] = Decimal(microstructure[key])
+        stats = json.loads(stats_json) if stats_json else {'product_id': product_id}
+        cached = (snapshot, microstructure, stats)
+        self._cache[product_id] = cached
+        return cached
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the feed and publish its books to shared memory')
+    parser.add_argument('--name', default='mdf-books', help='Shared memory segment name')
+    parser.add_argument('--products', nargs='+', default=['BTC-USD'])
+    parser.add_argument('--levels', type=int, default=50, help='Inside levels per side to publish')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)7s - %(message)s', level=logging.INFO)
+    client = mdf.MarketDataFeedClient(products=args.products, max_levels=max(args.levels, 15))
+    publisher = SharedBookPublisher(client, args.name, args.levels)
+    client.start()
+    publisher.start()
+    logging.info("Publishing {} to shared memory segment {} ({} bytes)".format(
+        args.products, publisher.name, publisher.shm.size))
+    try:
+        while not client.stop:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        client.close()
+    publisher.close()
+    return 1 if client.error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
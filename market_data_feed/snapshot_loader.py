@@ -0,0 +1,34 @@
+# market_data_feed/snapshot_loader.py
+# original author: Jacob Brown
+#
+#
+# Loaders for level 3 order book snapshots used to seed an OrderBook before applying the `full` channel. A loader is
+# any callable taking a product id and returning the snapshot dict, so a local JSON file can stand in for the REST call.
+
+import json
+import urllib.request
+
+
+class RestSnapshotLoader:
+
+    def __init__(self,
+                 url="https://api.pro.coinbase.com/products/{}/book?level=3",
+                 timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, product_id):
+        request = urllib.request.Request(self.url.format(product_id), headers={"User-Agent": "MarketDataFeedAPI"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+class FileSnapshotLoader:
+
+    def __init__(self, path):
+        # Path may contain a `{}` placeholder for the product id, ex: "snapshots/{}.json"
+        self.path = path
+
+    def __call__(self, product_id):
+        with open(self.path.format(product_id)) as f:
+            return json.load(f)
@@ -5,7 +5,47 @@
 # Util module for handling time-related features
 
 import time
+import calendar
 
 
 def current_milli_time():
     return round(time.time() * 1000)
+
+
+def current_nano_time():
+    return time.time_ns()
+
+
+def parse_exchange_time(text):
+    # "2020-03-21T19:32:45.123456Z" -> ns since the epoch, kept exact (no float round trip)
+    (seconds_text, _, fraction) = text.rstrip('Z').partition('.')
+    (date_text, _, time_text) = seconds_text.partition('T')
+    (year, month, day) = date_text.split('-')
+    (hour, minute, second) = time_text.split(':')
+    seconds = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+    return seconds * 1000000000 + int((fraction + '000000000')[:9])
+
+
+def format_exchange_time(time_ns):
+    # ns since the epoch -> "2020-03-21T19:32:45.123456Z", the exchange's own shape (parse_exchange_time's inverse)
+    (seconds, ns) = divmod(time_ns, 1000000000)
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds)) + '.{:06d}Z'.format(ns // 1000)
+
+
+class ExchangeTimeParser:
+    # Cheaper parse_exchange_time for a live feed -> consecutive messages nearly always share their minute, so the
+    # "YYYY-MM-DDTHH:MM" prefix is only converted when it changes and the rest of the usual
+    # "YYYY-MM-DDTHH:MM:SS.ffffffZ" shape is plain slicing
+
+    def __init__(self):
+        self._minute_prefix = None
+        self._minute_ns = 0
+
+    def __call__(self, text):
+        if (len(text) != 27) or (text[19] != '.'):
+            return parse_exchange_time(text)
+        prefix = text[:16]
+        if prefix != self._minute_prefix:
+            self._minute_ns = parse_exchange_time(prefix + ':00Z')
+            self._minute_prefix = prefix
+        return self._minute_ns + int(text[17:19] + text[20:26]) * 1000
@@ -0,0 +1,153 @@
+# market_data_feed/trade_tape.py
+# original author: Jacob Brown
+#
+#
+# Recent trades of one product, kept as the `match` events arrive. The tape is a fixed capacity ring over preallocated
+# NumPy columns (time, price, size, aggressor side), so recording a trade writes four array slots and keeps no per
+# trade Python object; once full, the oldest trades are overwritten.
+#
+# OHLCV bars are built alongside at each resolution (1s, 1m, 5m by default), aligned to the epoch. Each resolution's
+# open bar is a handful of Python numbers updated in place by every trade, and only moves into that resolution's own
+# NumPy ring of closed bars when a trade lands past its end, so bar queries never scan the tape. Intervals without a
+# trade have no bar.
+#
+# Prices and sizes are floats, as in level_arrays.py, since the tape is for analytics rather than book keeping.
+
+import time
+import numpy as np
+from .time_util import ExchangeTimeParser
+
+# One trade -> exchange time (ns since the epoch), price, size and the aggressor's side (BUY or SELL)
+TRADE_DTYPE = np.dtype([('time', np.int64), ('price', np.float64), ('size', np.float64), ('side', np.int8)])
+
+# One bar -> start time (ns since the epoch), prices, traded size and number of trades
+BAR_DTYPE = np.dtype([('time', np.int64), ('open', np.float64), ('high', np.float64), ('low', np.float64),
+                      ('close', np.float64), ('volume', np.float64), ('trade_count', np.int64)])
+
+BUY = 1  # Taker bought, i.e. the match's maker `side` was sell
+SELL = -1
+
+# List<Pair<String, Int>> -> ( Resolution Name , Seconds per Bar ), finest first
+RESOLUTIONS = [('1s', 1), ('1m', 60), ('5m', 300)]
+
+# Open bar fields, by index
+_START, _END, _OPEN, _HIGH, _LOW, _CLOSE, _VOLUME, _COUNT = range(8)
+
+
+class TradeTape:
+
+    def __init__(self,
+                 capacity=65536,  # Most recent trades kept
+                 bar_count=1440,  # Closed bars kept per resolution (ex: 1440 -> 24 minutes of 1s bars, a day of 1m)
+                 resolutions=None):  # List<Pair<String, Int>>, defaults to RESOLUTIONS
+        self.capacity = capacity
+        self.bar_count = bar_count
+        self.resolutions = list(resolutions or RESOLUTIONS)
+        for ((_, finer), (_, coarser)) in zip(self.resolutions, self.resolutions[1:]):
+            if coarser % finer:
+                raise ValueError("Bar resolutions must be finest first, each a multiple of the one before it")
+        self.resolution_names = [name for (name, _) in self.resolutions]
+        self._resolution_ns = [seconds * 1000000000 for (_, seconds) in self.resolutions]
+
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._prices = np.zeros(capacity, dtype=np.float64)
+        self._sizes = np.zeros(capacity, dtype=np.float64)
+        self._sides = np.zeros(capacity, dtype=np.int8)
+        # Memoryviews over the columns for recording, since setting one element through them skips NumPy's scalar
+        # conversion
+        self._column_views = (memoryview(self._times), memoryview(self._prices), memoryview(self._sizes),
+                              memoryview(self._sides))
+
+        # Per resolution -> closed bars ring, closed bars written so far, and the open bar (None before the first
+        # trade) as [ Start , End , Open , High , Low , Close , Volume , Trade Count ]
+        self._bars = [np.zeros(bar_count, dtype=BAR_DTYPE) for _ in self.resolutions]
+        self._closed_bar_counts = [0] * len(self.resolutions)
+        self._open_bars = [None] * len(self.resolutions)
+
+        self._parse_time = ExchangeTimeParser()
+
+        # Statistics
+        self.trade_count = 0
+
+    def record_match(self, event):
+        # `match` event -> trade, stamped with the exchange time (the local clock when the event has none)
+        time_text = event.get('time')
+        time_ns = self._parse_time(time_text) if time_text is not None else time.time_ns()
+        self.record(time_ns, float(event['price']), float(event['size']), BUY if event['side'] == 'sell' else SELL)
+
+    def record(self, time_ns, price, size, side):
+        i = self.trade_count % self.capacity
+        (times, prices, sizes, sides) = self._column_views
+        times[i] = time_ns
+        prices[i] = price
+        sizes[i] = size
+        sides[i] = side
+        self.trade_count += 1
+
+        # Bars are aligned, so a trade inside the finest open bar is inside every coarser one too. A trade stamped
+        # before its bar's start (out of order) is counted in the open bar rather than reopening a closed one.
+        open_bars = self._open_bars
+        finest = open_bars[0]
+        if (finest is None) or (time_ns >= finest[_END]):
+            self._roll_bars(time_ns, price)
+        for bar in open_bars:
+            if price > bar[_HIGH]:
+                bar[_HIGH] = price
+            elif price < bar[_LOW]:
+                bar[_LOW] = price
+            bar[_CLOSE] = price
+            bar[_VOLUME] += size
+            bar[_COUNT] += 1
+
+    def get_trades(self, count=None):
+        # ndarray<TRADE_DTYPE> -> copy of the last <count> trades (all kept when None), oldest first
+        if (count is not None) and (count < 0):
+            raise ValueError("Trade count must be at least 0, got {}".format(count))
+        stored_count = min(self.trade_count, self.capacity)
+        count = stored_count if count is None else min(count, stored_count)
+        indices = np.arange(self.trade_count - count, self.trade_count) % self.capacity
+        trades = np.empty(count, dtype=TRADE_DTYPE)
+        trades['time'] = self._times[indices]
+        trades['price'] = self._prices[indices]
+        trades['size'] = self._sizes[indices]
+        trades['side'] = self._sides[indices]
+        return trades
+
+    def get_bars(self, resolution, count=None):
+        # ndarray<BAR_DTYPE> -> copy of the last <count> bars at <resolution> (ex: "1m"), oldest first, the last one
+        # still open (so still changing) when its interval has trades
+        if resolution not in self.resolution_names:
+            raise ValueError("Unknown resolution ({}), expected one of {}".format(resolution, self.resolution_names))
+        if (count is not None) and (count < 0):
+            raise ValueError("Bar count must be at least 0, got {}".format(count))
+        i = self.resolution_names.index(resolution)
+        open_bar = self._open_bars[i]
+        closed_bar_count = self._closed_bar_counts[i]
+        stored_count = min(closed_bar_count, self.bar_count) + (open_bar is not None)
+        count = stored_count if count is None else min(count, stored_count)
+
+        bars = np.empty(count, dtype=BAR_DTYPE)
+        closed_count = count - (open_bar is not None) if count else 0
+        indices = np.arange(closed_bar_count - closed_count, closed_bar_count) % self.bar_count
+        bars[:closed_count] = self._bars[i][indices]
+        if count and (open_bar is not None):
+            bars[-1] = (open_bar[_START],) + tuple(open_bar[_OPEN:])
+        return bars
+
+    def get_stats(self):
+        return {'trade_count': self.trade_count,
+                'capacity': self.capacity,
+                'closed_bar_count': dict(zip(self.resolution_names, self._closed_bar_counts))}
+
+    def _roll_bars(self, time_ns, price):
+        # Close every open bar that ends at or before <time_ns> and open a new one holding nothing yet at <price>.
+        # Coarser bars end no earlier than finer ones, so stop at the first that's still open.
+        for (i, resolution_ns) in enumerate(self._resolution_ns):
+            bar = self._open_bars[i]
+            if (bar is not None) and (time_ns < bar[_END]):
+                break
+            if bar is not None:
+                self._bars[i][self._closed_bar_counts[i] % self.bar_count] = (bar[_START],) + tuple(bar[_OPEN:])
+                self._closed_bar_counts[i] += 1
+            start = time_ns - time_ns % resolution_ns
+            self._open_bars[i] = [start, start + resolution_ns, price, price, price, price, 0.0, 0]
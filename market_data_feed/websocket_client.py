@@ -7,8 +7,12 @@
 
 import json
 import time
+import random
 import logging
-from threading import Thread
+from threading import Thread, Event
+from . import frame_queue as fq
+from . import decoders
+from . import time_util
 from websocket import create_connection, WebSocketConnectionClosedException
 
 
@@ -19,7 +23,17 @@ class WebSocketClient(object):
             products=None,
             message_type="subscribe",
             message_queue=None,
-            channels=None):
+            channels=None,
+            pipeline=False,  # Receive frames on one thread and decode/handle them on another, through a FrameQueue
+            queue_size=10000,  # Pipeline mode only, frames buffered before the overflow policy kicks in
+            overflow_policy=fq.BLOCK,  # Pipeline mode only, see frame_queue.py
+            decoder='auto',  # Decoder name (see decoders.py) or callable taking a raw frame and returning a dict
+            recorder=None,  # FrameRecorder (see capture.py) that every raw frame is appended to as it's received
+            prefilter=None,  # FramePrefilter (see prefilter.py) dropping raw frames before they're decoded or queued
+            reconnect=True,  # Reconnect when the connection drops, rather than stopping with self.error set
+            reconnect_delay=0.5,  # Seconds, backoff doubles per failed attempt and each wait is a random fraction of it
+            max_reconnect_delay=30.0,
+            receive_timeout=None):  # Seconds without a frame before the connection is treated as dead and replaced
         self.url = url
         self.products = products
         self.channels = channels
@@ -30,19 +44,84 @@ class WebSocketClient(object):
         self.thread = None
         self.keepAlive = None
         self.message_queue = message_queue
+        self.pipeline = pipeline
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.frame_queue = None
+        self.worker = None
+        self.decoder = decoders.get_decoder(decoder) if isinstance(decoder, str) else decoder
+        self.recorder = recorder
+        self.prefilter = prefilter
+        self.reconnect = reconnect
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.receive_timeout = receive_timeout
+        self._wakeup = Event()  # Cuts a reconnect backoff short on close()
+        self._connection_closed = None  # Event per connection, stops its keep alive thread
 
-    def start(self):
-        def _go():
-            self._connect()
-            self._listen()
-            self._disconnect()
+        # Statistics
+        self.connection_count = 0
+        self.reconnect_count = 0
+        self.decode_error_count = 0
+        self.last_disconnect_time_ms = None  # Epoch ms the last connection dropped
+        self.last_outage_ms = None  # How long the last drop took to reconnect
+        self._outage_start_ms = None
 
+    def start(self):
         self.stop = False
+        self._wakeup.clear()
         self.on_open()
-        self.thread = Thread(target=_go)
-        self.keepAlive = Thread(target=self._keep_alive)
+        self.thread = Thread(target=self._run)
+        if self.pipeline:
+            self.frame_queue = fq.FrameQueue(self.queue_size, self.overflow_policy)
+            self.worker = Thread(target=self._work, args=(self.frame_queue,))
+            self.worker.start()
         self.thread.start()
 
+    def _run(self):
+        # Connection thread -> reads each connection until it drops, then reconnects after a backoff until closed.
+        # Waits are drawn uniformly from [0, backoff) ("full jitter") so many clients dropped together don't all
+        # reconnect at once, and the backoff starts over once a connection has stayed up for a full max backoff.
+        attempt = 0
+        while not self.stop:
+            try:
+                self._connect()
+            except Exception as e:
+                self._connection_lost(e)
+                self._close_socket()  # May have connected before the subscribe failed
+            else:
+                connected_at = time.monotonic()
+                self.connection_count += 1
+                if self._outage_start_ms is not None:
+                    self.last_outage_ms = time_util.current_milli_time() - self._outage_start_ms
+                    self._outage_start_ms = None
+                    self.reconnect_count += 1
+                    logging.info("-- Reconnected after {} ms --".format(self.last_outage_ms))
+                    if self.pipeline:
+                        self.frame_queue.put(fq.RECONNECTED)  # Handled in order, ahead of the new connection's frames
+                    else:
+                        self.on_reconnect()
+
+                self._connection_closed = Event()
+                self.keepAlive = Thread(target=self._keep_alive, args=(self.ws, self._connection_closed))
+                self.keepAlive.start()
+                if self.pipeline:
+                    self._receive()
+                else:
+                    self._listen()
+                self._disconnect()
+                if time.monotonic() - connected_at >= self.max_reconnect_delay:
+                    attempt = 0
+
+            if self.stop or not self.reconnect:
+                break
+            backoff = min(self.max_reconnect_delay, self.reconnect_delay * (2 ** attempt))
+            attempt = min(attempt + 1, 32)
+            self._wakeup.wait(random.uniform(0, backoff))
+
+        if self.frame_queue is not None:
+            self.frame_queue.close()
+
     def _connect(self):
         if self.products is None:
             self.products = ["BTC-USD"]
@@ -58,43 +137,145 @@ class WebSocketClient(object):
         else:
             sub_params = {"type": "subscribe", "product_ids": self.products, "channels": self.channels}
 
-        self.ws = create_connection(self.url)
+        self.ws = create_connection(self.url, timeout=self.receive_timeout)
 
         self.ws.send(json.dumps(sub_params))
 
-    def _keep_alive(self, interval=30):
-        while self.ws.connected:
-            self.ws.ping("keepalive")
-            time.sleep(interval)
+    def _keep_alive(self, ws, connection_closed, interval=30):
+        while ws.connected:
+            try:
+                ws.ping("keepalive")
+            except Exception:
+                break  # Connection dropped, the receive loop handles it
+            if connection_closed.wait(interval):
+                break
 
     def _listen(self):
-        self.keepAlive.start()
+        decode = self.decoder
+        recorder = self.recorder
+        accept = None if self.prefilter is None else self.prefilter.accept
         while not self.stop:
             try:
                 data = self.ws.recv()
-                msg = json.loads(data)
+                if not data:
+                    raise WebSocketConnectionClosedException("Connection closed by the server")
+            except Exception as e:
+                self._connection_lost(e)
+                break
+            try:
+                if recorder is not None:
+                    recorder.record(data)
+                if (accept is not None) and not accept(data):
+                    continue
+                msg = decode(data)
             except ValueError as e:
-                self.on_error(e)
+                self.on_decode_error(e, data)
             except Exception as e:
-                self.on_error(e)
+                self.on_error(e, data)
             else:
                 self.on_message(msg)
 
-    def _disconnect(self):
+    def _receive(self):
+        # Pipeline mode receive thread -> only pulls raw frames off the socket, decoding is left to the worker
+        frame_queue = self.frame_queue
+        recorder = self.recorder
+        accept = None if self.prefilter is None else self.prefilter.accept
+        while not self.stop:
+            try:
+                data = self.ws.recv()
+                if not data:
+                    raise WebSocketConnectionClosedException("Connection closed by the server")
+            except Exception as e:
+                self._connection_lost(e)
+                break
+            try:
+                if recorder is not None:
+                    recorder.record(data)
+                if (accept is not None) and not accept(data):
+                    continue
+            except ValueError as e:
+                self.on_decode_error(e, data)
+            except Exception as e:
+                self.on_error(e, data)
+            else:
+                frame_queue.put(data)
+
+    def _work(self, frame_queue):
+        # Pipeline mode worker thread -> decodes and handles frames in arrival order until the queue is closed
+        decode = self.decoder
+        while True:
+            frames = frame_queue.get_batch()
+            if frames is None:
+                break
+            for data in frames:
+                if data is fq.RESYNC:
+                    self.on_resync()
+                    continue
+                if data is fq.RECONNECTED:
+                    self.on_reconnect()
+                    continue
+                try:
+                    msg = decode(data)
+                except ValueError as e:
+                    self.on_decode_error(e, data)
+                else:
+                    self.on_message(msg)
+
+    def _connection_lost(self, e):
+        if self.stop:
+            return  # Closed on purpose
+        if not self.reconnect:
+            self.on_error(e)
+            return
+        if self._outage_start_ms is None:
+            self._outage_start_ms = time_util.current_milli_time()
+            if self.connection_count > 0:
+                self.last_disconnect_time_ms = self._outage_start_ms
+        logging.warning("-- Connection lost ({}), reconnecting --".format(e))
+
+    def get_queue_stats(self):
+        return None if self.frame_queue is None else self.frame_queue.get_stats()
+
+    def get_prefilter_stats(self):
+        return None if self.prefilter is None else self.prefilter.get_stats()
+
+    def get_connection_stats(self):
+        return {'connected': (self.ws is not None) and self.ws.connected,
+                'connection_count': self.connection_count,
+                'reconnect_count': self.reconnect_count,
+                'decode_error_count': self.decode_error_count,
+                'last_disconnect_time_ms': self.last_disconnect_time_ms,
+                'last_outage_ms': self.last_outage_ms}
+
+    def _close_socket(self):
         try:
             if self.ws:
                 self.ws.close()
+                self.ws.shutdown()  # close() leaves the socket open when the server started the closing handshake
         except WebSocketConnectionClosedException as e:
             pass
+
+    def _disconnect(self):
+        try:
+            self._close_socket()
         finally:
-            self.keepAlive.join()
+            if self._connection_closed is not None:
+                self._connection_closed.set()
+            if (self.keepAlive is not None) and self.keepAlive.is_alive():
+                self.keepAlive.join()
 
         self.on_close()
 
     def close(self):
         self.stop = True    # will only disconnect after next msg recv
+        self._wakeup.set()  # or straight away when waiting to reconnect
         self._disconnect()  # force disconnect so threads can join
         self.thread.join()
+        if self.worker is not None:
+            self.frame_queue.close()
+            self.worker.join()
+        if self.recorder is not None:
+            self.recorder.close()
 
     def on_open(self):
         logging.debug("-- Socket Opened --")
@@ -107,6 +288,18 @@ class WebSocketClient(object):
         if self.message_queue:
             self.message_queue.append(msg)
 
+    def on_resync(self):
+        logging.warning("-- Frame queue overflowed, buffered frames discarded --")
+
+    def on_reconnect(self):
+        # Called ahead of the first message from a replacement connection, anything missed in between is lost
+        logging.debug("-- Socket Reconnected --")
+
+    def on_decode_error(self, e, data):
+        # A malformed frame is skipped, the connection carries on
+        self.decode_error_count += 1
+        logging.warning("Skipping undecodable frame ({}): {}".format(e, data[:200]))
+
     def on_error(self, e, data=None):
         self.error = e
         self.stop = True
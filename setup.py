@@ -11,5 +11,13 @@ setup(
     description='Simple Market Feed Web App',
     long_description=readme,
     author='Jacob Brown',
-    packages=find_packages(exclude='tests')
+    packages=find_packages(exclude='tests'),
+    entry_points={
+        'console_scripts': [
+            'market-data-capture=market_data_feed.capture:main',
+            'market-data-replay=market_data_feed.replay:main',
+            'market-data-convert=market_data_feed.event_file:main',
+            'market-data-publish=market_data_feed.shared_book:main',
+        ]
+    }
 )
@@ -0,0 +1,83 @@
+# tests/feed_server.py
+# original author: Jacob Brown
+#
+#
+# Local stand-in for the Coinbase WebSocket feed for tests, run on its own event loop thread. Tests push frames to the
+# connected clients and can inject failures -> dropping every connection without a close handshake, or refusing new
+# connections altogether until resumed.
+
+import time
+import asyncio
+import websockets
+from market_data_feed.async_websocket_client import EventLoopThread
+
+
+class FeedServer:
+
+    def __init__(self):
+        self.subscriptions = []  # Every subscribe message received, in order
+        self.connections = []  # Connections currently open
+        self.port = 0
+        self.server = None
+        self.loop_thread = EventLoopThread()
+        self.resume()
+
+    @property
+    def url(self):
+        return "ws://127.0.0.1:{}/".format(self.port)
+
+    def send(self, frames):
+        # Sends <frames>, in order, to every open connection
+        async def send_all():
+            for ws in list(self.connections):
+                try:
+                    for frame in frames:
+                        await ws.send(frame)
+                except websockets.ConnectionClosed:
+                    pass  # Dropped, about to be removed
+
+        self.loop_thread.submit(send_all()).result(5)
+
+    def drop_connections(self):
+        # Abrupt disconnect, as if the network went away
+        async def abort_all():
+            for ws in list(self.connections):
+                ws.transport.abort()
+
+        self.loop_thread.submit(abort_all()).result(5)
+
+    def pause(self):
+        # Stops listening, so reconnect attempts are refused, and drops every open connection
+        async def close_server():
+            self.server.close()
+            await self.server.wait_closed()
+
+        self.loop_thread.submit(close_server()).result(5)
+
+    def resume(self):
+        # Listens again, on the same port once one has been picked
+        async def start_server():
+            return await websockets.serve(self._handle, "127.0.0.1", self.port)
+
+        self.server = self.loop_thread.submit(start_server()).result(5)
+        self.port = list(self.server.sockets)[0].getsockname()[1]
+
+    def wait_for_subscriptions(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while len(self.subscriptions) < count:
+            if time.monotonic() > deadline:
+                raise AssertionError("Only {} of {} subscriptions received".format(len(self.subscriptions), count))
+            time.sleep(0.005)
+
+    def close(self):
+        self.pause()
+        self.loop_thread.stop()
+
+    async def _handle(self, ws, *args):
+        subscription = await ws.recv()
+        self.connections.append(ws)
+        self.subscriptions.append(subscription)
+        try:
+            await ws.wait_closed()
+        finally:
+            self.connections.remove(ws)
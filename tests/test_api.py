@@ -0,0 +1,141 @@
+import json
+import unittest
+import api
+from market_data_feed.market_data_feed_client import MarketDataFeedClient
+
+
+def open_order(order_id, side, price, size):
+    return {"type": "open", "product_id": "BTC-USD", "order_id": order_id, "side": side, "price": price,
+            "remaining_size": size, "time": "2021-06-01T12:00:00.000001Z"}
+
+
+class TestLevelsAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.mdf_client = MarketDataFeedClient()
+        self.original_client = api.mdf_client
+        api.mdf_client = self.mdf_client
+        self.target = api.app.test_client()
+        self.mdf_client.on_message(open_order("a1", "sell", "101.00", "1.0"))
+        self.mdf_client.on_message(open_order("b1", "buy", "99.00", "2.0"))
+        self.mdf_client.on_message(open_order("b2", "buy", "98.00", "0.5"))
+
+    def tearDown(self):
+        api.mdf_client = self.original_client
+
+    def test_levels_json(self):
+        actual = self.target.get("/levels?depth=1&product=BTC-USD")
+
+        self.assertEqual(200, actual.status_code)
+        self.assertEqual("application/json", actual.mimetype)
+        body = json.loads(actual.get_data())
+        self.assertEqual("BTC-USD", body["product_id"])
+        self.assertEqual("2021-06-01T12:00:00.000001Z", body["time"])
+        self.assertEqual([["101.00", "1.0"]], body["asks"])
+        self.assertEqual([["99.00", "2.0"]], body["bids"])
+
+    def test_not_modified_until_book_changes(self):
+        first = self.target.get("/levels?depth=2")
+        etag = first.headers["ETag"]
+
+        actual = self.target.get("/levels?depth=2", headers={"If-None-Match": etag})
+        self.assertEqual(304, actual.status_code)
+        self.assertEqual(b"", actual.get_data())
+
+        self.assertEqual(200, self.target.get("/levels?depth=3", headers={"If-None-Match": etag}).status_code)
+
+        self.mdf_client.on_message(open_order("b3", "buy", "99.50", "1.0"))
+        actual = self.target.get("/levels?depth=2", headers={"If-None-Match": etag})
+        self.assertEqual(200, actual.status_code)
+        self.assertNotEqual(etag, actual.headers["ETag"])
+        self.assertEqual([["99.50", "1.0"], ["99.00", "2.0"]], json.loads(actual.get_data())["bids"])
+
+    def test_bad_parameters(self):
+        self.assertEqual(400, self.target.get("/levels?product=ETH-USD").status_code)
+        self.assertEqual(400, self.target.get("/levels?depth=0").status_code)
+        self.assertEqual(400, self.target.get("/levels?depth={}".format(api.MAX_LEVELS_DEPTH + 1)).status_code)
+
+
+class TestMicrostructureAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.mdf_client = MarketDataFeedClient()
+        self.original_client = api.mdf_client
+        api.mdf_client = self.mdf_client
+        self.target = api.app.test_client()
+
+    def tearDown(self):
+        api.mdf_client = self.original_client
+
+    def test_microstructure_json(self):
+        self.assertEqual(None, json.loads(self.target.get("/microstructure").get_data())["mid"])
+
+        self.mdf_client.on_message(open_order("a1", "sell", "101.00", "1.0"))
+        self.mdf_client.on_message(open_order("b1", "buy", "99.00", "3.0"))
+        actual = self.target.get("/microstructure?product=BTC-USD")
+
+        self.assertEqual(200, actual.status_code)
+        body = json.loads(actual.get_data())
+        self.assertEqual("100.00", body["mid"])
+        self.assertEqual("2.00", body["spread"])
+        self.assertEqual("0.5", body["imbalance"])
+        self.assertEqual(0, body["trade_count"])
+        self.assertEqual(400, self.target.get("/microstructure?product=ETH-USD").status_code)
+
+
+class TestFeedAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.mdf_client = MarketDataFeedClient()
+        self.original_client = api.mdf_client
+        api.mdf_client = self.mdf_client
+        self.target = api.app.test_client()
+        self.mdf_client.on_message(open_order("a1", "sell", "101.00", "1.0"))
+        for (size, time_text) in [("0.25", "2021-06-01T12:00:00.500000Z"), ("0.5", "2021-06-01T12:01:30.000001Z")]:
+            self.mdf_client.on_message({"type": "match", "product_id": "BTC-USD", "maker_order_id": "a1",
+                                        "taker_order_id": "t", "side": "sell", "price": "101.00", "size": size,
+                                        "time": time_text})
+
+    def tearDown(self):
+        api.mdf_client = self.original_client
+
+    def test_bars(self):
+        actual = self.target.get("/feed?action=bars&resolution=1m&count=5")
+
+        self.assertEqual(200, actual.status_code)
+        self.assertEqual([{"time": "2021-06-01T12:00:00.000000Z", "open": 101.0, "high": 101.0, "low": 101.0,
+                           "close": 101.0, "volume": 0.25, "trade_count": 1},
+                          {"time": "2021-06-01T12:01:00.000000Z", "open": 101.0, "high": 101.0, "low": 101.0,
+                           "close": 101.0, "volume": 0.5, "trade_count": 1}],
+                         json.loads(actual.get_data())["msg"])
+        self.assertEqual(1, len(json.loads(self.target.get("/feed?action=bars&resolution=5m").get_data())["msg"]))
+        self.assertIn("Bars not available", json.loads(self.target.get("/feed?action=bars&resolution=1h").get_data())["msg"])
+
+    def test_trades(self):
+        actual = json.loads(self.target.get("/feed?action=trades&count=1").get_data())["msg"]
+
+        self.assertEqual([{"time": "2021-06-01T12:01:30.000001Z", "price": 101.0, "size": 0.5, "side": "buy"}], actual)
+
+    def test_stats(self):
+        actual = self.target.get("/feed?action=stats")
+
+        self.assertEqual(200, actual.status_code)
+        self.assertIn("trade_tape", json.loads(actual.get_data())["msg"])
+
+    def test_negative_count(self):
+        for action in ("trades", "bars"):
+            actual = self.target.get("/feed?action={}&count=-5".format(action))
+
+            self.assertEqual(400, actual.status_code)
+            self.assertEqual("Count must be at least 0", json.loads(actual.get_data())["msg"])
+
+    def test_unknown_product(self):
+        for action in ("stats", "levels", "bars", "trades"):
+            actual = self.target.get("/feed?action={}&product=FOO".format(action))
+
+            self.assertEqual(400, actual.status_code)
+            self.assertIn("Unknown product (FOO)", json.loads(actual.get_data())["msg"])
+
+
+if __name__ == '__main__':
+    unittest.main()
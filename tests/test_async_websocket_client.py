@@ -0,0 +1,81 @@
+import time
+import asyncio
+import unittest
+import websockets
+from market_data_feed import async_websocket_client as awc
+
+
+class RecordingClient(awc.AsyncWebSocketClient):
+
+    def on_open(self):
+        self.messages = []
+
+    def on_message(self, msg):
+        self.messages.append(msg)
+
+
+class TestAsyncWebSocketClient(unittest.TestCase):
+
+    def setUp(self):
+        # Stub feed answering every subscribe with <frames> and then holding the connection open
+        async def handle(ws, *args):
+            self.subscriptions.append(await ws.recv())
+            for frame in self.frames:
+                await ws.send(frame)
+            await ws.wait_closed()
+
+        async def start_server():
+            return await websockets.serve(handle, "127.0.0.1", 0)
+
+        self.subscriptions = []
+        self.frames = ['{"type":"subscriptions"}', '{"type":"open","product_id":"BTC-USD","sequence":1}']
+        self.loop_thread = awc.EventLoopThread()
+        self.server = self.loop_thread.submit(start_server()).result(5)
+        port = list(self.server.sockets)[0].getsockname()[1]
+        self.url = "ws://127.0.0.1:{}/".format(port)
+
+    def tearDown(self):
+        self.server.close()
+        self.loop_thread.submit(self.server.wait_closed()).result(5)
+        self.loop_thread.stop()
+
+    def test_clients_share_one_loop(self):
+        targets = [RecordingClient(url=self.url, products=[product_id], channels=["full"],
+                                   loop_thread=self.loop_thread)
+                   for product_id in ("BTC-USD", "ETH-USD")]
+        for target in targets:
+            target.start()
+
+        deadline = time.monotonic() + 5
+        while any(len(target.messages) < 2 for target in targets) and (time.monotonic() < deadline):
+            time.sleep(0.01)
+
+        start = time.monotonic()
+        for target in targets:
+            target.close()
+
+        self.assertLess(time.monotonic() - start, 1)
+        for target in targets:
+            self.assertEqual([{"type": "subscriptions"}, {"type": "open", "product_id": "BTC-USD", "sequence": 1}],
+                             target.messages)
+            self.assertIsNone(target.error)
+        self.assertEqual(2, len(self.subscriptions))
+        self.assertIn('"ETH-USD"', "".join(self.subscriptions))
+
+    def test_decode_error_does_not_stop_feed(self):
+        self.frames = ['{"type":"open","sequence":1}', '{"type":"open",', '{"type":"done","sequence":2}']
+        target = RecordingClient(url=self.url, channels=["full"], loop_thread=self.loop_thread)
+        target.start()
+
+        deadline = time.monotonic() + 5
+        while (len(target.messages) < 2) and (time.monotonic() < deadline):
+            time.sleep(0.01)
+        target.close()
+
+        self.assertEqual([{"type": "open", "sequence": 1}, {"type": "done", "sequence": 2}], target.messages)
+        self.assertEqual(1, target.decode_error_count)
+        self.assertIsNone(target.error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import tempfile
+import unittest
+from market_data_feed import order_book as ob, book_sync as bs, snapshot_loader as sl
+from decimal import Decimal as D
+
+
+class TestBookSynchronizer(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = {"sequence": 10,
+                         "asks": [["5.00", "1.0", "a1"], ["6.00", "2.0", "a2"]],
+                         "bids": [["2.00", "1.5", "b1"]]}
+        (fd, self.snapshot_path) = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.snapshot, f)
+
+    def tearDown(self):
+        os.remove(self.snapshot_path)
+
+    def test_bootstrap_applies_only_messages_after_snapshot(self):
+        order_book = ob.OrderBook(max_levels=5)
+        target = bs.BookSynchronizer(order_book, "BTC-USD", sl.FileSnapshotLoader(self.snapshot_path))
+
+        # First message starts the snapshot load and is buffered along with everything until the snapshot arrives
+
+        target.handle_event({"type": "done", "order_id": "a1", "side": "sell", "sequence": 9})
+        self.assertTrue(target.syncing)
+        target._loader_thread.join()
+
+        target.handle_event({"type": "open", "order_id": "b2", "remaining_size": "1.0", "price": "3.00",
+                             "side": "buy", "sequence": 11})
+
+        self.assertFalse(target.syncing)
+        self.assertEqual(11, order_book.sequence)
+        self.assertEqual([("5.00", D("1.0")), ("6.00", D("2.0"))], order_book.get_inside_ask_levels(5))
+        self.assertEqual([("3.00", D("1.0")), ("2.00", D("1.5"))], order_book.get_inside_bid_levels(5))
+        self.assertEqual(1, target.resync_count)
+        self.assertEqual(2, target.last_resync_buffered_count)
+
+    def test_stale_and_duplicate_messages_are_dropped(self):
+        order_book = ob.OrderBook(max_levels=5)
+        order_book.load_snapshot(self.snapshot)
+        target = bs.BookSynchronizer(order_book, "BTC-USD", sl.FileSnapshotLoader(self.snapshot_path))
+
+        target.handle_event({"type": "done", "order_id": "a1", "side": "sell", "sequence": 10})
+        target.handle_event({"type": "done", "order_id": "a2", "side": "sell", "sequence": 11})
+        target.handle_event({"type": "done", "order_id": "a2", "side": "sell", "sequence": 11})
+
+        self.assertFalse(target.syncing)
+        self.assertEqual(11, order_book.sequence)
+        self.assertEqual(2, target.stale_message_count)
+        self.assertEqual([("5.00", D("1.0"))], order_book.get_inside_ask_levels(5))
+
+    def test_sequence_gap_triggers_resync(self):
+        order_book = ob.OrderBook(max_levels=5)
+        order_book.load_snapshot({"sequence": 1, "asks": [], "bids": []})
+        target = bs.BookSynchronizer(order_book, "BTC-USD", sl.FileSnapshotLoader(self.snapshot_path))
+
+        target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": 5})
+
+        self.assertTrue(target.syncing)
+        self.assertEqual(1, target.sequence_gap_count)
+        target._loader_thread.join()
+
+        target.handle_event({"type": "done", "order_id": "a2", "side": "sell", "sequence": 11})
+
+        self.assertFalse(target.syncing)
+        self.assertEqual(11, order_book.sequence)
+        self.assertEqual([("5.00", D("1.0"))], order_book.get_inside_ask_levels(5))
+
+    def test_failed_load_is_retried(self):
+        order_book = ob.OrderBook(max_levels=5)
+        target = bs.BookSynchronizer(order_book, "BTC-USD", sl.FileSnapshotLoader(self.snapshot_path + ".missing"),
+                                     retry_delay=0)
+
+        target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": 1})
+        target._loader_thread.join()
+        target.snapshot_loader = sl.FileSnapshotLoader(self.snapshot_path)
+        target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": 2})
+        target._loader_thread.join()
+        target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": 11})
+
+        self.assertFalse(target.syncing)
+        self.assertEqual(11, order_book.sequence)
+        self.assertEqual(3, target.last_resync_buffered_count)
+
+    def test_failed_load_backs_off(self):
+        order_book = ob.OrderBook(max_levels=5)
+        loads = []
+
+        def failing_loader(product_id):
+            loads.append(product_id)
+            raise IOError("Snapshot endpoint down")
+
+        target = bs.BookSynchronizer(order_book, "BTC-USD", failing_loader, retry_delay=10, max_retry_delay=15,
+                                     background_load=False)
+        for sequence in range(1, 50):
+            target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": sequence})
+        self.assertEqual(1, len(loads))  # Not retried per message
+        self.assertTrue(9 < target._retry_time - time.monotonic() <= 10)
+
+        target._retry_time = 0  # Backoff up
+        target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": 50})
+        self.assertEqual(2, len(loads))
+        target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": 51})
+        self.assertEqual(2, len(loads))
+        self.assertTrue(14 < target._retry_time - time.monotonic() <= 15)  # Doubled, up to max_retry_delay
+
+        self.assertTrue(target.syncing)
+        self.assertEqual(2, target.get_stats()["failed_load_count"])
+
+    def test_buffer_dropped_past_limit(self):
+        order_book = ob.OrderBook(max_levels=5)
+        target = bs.BookSynchronizer(order_book, "BTC-USD", sl.FileSnapshotLoader(self.snapshot_path + ".missing"),
+                                     retry_delay=60, max_buffered_count=5, background_load=False)
+        for sequence in range(1, 13):
+            target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": sequence})
+
+        self.assertEqual([11, 12], [event["sequence"] for event in target._buffer])
+        self.assertEqual(2, target.buffer_overflow_count)
+
+        # Restarted buffer picks up right after the snapshot -> replayed onto it
+        target.snapshot_loader = sl.FileSnapshotLoader(self.snapshot_path)
+        target._retry_time = 0
+        target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": 13})
+        target.handle_event({"type": "done", "order_id": "x", "side": "sell", "sequence": 14})
+        self.assertFalse(target.syncing)
+        self.assertEqual(14, order_book.sequence)
+
+    def test_load_in_place(self):
+        order_book = ob.OrderBook(max_levels=5)
+        target = bs.BookSynchronizer(order_book, "BTC-USD", sl.FileSnapshotLoader(self.snapshot_path),
+                                     background_load=False)
+
+        target.handle_event({"type": "done", "order_id": "a1", "side": "sell", "sequence": 11})
+        self.assertIsNone(target._loader_thread)
+        target.handle_event({"type": "done", "order_id": "a2", "side": "sell", "sequence": 12})
+
+        self.assertFalse(target.syncing)
+        self.assertEqual([], order_book.get_inside_ask_levels(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+import unittest
+from market_data_feed import capture, replay, market_data_feed_client as mdf
+from decimal import Decimal as D
+
+
+class TestCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.frames = ['{"type":"subscriptions","channels":[]}',
+                       '{"type":"received","product_id":"BTC-USD","order_id":"1","sequence":1}',
+                       '{"type":"open","product_id":"BTC-USD","order_id":"1","side":"sell","price":"5.00",'
+                       '"remaining_size":"1.0","sequence":2}',
+                       '{"type":"open","product_id":"BTC-USD","order_id":"2","side":"buy","price":"4.00",'
+                       '"remaining_size":"2.0","sequence":3}']
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_record_and_read_back(self):
+        target = capture.FrameRecorder(self.directory, max_bytes=150)
+        for (i, frame) in enumerate(self.frames):
+            target.record(frame, receive_time_ns=1000 + i)
+        target.close()
+
+        expected = [(1000 + i, frame) for (i, frame) in enumerate(self.frames)]
+
+        actual = list(capture.read_capture(self.directory))
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(4, target.frame_count)
+        self.assertEqual(2, target.file_count)  # Rotated once 150 uncompressed bytes were written
+        self.assertEqual(2, len(capture.list_capture_files(self.directory)))
+
+    def test_read_stops_at_truncated_file_end(self):
+        target = capture.FrameRecorder(self.directory)
+        for frame in self.frames:
+            target.record(frame)
+        target.close()
+        with open(target.path, 'rb') as f:
+            data = f.read()
+        with open(target.path, 'wb') as f:
+            f.write(data[:-10])
+
+        actual = list(capture.read_capture(target.path))
+
+        self.assertLess(len(actual), len(self.frames))
+
+    def test_replay_rebuilds_book(self):
+        frames = [(1000 + i, frame) for (i, frame) in enumerate(self.frames)] + [(1010, '{"type":')]
+        target = mdf.MarketDataFeedClient()
+
+        result = replay.replay(frames, target)
+
+        self.assertEqual(([(D("1.00000"), D("5.00"))], [(D("2.00000"), D("4.00"))]), target.get_inside_levels(2))
+        self.assertEqual(4, result.frame_count)
+        self.assertEqual(1, result.decode_error_count)
+        self.assertEqual(4, target.total_message_count)
+
+    def test_replay_seeds_book_from_snapshot_in_place(self):
+        snapshot = {"sequence": 1, "asks": [["6.00", "3.0", "a1"]], "bids": []}
+        frames = [(1000 + i, frame) for (i, frame) in enumerate(self.frames)]
+        target = mdf.MarketDataFeedClient(snapshot_loader=lambda product_id: snapshot, background_snapshot_load=False)
+        target.book_manager.reset()
+
+        replay.replay(frames[:3], target)
+
+        # Snapshot loaded on the first sequenced message, before the next one is applied
+        self.assertEqual(([(D("1.00000"), D("5.00")), (D("3.00000"), D("6.00"))], []), target.get_inside_levels(2))
+        self.assertEqual(2, target.book_manager.product_books["BTC-USD"].order_book.sequence)
+
+    def test_paced_replay_keeps_captured_timing(self):
+        frames = [(0, self.frames[0]), (50000000, self.frames[1])]  # 50 ms apart
+
+        result = replay.replay(frames, mdf.MarketDataFeedClient(), paced=True, speed=2.0)
+
+        self.assertGreaterEqual(result.elapsed, 0.025)
+        self.assertAlmostEqual(0.05, result.captured_span)
+
+
+if __name__ == '__main__':
+    unittest.main()
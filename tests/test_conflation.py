@@ -0,0 +1,169 @@
+import time
+import unittest
+from decimal import Decimal as D
+from market_data_feed import conflation as cf, market_data_feed_client as mdf
+from market_data_feed.order_book_manager import OrderBookManager
+
+
+def open_order(order_id, side, price, size):
+    return {"type": "open", "product_id": "BTC-USD", "order_id": order_id, "side": side, "price": price,
+            "remaining_size": size}
+
+
+def done_order(order_id, side, price):
+    return {"type": "done", "product_id": "BTC-USD", "order_id": order_id, "side": side, "price": price,
+            "reason": "canceled"}
+
+
+class TestLevelChanges(unittest.TestCase):
+
+    def test_level_changes(self):
+        sent = {"1.00": "5", "2.00": "3", "3.00": "1"}
+        levels = [("1.00", "5"), ("2.00", "4"), ("2.50", "2")]
+
+        expected = [("2.00", "4"), ("2.50", "2"), ("3.00", "0")]
+        actual = cf.level_changes(sent, levels, "0")
+
+        self.assertEqual(expected, actual)
+
+    def test_level_changes_unchanged(self):
+        self.assertEqual([], cf.level_changes({"1.00": "5"}, [("1.00", "5")]))
+
+
+class TestConflatedPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = OrderBookManager(["BTC-USD"])
+        self.manager.reset()
+        self.updates = []
+
+    def _target(self, max_publish_rate=1e-9):  # Default window never closes, so only flush() ends it
+        target = cf.ConflatedPublisher(self.manager, ["BTC-USD"], level_count=2, max_publish_rate=max_publish_rate)
+        target.add_listener(self.updates.append)
+        return target
+
+    def _apply(self, target, event):
+        self.manager.handle_event(event)
+        target.on_update(event["product_id"])
+
+    def test_first_change_published_immediately(self):
+        target = self._target()
+        self._apply(target, open_order("a1", "sell", "101.00", "1.0"))
+
+        self.assertEqual(1, len(self.updates))
+        self.assertEqual([(D("101.00"), D("1.0"))], self.updates[0].asks)
+        self.assertEqual([], self.updates[0].bids)
+        self.assertEqual(1, self.updates[0].update_count)
+
+    def test_window_coalesced_to_net_delta_per_level(self):
+        target = self._target()
+        self._apply(target, open_order("a1", "sell", "101.00", "1.0"))
+        self._apply(target, open_order("a2", "sell", "101.00", "2.0"))
+        self._apply(target, open_order("a3", "sell", "101.00", "3.0"))
+        self._apply(target, done_order("a2", "sell", "101.00"))
+        self._apply(target, open_order("b1", "buy", "99.00", "1.5"))
+        self.assertEqual(1, len(self.updates))
+
+        target.flush()
+
+        actual = self.updates[1]
+        self.assertEqual([(D("101.00"), D("4.0"))], actual.asks)
+        self.assertEqual([(D("99.00"), D("1.5"))], actual.bids)
+        self.assertEqual(4, actual.update_count)
+        self.assertEqual({'max_publish_rate': 1e-9, 'update_count': 5, 'publish_count': 2, 'published_level_count': 3,
+                          'collapsed_update_count': 3, 'pending_update_count': 0}, target.get_stats())
+
+    def test_removed_level_published_with_zero_size(self):
+        target = self._target()
+        self._apply(target, open_order("b1", "buy", "99.00", "1.5"))
+        self._apply(target, done_order("b1", "buy", "99.00"))
+        target.flush()
+
+        self.assertEqual([(D("99.00"), 0)], self.updates[1].bids)
+
+    def test_changes_that_cancel_out_not_published(self):
+        target = self._target()
+        self._apply(target, open_order("b1", "buy", "99.00", "1.5"))
+        self._apply(target, open_order("b2", "buy", "98.00", "1.0"))
+        self._apply(target, done_order("b2", "buy", "98.00"))
+        target.flush()
+
+        self.assertEqual(1, len(self.updates))
+        self.assertEqual(2, target.collapsed_update_count)
+
+    def test_changes_outside_watched_levels_not_published(self):
+        target = self._target(max_publish_rate=None)
+        self._apply(target, open_order("b1", "buy", "99.00", "1.0"))
+        self._apply(target, open_order("b2", "buy", "98.00", "1.0"))
+        self._apply(target, open_order("b3", "buy", "97.00", "1.0"))
+
+        self.assertEqual(2, len(self.updates))
+
+    def test_unlimited_rate_publishes_every_change(self):
+        target = self._target(max_publish_rate=None)
+        for i in range(3):
+            self._apply(target, open_order("a{}".format(i), "sell", "101.00", "1.0"))
+
+        self.assertEqual([D("1.0"), D("2.0"), D("3.0")], [update.asks[0][1] for update in self.updates])
+        self.assertEqual(0, target.collapsed_update_count)
+
+    def test_trailing_change_published_at_window_close(self):
+        target = self._target(max_publish_rate=20.0)
+        self._apply(target, open_order("b1", "buy", "99.00", "1.0"))
+        self._apply(target, open_order("b2", "buy", "99.00", "2.0"))
+        self._apply(target, open_order("b3", "buy", "98.00", "0.5"))
+        self.assertEqual(1, len(self.updates))
+
+        deadline = time.monotonic() + 5
+        while (len(self.updates) < 2) and (time.monotonic() < deadline):  # Book quiet -> window close timer
+            time.sleep(0.01)
+
+        self.assertEqual([(D("99.00"), D("3.0")), (D("98.00"), D("0.5"))], self.updates[1].bids)
+        self.assertEqual(2, self.updates[1].update_count)
+        time.sleep(0.1)
+        self.assertEqual(2, len(self.updates))
+
+    def test_close_cancels_window_close_timer(self):
+        target = self._target(max_publish_rate=20.0)
+        self._apply(target, open_order("b1", "buy", "99.00", "1.0"))
+        self._apply(target, open_order("b2", "buy", "98.00", "1.0"))
+        target.close()
+        time.sleep(0.1)
+
+        self.assertEqual(1, len(self.updates))
+        self.assertEqual(1, target.get_stats()['pending_update_count'])
+
+    def test_reset_publishes_next_change_against_last_published(self):
+        target = self._target()
+        self._apply(target, open_order("b1", "buy", "99.00", "1.0"))
+        self.manager.reset()
+        target.reset()
+        self._apply(target, open_order("b2", "buy", "98.00", "1.0"))
+
+        self.assertEqual([(D("98.00"), D("1.0")), (D("99.00"), 0)], self.updates[1].bids)
+
+
+class TestClientConflation(unittest.TestCase):
+
+    def test_logging_conflated(self):
+        target = mdf.MarketDataFeedClient(max_publish_rate=1e-9)
+        target.on_message(open_order("a1", "sell", "101.00", "1.0"))
+        self.assertEqual(0, target.get_publisher_stats()['update_count'])  # Not tracked without a listener
+
+        target.logging_enabled = True
+        with self.assertLogs(level='DEBUG') as logs:
+            for i in range(50):
+                target.on_message(open_order("b{}".format(i), "buy", "99.00", "1.0"))
+            self.assertEqual(49, target.get_publisher_stats()['pending_update_count'])
+            target.publisher.flush()
+
+        self.assertEqual(2, len(logs.output))
+        self.assertIn("49 updates conflated", logs.output[1])
+        self.assertEqual(48, target.get_publisher_stats()['collapsed_update_count'])
+
+        target.logging_enabled = False
+        self.assertEqual([], target.publisher.listeners)
+
+
+if __name__ == '__main__':
+    unittest.main()
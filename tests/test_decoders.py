@@ -0,0 +1,43 @@
+import json
+import unittest
+from market_data_feed import decoders
+
+
+class TestDecoders(unittest.TestCase):
+
+    def setUp(self):
+        self.open_frame = ('{"type":"open","side":"sell","price":"100.01","order_id":"a1","remaining_size":"0.5",'
+                           '"product_id":"BTC-USD","sequence":12,"time":"2020-03-21T19:32:45.123456Z"}')
+        self.received_frame = ('{"type":"received","order_id":"a1","order_type":"limit","size":"0.5",'
+                               '"price":"100.01","side":"sell","product_id":"ETH-USD","sequence":11,'
+                               '"time":"2020-03-21T19:32:45.123456Z"}')
+
+    def test_get_loads(self):
+        self.assertIs(json.loads, decoders.get_loads('json'))
+        if decoders.orjson is None:
+            self.assertIs(json.loads, decoders.get_loads('auto'))
+            with self.assertRaises(ValueError):
+                decoders.get_loads('orjson')
+        else:
+            self.assertIs(decoders.orjson.loads, decoders.get_loads('auto'))
+        with self.assertRaises(ValueError):
+            decoders.get_decoder('yaml')
+
+    def test_selective_decodes_book_events_in_full(self):
+        target = decoders.selective_decoder(loads=json.loads)
+
+        self.assertEqual(json.loads(self.open_frame), target(self.open_frame))
+
+    def test_selective_skims_ignored_events(self):
+        target = decoders.selective_decoder(loads=json.loads)
+
+        expected = {"type": "received", "product_id": "ETH-USD", "sequence": 11}
+
+        self.assertEqual(expected, target(self.received_frame))
+
+    def test_selective_falls_back_on_unexpected_formatting(self):
+        target = decoders.selective_decoder(loads=json.loads)
+        frame = json.dumps(json.loads(self.received_frame))  # Spaces after the colons
+
+        self.assertEqual(json.loads(frame), target(frame))
+        self.assertEqual(json.loads(self.open_frame), target(self.open_frame.encode()))
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+from decimal import Decimal as D
+from market_data_feed import event_file as ef, order_book as ob, capture
+
+
+class TestEventFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "btc.events")
+        self.events = [{"type": "received", "order_id": "a1", "side": "sell", "sequence": 1},
+                       {"type": "open", "order_id": "a1", "side": "sell", "price": "100.01", "remaining_size": "0.5",
+                        "sequence": 2, "time": "2020-03-21T19:32:45.000001Z"},
+                       {"type": "open", "order_id": "b2", "side": "buy", "price": "99.99", "remaining_size": "1.0",
+                        "sequence": 3, "time": "2020-03-21T19:32:46Z"},
+                       {"type": "match", "maker_order_id": "b2", "side": "buy", "price": "99.99", "size": "0.25",
+                        "sequence": 4, "time": "2020-03-21T19:32:47.5Z"},
+                       {"type": "done", "order_id": "a1", "side": "sell", "price": "100.01", "remaining_size": "0",
+                        "sequence": 5, "time": "2020-03-21T19:32:48Z"}]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, index_interval=2):
+        writer = ef.EventFileWriter(self.path, "BTC-USD", "0.01", "0.00000001", index_interval=index_interval)
+        for event in self.events:
+            writer.append(event)
+        writer.close()
+        return ef.EventFile(self.path)
+
+    def test_records_and_order_ids(self):
+        target = self._write()
+
+        self.assertEqual(4, len(target))  # `received` isn't stored
+        self.assertEqual([ef.OPEN, ef.OPEN, ef.MATCH, ef.DONE], target.records["type"].tolist())
+        self.assertEqual([10001, 9999, 9999, 10001], target.records["price"].tolist())
+        self.assertEqual([50000000, 100000000, 25000000, 0], target.records["size"].tolist())
+        self.assertEqual(["a1", "b2", "b2", "a1"], [target.order_id(i) for i in target.records["order_id"]])
+        self.assertEqual(1584819165000001000, int(target.records["time"][0]))
+        self.assertEqual([2, 4], target.index["sequence"].tolist())
+        target.close()
+
+    def test_find_by_sequence_and_time(self):
+        target = self._write()
+
+        self.assertEqual(0, target.find_sequence(0))
+        self.assertEqual(2, target.find_sequence(4))
+        self.assertEqual(4, target.find_sequence(100))
+        self.assertEqual(1, target.find_time(ef.parse_exchange_time("2020-03-21T19:32:45.5Z")))
+        self.assertEqual(3, target.find_time(ef.parse_exchange_time("2020-03-21T19:32:48Z")))
+        target.close()
+
+    def test_apply_to_fixed_point_book(self):
+        target = self._write()
+        order_book = ob.OrderBook(max_levels=5, **target.order_book_kwargs())
+
+        target.apply_to(order_book, stop=3)
+
+        self.assertEqual([(10001, 50000000)], order_book.get_inside_ask_levels(5))
+        self.assertEqual([(9999, 75000000)], order_book.get_inside_bid_levels(5))
+        self.assertEqual(4, order_book.sequence)
+        self.assertEqual(D("99.99"), order_book.get_microstructure()["vwap"])
+
+        with self.assertRaises(ValueError):
+            target.apply_to(ob.OrderBook(max_levels=5))
+        target.close()
+
+    def test_iter_events_matches_original_book(self):
+        target = self._write()
+        expected = ob.OrderBook(max_levels=5)
+        expected.apply_batch(self.events[:4])
+        order_book = ob.OrderBook(max_levels=5)
+
+        order_book.apply_batch(target.iter_events(stop=3))
+
+        self.assertEqual(expected.get_inside_ask_levels(5), order_book.get_inside_ask_levels(5))
+        self.assertEqual(expected.get_inside_bid_levels(5), order_book.get_inside_bid_levels(5))
+        target.close()
+
+    def test_iter_events_shape(self):
+        self.events.append({"type": "done", "order_id": "m3", "side": "buy", "sequence": 6,
+                            "time": "2020-03-21T19:32:49Z"})  # Market order -> no price
+        target = self._write()
+
+        actual = list(target.iter_events(start=3))
+
+        self.assertEqual([{"type": "done", "side": "sell", "product_id": "BTC-USD", "sequence": 5,
+                           "time": "2020-03-21T19:32:48.000000Z", "price": "100.01", "order_id": "a1",
+                           "remaining_size": "0E-8"},
+                          {"type": "done", "side": "buy", "product_id": "BTC-USD", "sequence": 6,
+                           "time": "2020-03-21T19:32:49.000000Z", "order_id": "m3", "remaining_size": "0E-8"}], actual)
+        target.close()
+
+    def test_record_times_never_decrease(self):
+        writer = ef.EventFileWriter(self.path, "BTC-USD", "0.01", "0.00000001", index_interval=1)
+        writer.append(self.events[1])
+        writer.append({"type": "done", "order_id": "a1", "side": "sell", "sequence": 3}, receive_time_ns=123)
+        writer.append(self.events[2])
+        writer.close()
+        target = ef.EventFile(self.path)
+
+        # Receive time behind the exchange time before it -> held at that time
+        self.assertEqual([1584819165000001000, 1584819165000001000, 1584819166000000000],
+                         target.records["time"].tolist())
+        self.assertEqual(2, target.find_time(1584819165000001001))
+        target.close()
+
+    def test_convert_capture(self):
+        recorder = capture.FrameRecorder(self.directory)
+        recorder.record('{"type":"open","product_id":"ETH-USD","order_id":"e1","side":"buy","price":"1.00",'
+                        '"remaining_size":"1.0","sequence":1}')
+        recorder.record('{"type":"open","product_id":"BTC-USD","order_id":"a1","side":"sell","price":"100.01",'
+                        '"remaining_size":"0.5","sequence":2}', receive_time_ns=123)
+        recorder.close()
+
+        record_count = ef.convert_capture(self.directory, self.path, "BTC-USD", "0.01", "0.00000001")
+        target = ef.EventFile(self.path)
+
+        self.assertEqual(1, record_count)
+        self.assertEqual([123], target.records["time"].tolist())  # No exchange time -> receive time
+        self.assertEqual("BTC-USD", target.product_id)
+        target.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
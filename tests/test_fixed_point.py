@@ -0,0 +1,30 @@
+import unittest
+from market_data_feed import fixed_point as fp
+from decimal import Decimal as D
+
+
+class TestFixedPointScale(unittest.TestCase):
+
+    def test_to_units(self):
+        target = fp.FixedPointScale("0.01")
+
+        self.assertEqual(10000, target.to_units("100.00"))
+        self.assertEqual(10000, target.to_units("100.0"))
+        self.assertEqual(10000, target.to_units("100"))
+        self.assertEqual(10001, target.to_units("100.01000"))
+
+    def test_to_units_non_power_of_ten_increment(self):
+        target = fp.FixedPointScale("0.05")
+
+        self.assertEqual(3, target.to_units("0.15"))
+        self.assertEqual(D("0.15"), target.to_decimal(3))
+
+    def test_to_decimal(self):
+        target = fp.FixedPointScale("0.00000001")
+
+        self.assertEqual(D("0.12345678"), target.to_decimal(12345678))
+        self.assertEqual("0.12345678", str(target.to_decimal(12345678)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from threading import Thread
+from market_data_feed import frame_queue as fq
+
+
+class TestFrameQueue(unittest.TestCase):
+
+    def test_get_batch_returns_frames_in_order(self):
+        target = fq.FrameQueue(capacity=5)
+        for frame in ("a", "b", "c"):
+            target.put(frame)
+
+        self.assertEqual(["a", "b", "c"], target.get_batch())
+        self.assertEqual(0, len(target))
+        self.assertEqual(3, target.high_water_mark)
+
+    def test_get_batch_returns_none_once_closed_and_empty(self):
+        target = fq.FrameQueue(capacity=5)
+        target.put("a")
+        target.close()
+
+        self.assertEqual(["a"], target.get_batch())
+        self.assertIsNone(target.get_batch())
+
+    def test_block_waits_for_room(self):
+        target = fq.FrameQueue(capacity=2, overflow_policy=fq.BLOCK)
+        target.put("a")
+        target.put("b")
+
+        producer = Thread(target=target.put, args=("c",))
+        producer.start()
+        producer.join(0.05)
+        self.assertTrue(producer.is_alive())
+
+        self.assertEqual(["a", "b"], target.get_batch())
+        producer.join()
+        self.assertEqual(["c"], target.get_batch())
+        self.assertEqual(0, target.dropped_count)
+        self.assertEqual(1, target.overflow_count)
+
+    def test_drop_oldest_discards_oldest_frame(self):
+        target = fq.FrameQueue(capacity=2, overflow_policy=fq.DROP_OLDEST)
+        for frame in ("a", "b", "c"):
+            target.put(frame)
+
+        self.assertEqual(["b", "c"], target.get_batch())
+        self.assertEqual(1, target.dropped_count)
+
+    def test_fail_and_resync_discards_backlog(self):
+        target = fq.FrameQueue(capacity=2, overflow_policy=fq.FAIL_AND_RESYNC)
+        for frame in ("a", "b", "c"):
+            target.put(frame)
+
+        self.assertEqual([fq.RESYNC, "c"], target.get_batch())
+        self.assertEqual(2, target.dropped_count)
+        self.assertEqual(1, target.overflow_count)
+
+    def test_overflow_keeps_reconnected_sentinel(self):
+        target = fq.FrameQueue(capacity=3, overflow_policy=fq.DROP_OLDEST)
+        for frame in (fq.RECONNECTED, "a", "b", "c", "d"):
+            target.put(frame)
+
+        self.assertEqual([fq.RECONNECTED, "c", "d"], target.get_batch())
+        self.assertEqual(2, target.dropped_count)
+
+        target = fq.FrameQueue(capacity=3, overflow_policy=fq.FAIL_AND_RESYNC)
+        for frame in ("a", fq.RECONNECTED, "b", "c"):
+            target.put(frame)
+
+        self.assertEqual([fq.RECONNECTED, fq.RESYNC, "c"], target.get_batch())
+        self.assertEqual(2, target.dropped_count)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            fq.FrameQueue(overflow_policy="drop-newest")
@@ -0,0 +1,78 @@
+import math
+import unittest
+import numpy as np
+from market_data_feed import order_book as ob, level_arrays as la, market_data_feed_client as mdf
+
+
+class TestLevelArrays(unittest.TestCase):
+
+    def test_fill_inside_levels_array(self):
+        order_book = ob.OrderBook(max_levels=5)
+        order_book.handle_event({"type": "open", "order_id": "1", "remaining_size": "1.5", "price": "5.00", "side": "sell"})
+        order_book.handle_event({"type": "open", "order_id": "2", "remaining_size": "0.5", "price": "5.00", "side": "sell"})
+        order_book.handle_event({"type": "open", "order_id": "3", "remaining_size": "2.0", "price": "6.00", "side": "sell"})
+        order_book.handle_event({"type": "open", "order_id": "4", "remaining_size": "1.0", "price": "4.00", "side": "buy"})
+
+        target = la.new_inside_levels_array(3)
+        la.fill_inside_levels_array(order_book, target)
+
+        self.assertEqual((2, 3), target.shape)
+        self.assertEqual([5.0, 6.0], list(target['price'][la.ASK_ROW, :2]))
+        self.assertEqual([2.0, 2.0], list(target['size'][la.ASK_ROW, :2]))
+        self.assertEqual([2, 1, 0], list(target['order_count'][la.ASK_ROW]))
+        self.assertTrue(math.isnan(target['price'][la.ASK_ROW, 2]))
+        self.assertEqual(4.0, target['price'][la.BID_ROW, 0])
+        self.assertEqual([1.0, 0.0, 0.0], list(target['size'][la.BID_ROW]))
+
+    def test_fill_inside_levels_array_fixed_point(self):
+        order_book = ob.OrderBook(max_levels=5, tick_size="0.01", lot_size="0.00000001")
+        order_book.handle_event({"type": "open", "order_id": "1", "remaining_size": "0.1", "price": "100.01",
+                                 "side": "sell"})
+
+        target = la.fill_inside_levels_array(order_book, la.new_inside_levels_array(1))
+
+        self.assertEqual(100.01, target['price'][la.ASK_ROW, 0])
+        self.assertEqual(0.1, target['size'][la.ASK_ROW, 0])
+
+    def test_client_reuses_buffer_and_samples(self):
+        target = mdf.MarketDataFeedClient()
+        target.order_book.handle_event({"type": "open", "order_id": "1", "remaining_size": "1.0", "price": "5.00",
+                                        "side": "sell"})
+
+        first = target.get_inside_levels_array(2)
+        second = target.get_inside_levels_array(2)
+        samples = target.sample_inside_levels_array(2, 3, 0)
+
+        self.assertIs(first, second)
+        self.assertEqual((3, 2, 2), samples.shape)
+        self.assertEqual([5.0, 5.0, 5.0], list(samples['price'][:, la.ASK_ROW, 0]))
+
+    def test_client_array_per_product(self):
+        target = mdf.MarketDataFeedClient(products=["BTC-USD", "ETH-USD"])
+        for (order_id, product_id, price) in (("1", "BTC-USD", "5.00"), ("2", "ETH-USD", "7.00"),
+                                              ("3", "ETH-USD", "7.00")):
+            target.on_message({"type": "open", "product_id": product_id, "order_id": order_id, "remaining_size": "1.0",
+                               "price": price, "side": "buy"})
+
+        actual = target.get_inside_levels_array(2, product_id="ETH-USD")
+
+        self.assertEqual([7.0, 2.0, 2], list(actual[la.BID_ROW, 0].item()))
+        self.assertTrue(np.isnan(actual["price"][la.ASK_ROW, 0]))
+        samples = target.sample_inside_levels_array(1, 2, 0, product_id="BTC-USD")
+        self.assertEqual([5.0, 5.0], list(samples["price"][:, la.BID_ROW, 0]))
+
+    def test_client_array_sharded(self):
+        target = mdf.MarketDataFeedClient(shard_count=1)
+        target.book_manager.start()
+        try:
+            target.on_message({"type": "open", "product_id": "BTC-USD", "order_id": "1", "remaining_size": "1.5",
+                               "price": "5.00", "side": "sell"})
+            actual = target.get_inside_levels_array(1)
+        finally:
+            target.book_manager.close()
+
+        self.assertEqual((5.0, 1.5, 1), actual[la.ASK_ROW, 0].item())
+
+
+if __name__ == '__main__':
+    unittest.main()
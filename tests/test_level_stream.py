@@ -0,0 +1,124 @@
+import json
+import time
+import unittest
+from market_data_feed import market_data_feed_client as mdf, level_stream as ls
+
+
+def open_order(order_id, side, price, size):
+    return {"type": "open", "product_id": "BTC-USD", "order_id": order_id, "side": side, "price": price,
+            "remaining_size": size}
+
+
+class TestLevelStream(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mdf.MarketDataFeedClient()
+        self.client.on_message(open_order("a1", "sell", "101.00", "1.0"))
+        self.client.on_message(open_order("b1", "buy", "99.00", "2.0"))
+        self.target = ls.LevelStream(self.client, sample_interval=0.001)
+
+    def tearDown(self):
+        self.target.close()
+
+    def test_snapshot_then_deltas(self):
+        subscription = self.target.subscribe("BTC-USD", level_count=2, conflation_interval=0)
+        actual = json.loads(subscription.next_message(5))
+        self.assertEqual("snapshot", actual["type"])
+        self.assertEqual([["101.00", "1.0"]], actual["asks"])
+        self.assertEqual([["99.00", "2.0"]], actual["bids"])
+
+        self.client.on_message(open_order("b2", "buy", "99.50", "0.5"))
+        actual = json.loads(subscription.next_message(5))
+        self.assertEqual("update", actual["type"])
+        self.assertEqual([], actual["asks"])
+        self.assertEqual([["99.50", "0.5"]], actual["bids"])
+
+        self.client.on_message({"type": "done", "product_id": "BTC-USD", "order_id": "a1", "side": "sell",
+                                "price": "101.00", "reason": "filled"})
+        actual = json.loads(subscription.next_message(5))
+        self.assertEqual([["101.00", "0"]], actual["asks"])
+        self.assertEqual([], actual["bids"])
+
+    def test_level_pushed_out_of_depth_is_removed(self):
+        subscription = self.target.subscribe("BTC-USD", level_count=1, conflation_interval=0)
+        subscription.next_message(5)
+
+        self.client.on_message(open_order("b2", "buy", "99.50", "0.5"))
+        actual = json.loads(subscription.next_message(5))
+
+        self.assertEqual([["99.50", "0.5"], ["99.00", "0"]], actual["bids"])
+
+    def test_conflation_merges_changes(self):
+        subscription = self.target.subscribe("BTC-USD", level_count=5, conflation_interval=0.2)
+        subscription.next_message(5)
+
+        start = time.monotonic()
+        for i in range(5):
+            self.client.on_message(open_order("b{}".format(i + 2), "buy", "98.0{}".format(i), "1.0"))
+            time.sleep(0.01)
+        actual = json.loads(subscription.next_message(5))
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        self.assertEqual(4, len(actual["bids"]))  # Five new levels, the deepest outside the five sent
+        self.assertGreater(subscription.skipped_version_count, 0)
+
+    def test_unchanged_book_times_out(self):
+        subscription = self.target.subscribe("BTC-USD", conflation_interval=0)
+        subscription.next_message(5)
+
+        self.assertIsNone(subscription.next_message(0.05))
+
+    def test_events_keep_alive_and_close(self):
+        subscription = self.target.subscribe("BTC-USD", conflation_interval=0)
+        events = subscription.events(keep_alive_interval=0.05)
+
+        self.assertTrue(next(events).startswith('data: {"type":"snapshot"'))
+        self.assertEqual(': keep-alive\n\n', next(events))
+        events.close()
+
+        self.assertTrue(subscription.closed)
+        self.assertEqual(0, self.target.get_stats()['subscription_count'])
+
+    def test_subscribers_in_step_share_serialized_delta(self):
+        subscriptions = [self.target.subscribe("BTC-USD", level_count=3, conflation_interval=0) for _ in range(3)]
+        for subscription in subscriptions:
+            subscription.next_message(5)
+        self.client.on_message(open_order("a2", "sell", "100.50", "3.0"))
+
+        actual = [subscription.next_message(5) for subscription in subscriptions]
+
+        self.assertIs(actual[0], actual[1])
+        self.assertIs(actual[0], actual[2])
+
+    def test_stalled_subscriber_dropped(self):
+        self.target.stall_timeout = 0.05
+        stalled = self.target.subscribe("BTC-USD", conflation_interval=0)
+        stalled.next_message(5)
+        self.target._drop_stalled(time.monotonic() + 1)
+
+        self.assertTrue(stalled.closed)
+        self.assertEqual(1, self.target.get_stats()['dropped_subscription_count'])
+        self.assertIsNone(stalled.next_message(0.01))
+
+    def test_waiting_subscriber_not_dropped(self):
+        self.target.stall_timeout = 0.05
+        subscription = self.target.subscribe("BTC-USD", conflation_interval=0)
+        subscription.next_message(5)
+        subscription.waiting = True  # As if blocked in next_message on a quiet book
+        self.target._drop_stalled(time.monotonic() + 1)
+
+        self.assertFalse(subscription.closed)
+
+    def test_subscribe_validation(self):
+        with self.assertRaises(ValueError):
+            self.target.subscribe("ETH-USD")
+        with self.assertRaises(ValueError):
+            self.target.subscribe("BTC-USD", level_count=self.target.max_level_count + 1)
+        self.target.max_subscriptions = 1
+        self.target.subscribe("BTC-USD")
+        with self.assertRaises(ValueError):
+            self.target.subscribe("BTC-USD")
+
+
+if __name__ == '__main__':
+    unittest.main()
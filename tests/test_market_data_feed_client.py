@@ -1,5 +1,5 @@
 import unittest
-from market_data_feed import order_book as ob, market_data_feed_client as mdf
+from market_data_feed import order_book as ob, market_data_feed_client as mdf, frame_queue as fq
 from decimal import Decimal as D
 
 
@@ -7,8 +7,8 @@ class TestMarketDataFeedClient(unittest.TestCase):
 
     def test_get_inside_levels_printout_happy_path(self):
         test_order_book = ob.OrderBook(max_levels=3)
-        test_order_book.best_ask_levels = {"5.00": (D("5.0"), {"5"}), "6.00": (D("6.0"), {"6"}), "7.00": (D("7.0"), {"7"})}
-        test_order_book.best_bid_levels = {"1.00": (D("1.0"), {"1"}), "2.00": (D("2.0"), {"2"}), "3.00": (D("3.0"), {"3"})}
+        test_order_book.best_ask_levels = {"5.00": ob.PriceLevel(D("5.0"), {"5"}), "6.00": ob.PriceLevel(D("6.0"), {"6"}), "7.00": ob.PriceLevel(D("7.0"), {"7"})}
+        test_order_book.best_bid_levels = {"1.00": ob.PriceLevel(D("1.0"), {"1"}), "2.00": ob.PriceLevel(D("2.0"), {"2"}), "3.00": ob.PriceLevel(D("3.0"), {"3"})}
 
         target = mdf.MarketDataFeedClient()
         target.order_book = test_order_book
@@ -25,8 +25,8 @@ class TestMarketDataFeedClient(unittest.TestCase):
 
     def test_get_inside_levels_printout_partial_book(self):
         test_order_book = ob.OrderBook(max_levels=3)
-        test_order_book.best_ask_levels = {"5.00": (D("5.0"), {"5"})}
-        test_order_book.best_bid_levels = {"1.00": (D("1.0"), {"1"})}
+        test_order_book.best_ask_levels = {"5.00": ob.PriceLevel(D("5.0"), {"5"})}
+        test_order_book.best_bid_levels = {"1.00": ob.PriceLevel(D("1.0"), {"1"})}
 
         target = mdf.MarketDataFeedClient()
         target.order_book = test_order_book
@@ -39,6 +39,71 @@ class TestMarketDataFeedClient(unittest.TestCase):
 
         self._assertEqualLineByLine(expected, actual)
 
+    def test_get_inside_levels_printout_fixed_point(self):
+        target = mdf.MarketDataFeedClient(tick_size="0.01", lot_size="0.00000001")
+        target.order_book.handle_event({"type": "open", "order_id": "5", "remaining_size": "5.0", "price": "5.00",
+                                        "side": "sell"})
+        target.order_book.handle_event({"type": "open", "order_id": "1", "remaining_size": "1.0", "price": "1.00",
+                                        "side": "buy"})
+
+        expected = (" 5.00000 @ 5.00\n"
+                    "----------------\n"
+                    " 1.00000 @ 1.00")
+
+        actual = target.get_inside_levels_printout(2)
+
+        self._assertEqualLineByLine(expected, actual)
+
+    def test_get_inside_levels_printout_cached_until_book_changes(self):
+        target = mdf.MarketDataFeedClient()
+        target.order_book.handle_event({"type": "open", "order_id": "5", "remaining_size": "5.0", "price": "5.00",
+                                        "side": "sell"})
+
+        first = target.get_inside_levels_printout(2)
+        second = target.get_inside_levels_printout(2)
+
+        self.assertIs(first, second)
+
+        target.order_book.handle_event({"type": "open", "order_id": "6", "remaining_size": "1.0", "price": "5.00",
+                                        "side": "sell"})
+
+        expected = (" 6.00000 @ 5.00\n"
+                    "----------------")
+
+        actual = target.get_inside_levels_printout(2)
+
+        self._assertEqualLineByLine(expected, actual)
+        self.assertEqual(([(D("6.00000"), D("5.00"))], []), target.get_inside_levels(2))
+
+    def test_get_inside_levels_json_serialized_once_per_version(self):
+        target = mdf.MarketDataFeedClient()
+        target.on_message({"type": "open", "product_id": "BTC-USD", "order_id": "5", "remaining_size": "5.0",
+                           "price": "5.00", "side": "sell", "time": "2021-06-01T12:00:00.000001Z"})
+
+        (version, first) = target.get_inside_levels_json(2)
+        self.assertIs(first, target.get_inside_levels_json(2)[1])
+        self.assertEqual('{"product_id":"BTC-USD","version":' + str(version) + ',"time":"2021-06-01T12:00:00.000001Z",'
+                         '"asks":[["5.00","5.0"]],"bids":[]}', first)
+
+        target.on_message({"type": "done", "product_id": "BTC-USD", "order_id": "5", "side": "sell"})
+        (actual_version, actual) = target.get_inside_levels_json(2)
+
+        self.assertGreater(actual_version, version)
+        self.assertIn('"asks":[]', actual)
+
+    def test_pipeline_worker_decodes_and_applies_frames(self):
+        target = mdf.MarketDataFeedClient(pipeline=True, queue_size=2, overflow_policy=fq.FAIL_AND_RESYNC)
+        target.frame_queue = fq.FrameQueue(target.queue_size, target.overflow_policy)
+        target.frame_queue.put('{"type": "open", "product_id": "BTC-USD", "order_id": "1", "remaining_size": "1.0", '
+                               '"price": "5.00", "side": "sell"}')
+        target.frame_queue.close()
+
+        target._work(target.frame_queue)
+
+        self.assertEqual(([(D("1.00000"), D("5.00"))], []), target.get_inside_levels(2))
+        self.assertEqual(1, target.message_type_count["open"])
+        self.assertEqual(1, target.get_queue_stats()["high_water_mark"])
+
     def _assertEqualLineByLine(self, expected, actual):
         expected_lines = expected.split("\n")
         actual_lines = actual.split("\n")
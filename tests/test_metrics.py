@@ -0,0 +1,132 @@
+import json
+import unittest
+from market_data_feed import metrics, time_util, market_data_feed_client as mdf
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_small_values_are_exact(self):
+        target = metrics.LatencyHistogram()
+        for value in range(1, 101):
+            target.record(value)
+
+        expected = [50, 90, 99, 100]
+
+        actual = target.percentiles([50, 90, 99, 100])
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(100, target.count())
+        self.assertEqual(5050, target.total)
+        self.assertEqual(100, target.max)
+
+    def test_large_values_within_bucket_resolution(self):
+        target = metrics.LatencyHistogram(sub_bucket_bits=7)
+        values = [1000 * i for i in range(1, 1001)]
+        for value in values:
+            target.record(value)
+
+        for (percent, expected) in ((50, 500000), (99, 990000), (99.9, 999000)):
+            actual = target.percentiles([percent])[0]
+            self.assertLessEqual(abs(actual - expected) / expected, 1 / 128)
+
+    def test_out_of_range_values_are_clamped(self):
+        target = metrics.LatencyHistogram(max_value_bits=20)
+        target.record(-5)
+        target.record(1 << 30)
+
+        self.assertEqual(2, target.count())
+        self.assertEqual((1 << 20) - 1, target.max)
+        (low, high) = target.percentiles([50, 100])
+        self.assertEqual(0, low)
+        self.assertLessEqual(((1 << 20) - 1 - high) / (1 << 20), 1 / 128)
+
+    def test_empty(self):
+        target = metrics.LatencyHistogram()
+
+        self.assertEqual([0, 0], target.percentiles([50, 99]))
+
+
+class TestExchangeTimeParser(unittest.TestCase):
+
+    def test_matches_full_parse(self):
+        target = time_util.ExchangeTimeParser()
+        for text in ('2020-03-21T19:32:45.123456Z', '2020-03-21T19:32:59.999999Z', '2020-03-21T19:33:00.000001Z',
+                     '2020-03-21T19:33:00.5Z', '2020-03-21T19:33:01Z'):
+            self.assertEqual(time_util.parse_exchange_time(text), target(text))
+
+
+class TestFeedMetrics(unittest.TestCase):
+
+    def _events(self):
+        return [{"type": "open", "side": "sell", "price": "100.01", "order_id": "a1", "remaining_size": "0.5",
+                 "product_id": "BTC-USD", "sequence": 1, "time": "2020-03-21T19:32:45.123456Z"},
+                {"type": "open", "side": "buy", "price": "99.99", "order_id": "b1", "remaining_size": "1.5",
+                 "product_id": "BTC-USD", "sequence": 2, "time": "2020-03-21T19:32:45.123457Z"},
+                {"type": "done", "side": "sell", "price": "100.01", "order_id": "a1", "remaining_size": "0",
+                 "reason": "canceled", "product_id": "BTC-USD", "sequence": 3, "time": "2020-03-21T19:32:45.123458Z"}]
+
+    def test_record_apply(self):
+        target = metrics.FeedMetrics()
+        exchange_ns = time_util.parse_exchange_time("2020-03-21T19:32:45.123456Z")
+        target.record_apply("open", 1500, "2020-03-21T19:32:45.123456Z", exchange_ns + 2000000)
+        target.record_apply("open", 2500, "2020-03-21T19:32:45.123456Z", exchange_ns - 1000)
+        target.record_apply("done", 900, None, exchange_ns)
+
+        self.assertEqual(2, target.apply_latency["open"].count())
+        self.assertEqual(1, target.apply_latency["done"].count())
+        self.assertEqual(1, target.exchange_lag.count())
+        self.assertEqual(2000000, target.exchange_lag.total)
+        self.assertEqual(1, target.negative_lag_count)
+
+    def test_timed_decoder_samples(self):
+        target = metrics.FeedMetrics(sample_interval=4)
+        decode = target.timed_decoder(json.loads)
+
+        for i in range(10):
+            self.assertEqual({"i": i}, decode('{"i":%d}' % i))
+
+        self.assertEqual(2, target.decode_latency.count())
+
+    def test_client_records_sampled_messages(self):
+        target = mdf.MarketDataFeedClient(metrics_enabled=True, metrics_sample_interval=1)
+        target.book_manager.reset()
+        for event in self._events():
+            target.on_message(event)
+
+        self.assertEqual(2, target.metrics.apply_latency["open"].count())
+        self.assertEqual(1, target.metrics.apply_latency["done"].count())
+        self.assertEqual(3, target.metrics.exchange_lag.count())
+
+    def test_client_without_metrics(self):
+        target = mdf.MarketDataFeedClient()
+        target.book_manager.reset()
+        for event in self._events():
+            target.on_message(event)
+
+        self.assertIsNone(target.metrics)
+        self.assertNotIn("mdf_apply_latency_seconds", metrics.render_prometheus(target))
+
+    def test_render_prometheus(self):
+        client = mdf.MarketDataFeedClient(metrics_enabled=True, metrics_sample_interval=1)
+        client.book_manager.reset()
+        for event in self._events():
+            client.on_message(event)
+
+        actual = metrics.render_prometheus(client).splitlines()
+
+        self.assertIn('# TYPE mdf_messages_total counter', actual)
+        self.assertIn('mdf_messages_total{type="open"} 2', actual)
+        self.assertIn('mdf_book_orders{product_id="BTC-USD",side="buy"} 1', actual)
+        self.assertIn('mdf_book_orders{product_id="BTC-USD",side="sell"} 0', actual)
+        self.assertIn('# TYPE mdf_apply_latency_seconds summary', actual)
+        self.assertIn('mdf_apply_latency_seconds_count{type="open"} 2', actual)
+        self.assertIn('mdf_exchange_lag_seconds_count 3', actual)
+        self.assertTrue(any(line.startswith('mdf_apply_latency_seconds{type="done",quantile="0.99"} ')
+                            for line in actual))
+        for line in actual:
+            if not line.startswith('#'):
+                float(line.rsplit(' ', 1)[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import random
 import unittest
 from market_data_feed import order_book as ob
 from decimal import Decimal as D
@@ -46,10 +47,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_open_sell_same_price_levels(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {"1.00": (D("1.005"), {"1"}), "2.00": (D("0.5"), {"2"})}
-        target.best_bid_levels = {}
-        target.ask_ids = {"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5"))}
-        target.bid_ids = {}
+        target.best_ask_levels = self._levels({"1.00": (D("1.005"), {"1"}), "2.00": (D("0.5"), {"2"})})
+        target.best_bid_levels = self._levels({})
+        target.ask_ids = self._orders({"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5"))})
+        target.bid_ids = self._orders({})
         target.worst_ask_price = D("2.00")
         target.worst_bid_price = D("-1.0")
 
@@ -72,10 +73,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_open_sell_full_book(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {"1.00": (D("2.01"), {"1", "3"}), "2.00": (D("1.0"), {"2", "4"})}
-        target.best_bid_levels = {}
-        target.ask_ids = {"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5")), "3": ("1.00", D("1.005")), "4": ("2.00", D("0.5"))}
-        target.bid_ids = {}
+        target.best_ask_levels = self._levels({"1.00": (D("2.01"), {"1", "3"}), "2.00": (D("1.0"), {"2", "4"})})
+        target.best_bid_levels = self._levels({})
+        target.ask_ids = self._orders({"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5")), "3": ("1.00", D("1.005")), "4": ("2.00", D("0.5"))})
+        target.bid_ids = self._orders({})
         target.worst_ask_price = D("2.00")
         target.worst_bid_price = D("-1.0")
 
@@ -146,10 +147,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_open_buy_same_price_levels(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {}
-        target.best_bid_levels = {"1.00": (D("1.005"), {"1"}), "2.00": (D("0.5"), {"2"})}
-        target.ask_ids = {}
-        target.bid_ids = {"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5"))}
+        target.best_ask_levels = self._levels({})
+        target.best_bid_levels = self._levels({"1.00": (D("1.005"), {"1"}), "2.00": (D("0.5"), {"2"})})
+        target.ask_ids = self._orders({})
+        target.bid_ids = self._orders({"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5"))})
         target.worst_ask_price = D("-1.0")
         target.worst_bid_price = D("1.00")
 
@@ -172,10 +173,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_open_buy_full_book(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {}
-        target.best_bid_levels = {"1.00": (D("2.01"), {"1", "3"}), "2.00": (D("1.0"), {"2", "4"})}
-        target.ask_ids = {}
-        target.bid_ids = {"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5")), "3": ("1.00", D("1.005")), "4": ("2.00", D("0.5"))}
+        target.best_ask_levels = self._levels({})
+        target.best_bid_levels = self._levels({"1.00": (D("2.01"), {"1", "3"}), "2.00": (D("1.0"), {"2", "4"})})
+        target.ask_ids = self._orders({})
+        target.bid_ids = self._orders({"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5")), "3": ("1.00", D("1.005")), "4": ("2.00", D("0.5"))})
         target.worst_ask_price = D("-1.0")
         target.worst_bid_price = D("1.00")
 
@@ -209,16 +210,254 @@ class TestOrderBook(unittest.TestCase):
         self._assert_order_book_values(target, expected_best_ask_levels, expected_best_bid_levels, expected_ask_ids,
                                        expected_bid_ids, expected_worst_ask_price, expected_worst_bid_price)
 
+    #########################
+    # Full Depth Unit Tests #
+    #########################
+
+    def test_full_depth_keeps_levels_beyond_max_levels(self):
+        target = ob.OrderBook(max_levels=2, full_depth=True)
+
+        target.handle_event({"type": "open", "order_id": "1", "remaining_size": "1.0", "price": "1.00", "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "2", "remaining_size": "2.0", "price": "2.00", "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "3", "remaining_size": "3.0", "price": "3.00", "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "4", "remaining_size": "4.0", "price": "4.00", "side": "buy"})
+        target.handle_event({"type": "open", "order_id": "5", "remaining_size": "5.0", "price": "3.50", "side": "buy"})
+        target.handle_event({"type": "open", "order_id": "6", "remaining_size": "6.0", "price": "0.50", "side": "buy"})
+
+        expected_best_ask_levels = {"1.00": (D("1.0"), {"1"}), "2.00": (D("2.0"), {"2"}), "3.00": (D("3.0"), {"3"})}
+        expected_best_bid_levels = {"4.00": (D("4.0"), {"4"}), "3.50": (D("5.0"), {"5"}), "0.50": (D("6.0"), {"6"})}
+        expected_ask_ids = {"1": ("1.00", D("1.0")), "2": ("2.00", D("2.0")), "3": ("3.00", D("3.0"))}
+        expected_bid_ids = {"4": ("4.00", D("4.0")), "5": ("3.50", D("5.0")), "6": ("0.50", D("6.0"))}
+        expected_worst_ask_price = D("3.00")
+        expected_worst_bid_price = D("0.50")
+
+        self._assert_order_book_values(target, expected_best_ask_levels, expected_best_bid_levels, expected_ask_ids,
+                                       expected_bid_ids, expected_worst_ask_price, expected_worst_bid_price)
+
+    def test_full_depth_refills_inside_levels_after_sweep(self):
+        target = ob.OrderBook(max_levels=2, full_depth=True)
+        target.handle_event({"type": "open", "order_id": "1", "remaining_size": "1.0", "price": "1.00", "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "2", "remaining_size": "2.0", "price": "2.00", "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "3", "remaining_size": "3.0", "price": "3.00", "side": "sell"})
+
+        # Sweep the two inside levels -> deeper level should become the inside level
+
+        target.handle_event({"type": "match", "maker_order_id": "1", "size": "1.0", "price": "1.00", "side": "sell"})
+        target.handle_event({"type": "match", "maker_order_id": "2", "size": "2.0", "price": "2.00", "side": "sell"})
+
+        expected_inside_ask_levels = [("3.00", D("3.0"))]
+        actual_inside_ask_levels = target.get_inside_ask_levels(2)
+
+        self.assertEqual(expected_inside_ask_levels, actual_inside_ask_levels)
+        self.assertEqual(D("3.00"), target.worst_ask_price)
+
+    ##########################
+    # Fixed Point Unit Tests #
+    ##########################
+
+    def test_fixed_point_open_done_and_match(self):
+        target = ob.OrderBook(max_levels=2, tick_size="0.01", lot_size="0.00000001")
+
+        # Equivalent price strings land on the same integer level
+
+        target.handle_event({"type": "open", "order_id": "1", "remaining_size": "1.5", "price": "100.0", "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "2", "remaining_size": "0.25000000", "price": "100.00",
+                             "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "3", "remaining_size": "2", "price": "99.99", "side": "buy"})
+
+        expected_best_ask_levels = {10000: (175000000, {"1", "2"})}
+        expected_best_bid_levels = {9999: (200000000, {"3"})}
+        expected_ask_ids = {"1": (10000, 150000000), "2": (10000, 25000000)}
+        expected_bid_ids = {"3": (9999, 200000000)}
+        expected_worst_ask_price = 10000
+        expected_worst_bid_price = 9999
+
+        self._assert_order_book_values(target, expected_best_ask_levels, expected_best_bid_levels, expected_ask_ids,
+                                       expected_bid_ids, expected_worst_ask_price, expected_worst_bid_price)
+
+        # Partial fill, complete fill and cancel
+
+        target.handle_event({"type": "match", "maker_order_id": "1", "size": "0.5", "price": "100.00", "side": "sell"})
+        target.handle_event({"type": "match", "maker_order_id": "2", "size": "0.25", "price": "100.00", "side": "sell"})
+        target.handle_event({"type": "done", "order_id": "3", "remaining_size": "2", "price": "99.99", "side": "buy"})
+
+        expected_best_ask_levels = {10000: (100000000, {"1"})}
+        expected_best_bid_levels = {}
+        expected_ask_ids = {"1": (10000, 100000000)}
+        expected_bid_ids = {}
+        expected_worst_ask_price = 10000
+        expected_worst_bid_price = -1
+
+        self._assert_order_book_values(target, expected_best_ask_levels, expected_best_bid_levels, expected_ask_ids,
+                                       expected_bid_ids, expected_worst_ask_price, expected_worst_bid_price)
+
+        self.assertEqual(D("100.00"), target.to_decimal_price(10000))
+        self.assertEqual(D("1.00000000"), target.to_decimal_size(100000000))
+
+    #######################
+    # Snapshot Unit Tests #
+    #######################
+
+    def test_load_snapshot_replaces_book(self):
+        target = ob.OrderBook(max_levels=2)
+        target.handle_event({"type": "open", "order_id": "old", "remaining_size": "9.0", "price": "9.00", "side": "sell"})
+
+        target.load_snapshot({"sequence": "42",
+                              "asks": [["5.00", "1.0", "5"], ["6.00", "1.0", "6"], ["7.00", "1.0", "7"]],
+                              "bids": [["1.00", "0.5", "1"], ["1.00", "0.5", "2"]]})
+
+        expected_best_ask_levels = {"5.00": (D("1.0"), {"5"}), "6.00": (D("1.0"), {"6"})}
+        expected_best_bid_levels = {"1.00": (D("1.0"), {"1", "2"})}
+        expected_ask_ids = {"5": ("5.00", D("1.0")), "6": ("6.00", D("1.0"))}
+        expected_bid_ids = {"1": ("1.00", D("0.5")), "2": ("1.00", D("0.5"))}
+        expected_worst_ask_price = D("6.00")
+        expected_worst_bid_price = D("1.00")
+
+        self._assert_order_book_values(target, expected_best_ask_levels, expected_best_bid_levels, expected_ask_ids,
+                                       expected_bid_ids, expected_worst_ask_price, expected_worst_bid_price)
+        self.assertEqual(42, target.sequence)
+
+    ####################
+    # Batch Unit Tests #
+    ####################
+
+    def test_apply_batch_matches_handle_event(self):
+        events = [{"type": "received", "order_id": "1", "size": "1.0", "price": "1.00", "side": "sell"},
+                  {"type": "open", "order_id": "1", "remaining_size": "1.0", "price": "1.00", "side": "sell"},
+                  {"type": "open", "order_id": "2", "remaining_size": "2.0", "price": "2.00", "side": "sell"},
+                  {"type": "open", "order_id": "3", "remaining_size": "3.0", "price": "3.00", "side": "buy"},
+                  {"type": "activate", "order_id": "4"},
+                  {"type": "match", "maker_order_id": "2", "size": "0.5", "price": "2.00", "side": "sell"},
+                  {"type": "done", "order_id": "3", "remaining_size": "0", "price": "3.00", "side": "buy"},
+                  {"order_id": "5"}]
+        expected = ob.OrderBook(max_levels=5)
+        for event in events:
+            expected.handle_event(event)
+
+        target = ob.OrderBook(max_levels=5)
+        applied_count = target.apply_batch(iter(events))
+
+        expected_best_ask_levels = {"1.00": (D("1.0"), {"1"}), "2.00": (D("1.5"), {"2"})}
+        expected_ask_ids = {"1": ("1.00", D("1.0")), "2": ("2.00", D("1.5"))}
+
+        self._assert_order_book_values(target, expected_best_ask_levels, {}, expected_ask_ids, {},
+                                       expected.worst_ask_price, expected.worst_bid_price)
+        self.assertEqual(5, applied_count)
+
+    ######################
+    # Version Unit Tests #
+    ######################
+
+    def test_version_only_changes_with_book(self):
+        target = ob.OrderBook(max_levels=1)
+        target.handle_event({"type": "open", "order_id": "1", "remaining_size": "1.0", "price": "1.00", "side": "sell"})
+        version = target.version
+
+        # No-ops -> untracked orders, levels worse than a full book's worst, ignored event types
+
+        target.handle_event({"type": "open", "order_id": "2", "remaining_size": "1.0", "price": "2.00", "side": "sell"})
+        target.handle_event({"type": "done", "order_id": "3", "remaining_size": "0", "price": "3.00", "side": "sell"})
+        target.handle_event({"type": "match", "maker_order_id": "3", "size": "1.0", "price": "3.00", "side": "sell"})
+        target.handle_event({"type": "received", "order_id": "4", "size": "1.0", "price": "1.00", "side": "sell"})
+
+        self.assertEqual(version, target.version)
+
+        # Changes -> join, partial fill, done
+
+        target.handle_event({"type": "open", "order_id": "5", "remaining_size": "1.0", "price": "1.00", "side": "sell"})
+        self.assertEqual(version + 1, target.version)
+        target.handle_event({"type": "match", "maker_order_id": "5", "size": "0.5", "price": "1.00", "side": "sell"})
+        self.assertEqual(version + 2, target.version)
+        target.handle_event({"type": "done", "order_id": "5", "remaining_size": "0", "price": "1.00", "side": "sell"})
+        self.assertEqual(version + 3, target.version)
+
+    #############################
+    # Microstructure Unit Tests #
+    #############################
+
+    def test_microstructure(self):
+        target = ob.OrderBook(max_levels=5, imbalance_depth=2)
+        self.assertEqual(None, target.get_microstructure()["mid"])
+
+        target.handle_event({"type": "open", "order_id": "1", "remaining_size": "1.0", "price": "101.00", "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "2", "remaining_size": "2.0", "price": "102.00", "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "3", "remaining_size": "5.0", "price": "103.00", "side": "sell"})
+        target.handle_event({"type": "open", "order_id": "4", "remaining_size": "1.5", "price": "99.00", "side": "buy"})
+        target.handle_event({"type": "match", "maker_order_id": "1", "size": "0.5", "price": "101.00", "side": "sell"})
+        # Maker not in the book, still a trade
+        target.handle_event({"type": "match", "maker_order_id": "9", "size": "1.5", "price": "105.00", "side": "sell"})
+        actual = target.get_microstructure()
+
+        self.assertEqual(D("100.00"), actual["mid"])
+        self.assertEqual(D("2.00"), actual["spread"])
+        self.assertEqual(D("100.5"), actual["microprice"])  # (101 x 1.5 + 99 x 0.5) / 2.0
+        self.assertEqual(D("2.5"), actual["ask_depth"])  # Best 2 ask levels only
+        self.assertEqual(D("1.5"), actual["bid_depth"])
+        self.assertEqual(D("-0.25"), actual["imbalance"])
+        self.assertEqual(D("104.00"), actual["vwap"])  # (101 x 0.5 + 105 x 1.5) / 2.0
+        self.assertEqual(D("2.0"), actual["traded_volume"])
+        self.assertEqual(2, actual["trade_count"])
+
+        # Best ask leaves -> the third level is pulled into the imbalance depth
+        target.handle_event({"type": "done", "order_id": "1", "remaining_size": "0", "price": "101.00", "side": "sell"})
+        self.assertEqual(D("7.0"), target.get_microstructure()["ask_depth"])
+
+    def test_inside_quantities_follow_random_events(self):
+        # Running sums against the levels summed from scratch, in every book mode, after every event
+        for kwargs in ({"max_levels": 4}, {"max_levels": 3, "imbalance_depth": 5}, {"full_depth": True},
+                       {"max_levels": 8, "tick_size": "0.01", "lot_size": "0.01"}):
+            target = ob.OrderBook(**kwargs)
+            rng = random.Random(7)
+            resting = {}  # {Order Id : [ Side , Price , Size in hundredths ]}
+            for i in range(3000):
+                choice = rng.random()
+                if (choice < 0.5) or (not resting):
+                    side = rng.choice(["buy", "sell"])
+                    price = rng.randint(9900, 10000) if side == "buy" else rng.randint(10001, 10100)
+                    resting[str(i)] = [side, price, rng.randint(1, 300)]
+                    target.handle_event({"type": "open", "order_id": str(i), "side": side,
+                                         "price": "{:.2f}".format(price / 100),
+                                         "remaining_size": "{:.2f}".format(resting[str(i)][2] / 100)})
+                elif choice < 0.8:
+                    order_id = rng.choice(sorted(resting))
+                    target.handle_event({"type": "done", "order_id": order_id, "side": resting.pop(order_id)[0]})
+                else:
+                    order_id = rng.choice(sorted(resting))
+                    (side, price, size) = resting[order_id]
+                    fill = min(size, rng.randint(1, 100))
+                    target.handle_event({"type": "match", "maker_order_id": order_id, "side": side,
+                                         "price": "{:.2f}".format(price / 100), "size": "{:.2f}".format(fill / 100)})
+                    resting[order_id][2] -= fill
+                    if resting[order_id][2] == 0:
+                        del resting[order_id]
+
+                depth = target.imbalance_depth
+                self.assertEqual(sum(size for (_, size) in target.get_inside_ask_levels(depth)),
+                                 target.ask_inside_quantity)
+                self.assertEqual(sum(size for (_, size) in target.get_inside_bid_levels(depth)),
+                                 target.bid_inside_quantity)
+
+    def test_inside_quantities_after_levels_replaced(self):
+        target = ob.OrderBook(max_levels=5, imbalance_depth=2)
+        target.best_ask_levels = self._levels({"5.00": (D("5.0"), {"5"}), "6.00": (D("6.0"), {"6"}),
+                                               "7.00": (D("7.0"), {"7"})})
+        target.ask_ids = {"5": ob.Order("5.00", D("5.0")), "6": ob.Order("6.00", D("6.0")),
+                          "7": ob.Order("7.00", D("7.0"))}
+
+        self.assertEqual(D("11.0"), target.ask_inside_quantity)
+        target.handle_event({"type": "done", "order_id": "5", "remaining_size": "0", "price": "5.00", "side": "sell"})
+        self.assertEqual(D("13.0"), target.ask_inside_quantity)
+
     ###################
     # Done Unit Tests #
     ###################
 
     def test_done_order_exists_in_book_and_not_only_order_in_level(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {"10.00": (D("10.00"), {"5", "6"})}
-        target.best_bid_levels = {"1.00": (D("2.01"), {"1", "3"}), "2.00": (D("1.0"), {"2", "4"})}
-        target.ask_ids = {"5": ("10.00", D("3.5")), "6": ("10.00", D("6.5"))}
-        target.bid_ids = {"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5")), "3": ("1.00", D("1.005")), "4": ("2.00", D("0.5"))}
+        target.best_ask_levels = self._levels({"10.00": (D("10.00"), {"5", "6"})})
+        target.best_bid_levels = self._levels({"1.00": (D("2.01"), {"1", "3"}), "2.00": (D("1.0"), {"2", "4"})})
+        target.ask_ids = self._orders({"5": ("10.00", D("3.5")), "6": ("10.00", D("6.5"))})
+        target.bid_ids = self._orders({"1": ("1.00", D("1.005")), "2": ("2.00", D("0.5")), "3": ("1.00", D("1.005")), "4": ("2.00", D("0.5"))})
         target.worst_ask_price = D("10.00")
         target.worst_bid_price = D("1.00")
 
@@ -254,10 +493,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_done_order_exists_in_book_and_only_order_in_level(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {"10.00": (D("3.5"), {"5"})}
-        target.best_bid_levels = {"1.00": (D("2.01"), {"1", "3"}), "2.00": (D("0.5"), {"4"})}
-        target.ask_ids = {"5": ("10.00", D("3.5"))}
-        target.bid_ids = {"1": ("1.00", D("1.005")), "3": ("1.00", D("1.005")), "4": ("2.00", D("0.5"))}
+        target.best_ask_levels = self._levels({"10.00": (D("3.5"), {"5"})})
+        target.best_bid_levels = self._levels({"1.00": (D("2.01"), {"1", "3"}), "2.00": (D("0.5"), {"4"})})
+        target.ask_ids = self._orders({"5": ("10.00", D("3.5"))})
+        target.bid_ids = self._orders({"1": ("1.00", D("1.005")), "3": ("1.00", D("1.005")), "4": ("2.00", D("0.5"))})
         target.worst_ask_price = D("10.00")
         target.worst_bid_price = D("1.00")
 
@@ -293,10 +532,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_done_order_exists_in_book_and_only_order_in_level_updates_worst_price(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {"5.00": (D("1.0"), {"5"}), "6.00": (D("1.0"), {"6"})}
-        target.best_bid_levels = {"1.00": (D("1.0"), {"1"}), "2.00": (D("1.0"), {"2"})}
-        target.ask_ids = {"5": ("5.00", D("1.0")), "6": ("6.00", D("1.0"))}
-        target.bid_ids = {"1": ("1.00", D("1.0")), "2": ("2.00", D("1.0"))}
+        target.best_ask_levels = self._levels({"5.00": (D("1.0"), {"5"}), "6.00": (D("1.0"), {"6"})})
+        target.best_bid_levels = self._levels({"1.00": (D("1.0"), {"1"}), "2.00": (D("1.0"), {"2"})})
+        target.ask_ids = self._orders({"5": ("5.00", D("1.0")), "6": ("6.00", D("1.0"))})
+        target.bid_ids = self._orders({"1": ("1.00", D("1.0")), "2": ("2.00", D("1.0"))})
         target.worst_ask_price = D("6.00")
         target.worst_bid_price = D("1.00")
 
@@ -332,10 +571,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_done_empty_book(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {}
-        target.best_bid_levels = {}
-        target.ask_ids = {}
-        target.bid_ids = {}
+        target.best_ask_levels = self._levels({})
+        target.best_bid_levels = self._levels({})
+        target.ask_ids = self._orders({})
+        target.bid_ids = self._orders({})
         target.worst_ask_price = D("-1.0")
         target.worst_bid_price = D("-1.0")
 
@@ -358,10 +597,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_done_order_does_not_exist_in_book(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {"5.00": (D("1.0"), {"5"}), "6.00": (D("1.0"), {"6"})}
-        target.best_bid_levels = {"1.00": (D("1.0"), {"1"}), "2.00": (D("1.0"), {"2"})}
-        target.ask_ids = {"5": ("5.00", D("1.0")), "6": ("6.00", D("1.0"))}
-        target.bid_ids = {"1": ("1.00", D("1.0")), "2": ("2.00", D("1.0"))}
+        target.best_ask_levels = self._levels({"5.00": (D("1.0"), {"5"}), "6.00": (D("1.0"), {"6"})})
+        target.best_bid_levels = self._levels({"1.00": (D("1.0"), {"1"}), "2.00": (D("1.0"), {"2"})})
+        target.ask_ids = self._orders({"5": ("5.00", D("1.0")), "6": ("6.00", D("1.0"))})
+        target.bid_ids = self._orders({"1": ("1.00", D("1.0")), "2": ("2.00", D("1.0"))})
         target.worst_ask_price = D("6.00")
         target.worst_bid_price = D("1.00")
 
@@ -386,10 +625,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_match_empty_book(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {}
-        target.best_bid_levels = {}
-        target.ask_ids = {}
-        target.bid_ids = {}
+        target.best_ask_levels = self._levels({})
+        target.best_bid_levels = self._levels({})
+        target.ask_ids = self._orders({})
+        target.bid_ids = self._orders({})
         target.worst_ask_price = D("-1.0")
         target.worst_bid_price = D("-1.0")
 
@@ -412,10 +651,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_match_complete_fill(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {"5.00": (D("1.0"), {"5"}), "6.00": (D("1.0"), {"6"})}
-        target.best_bid_levels = {"1.00": (D("1.0"), {"1"}), "2.00": (D("1.0"), {"2"})}
-        target.ask_ids = {"5": ("5.00", D("1.0")), "6": ("6.00", D("1.0"))}
-        target.bid_ids = {"1": ("1.00", D("1.0")), "2": ("2.00", D("1.0"))}
+        target.best_ask_levels = self._levels({"5.00": (D("1.0"), {"5"}), "6.00": (D("1.0"), {"6"})})
+        target.best_bid_levels = self._levels({"1.00": (D("1.0"), {"1"}), "2.00": (D("1.0"), {"2"})})
+        target.ask_ids = self._orders({"5": ("5.00", D("1.0")), "6": ("6.00", D("1.0"))})
+        target.bid_ids = self._orders({"1": ("1.00", D("1.0")), "2": ("2.00", D("1.0"))})
         target.worst_ask_price = D("6.00")
         target.worst_bid_price = D("1.00")
 
@@ -451,10 +690,10 @@ class TestOrderBook(unittest.TestCase):
 
     def test_match_partial_fill(self):
         target = ob.OrderBook(max_levels=2)
-        target.best_ask_levels = {"5.00": (D("1.0"), {"5"}), "6.00": (D("1.0"), {"6"})}
-        target.best_bid_levels = {"1.00": (D("1.0"), {"1"}), "2.00": (D("1.0"), {"2"})}
-        target.ask_ids = {"5": ("5.00", D("1.0")), "6": ("6.00", D("1.0"))}
-        target.bid_ids = {"1": ("1.00", D("1.0")), "2": ("2.00", D("1.0"))}
+        target.best_ask_levels = self._levels({"5.00": (D("1.0"), {"5"}), "6.00": (D("1.0"), {"6"})})
+        target.best_bid_levels = self._levels({"1.00": (D("1.0"), {"1"}), "2.00": (D("1.0"), {"2"})})
+        target.ask_ids = self._orders({"5": ("5.00", D("1.0")), "6": ("6.00", D("1.0"))})
+        target.bid_ids = self._orders({"1": ("1.00", D("1.0")), "2": ("2.00", D("1.0"))})
         target.worst_ask_price = D("6.00")
         target.worst_bid_price = D("1.00")
 
@@ -492,6 +731,17 @@ class TestOrderBook(unittest.TestCase):
     # Unit Tests Helpers #
     ######################
 
+    @staticmethod
+    def _levels(level_tuples):
+        # {Level Price : ( Level Quantity , { Order Ids } ) } -> {Level Price : PriceLevel}
+        return {price: ob.PriceLevel(quantity, set(order_ids))
+                for (price, (quantity, order_ids)) in level_tuples.items()}
+
+    @staticmethod
+    def _orders(order_tuples):
+        # {Order Id : ( Order Price , Order Quantity ) } -> {Order Id : Order}
+        return {order_id: ob.Order(price, size) for (order_id, (price, size)) in order_tuples.items()}
+
     def _assert_order_book_values(self,
                                   order_book,
                                   expected_best_ask_levels,
@@ -513,7 +763,8 @@ class TestOrderBook(unittest.TestCase):
             self.assertTrue(expected_ask_price in actual_best_ask_levels)
 
             (expected_quantity, expected_ask_order_ids) = expected_best_ask_levels[expected_ask_price]
-            (actual_quantity, actual_ask_order_ids) = actual_best_ask_levels[expected_ask_price]
+            actual_quantity = actual_best_ask_levels[expected_ask_price].quantity
+            actual_ask_order_ids = actual_best_ask_levels[expected_ask_price].order_ids
 
             self.assertEqual(expected_quantity, actual_quantity)
             self.assertEqual(len(expected_ask_order_ids), len(actual_ask_order_ids))
@@ -525,7 +776,8 @@ class TestOrderBook(unittest.TestCase):
             self.assertTrue(expected_bid_price in actual_best_bid_levels)
 
             (expected_quantity, expected_bid_order_ids) = expected_best_bid_levels[expected_bid_price]
-            (actual_quantity, actual_bid_order_ids) = actual_best_bid_levels[expected_bid_price]
+            actual_quantity = actual_best_bid_levels[expected_bid_price].quantity
+            actual_bid_order_ids = actual_best_bid_levels[expected_bid_price].order_ids
 
             self.assertEqual(expected_quantity, actual_quantity)
             self.assertEqual(len(expected_bid_order_ids), len(actual_bid_order_ids))
@@ -538,8 +790,8 @@ class TestOrderBook(unittest.TestCase):
 
             expected_price = expected_ask_ids[expected_ask_id][0]
             expected_quantity = expected_ask_ids[expected_ask_id][1]
-            actual_price = actual_ask_ids[expected_ask_id][0]
-            actual_quantity = actual_ask_ids[expected_ask_id][1]
+            actual_price = actual_ask_ids[expected_ask_id].price
+            actual_quantity = actual_ask_ids[expected_ask_id].size
 
             self.assertEqual(expected_price, actual_price)
             self.assertEqual(expected_quantity, actual_quantity)
@@ -550,8 +802,8 @@ class TestOrderBook(unittest.TestCase):
 
             expected_price = expected_bid_ids[expected_bid_id][0]
             expected_quantity = expected_bid_ids[expected_bid_id][1]
-            actual_price = actual_bid_ids[expected_bid_id][0]
-            actual_quantity = actual_bid_ids[expected_bid_id][1]
+            actual_price = actual_bid_ids[expected_bid_id].price
+            actual_quantity = actual_bid_ids[expected_bid_id].size
 
             self.assertEqual(expected_price, actual_price)
             self.assertEqual(expected_quantity, actual_quantity)
@@ -0,0 +1,258 @@
+import sys
+import time
+import unittest
+from threading import Thread
+from market_data_feed import order_book_manager as obm, market_data_feed_client as mdf
+from decimal import Decimal as D
+
+
+def _open(product_id, order_id, side, price, size):
+    return {"type": "open", "product_id": product_id, "order_id": order_id, "side": side, "price": price,
+            "remaining_size": size}
+
+
+def _match(product_id, maker_order_id, side, price, size, time_text):
+    return {"type": "match", "product_id": product_id, "maker_order_id": maker_order_id, "taker_order_id": "t",
+            "side": side, "price": price, "size": size, "time": time_text}
+
+
+class TestOrderBookManager(unittest.TestCase):
+
+    def test_routes_messages_by_product(self):
+        target = obm.OrderBookManager(["BTC-USD", "ETH-USD"], {"max_levels": 5})
+
+        target.handle_event(_open("BTC-USD", "1", "sell", "100.00", "1.0"))
+        target.handle_event(_open("ETH-USD", "2", "buy", "10.00", "2.0"))
+        target.handle_event(_open("LTC-USD", "3", "buy", "1.00", "3.0"))  # Not subscribed -> ignored
+        target.handle_event({"type": "subscriptions"})
+
+        self.assertEqual([("100.00", D("1.0"))], target.get_order_book("BTC-USD").get_inside_ask_levels(5))
+        self.assertEqual([], target.get_order_book("BTC-USD").get_inside_bid_levels(5))
+        self.assertEqual([("10.00", D("2.0"))], target.get_order_book("ETH-USD").get_inside_bid_levels(5))
+
+        stats = target.get_stats("ETH-USD")
+        self.assertEqual(1, stats["total_message_count"])
+        self.assertEqual({"open": 1}, stats["message_type_count"])
+        self.assertEqual(1, stats["bid_order_count"])
+
+    def test_get_inside_levels_skips_unchanged_book(self):
+        target = obm.OrderBookManager(["BTC-USD"], {"tick_size": "0.01", "lot_size": "0.00000001"})
+        target.handle_event(_open("BTC-USD", "1", "sell", "100.00", "1.5"))
+
+        (version, asks, bids) = target.get_inside_levels("BTC-USD", 5)
+
+        self.assertEqual([(D("100.00"), D("1.50000000"))], asks)
+        self.assertEqual([], bids)
+        self.assertEqual((version, None, None), target.get_inside_levels("BTC-USD", 5, version))
+
+    def test_sharded_books_answer_queries(self):
+        target = obm.ShardedOrderBookManager(["BTC-USD", "ETH-USD", "LTC-USD"], 2, {"max_levels": 5})
+        target.start()
+        try:
+            target.handle_event(_open("BTC-USD", "1", "sell", "100.00", "1.0"))
+            target.handle_event(_open("LTC-USD", "2", "buy", "1.00", "3.0"))
+            target.handle_event(_open("ETH-USD", "3", "buy", "10.00", "2.0"))
+
+            (_, asks, bids) = target.get_inside_levels("BTC-USD", 5)
+            self.assertEqual([(D("100.00"), D("1.0"))], asks)
+            self.assertEqual([], bids)
+
+            (_, asks, bids) = target.get_inside_levels("LTC-USD", 5)
+            self.assertEqual([], asks)
+            self.assertEqual([(D("1.00"), D("3.0"))], bids)
+
+            stats = target.get_stats("ETH-USD")
+            self.assertEqual(1, stats["shard"])
+            self.assertEqual(1, stats["total_message_count"])
+
+            microstructure = target.get_microstructure("ETH-USD")
+            self.assertEqual("ETH-USD", microstructure["product_id"])
+            self.assertEqual(D("2.0"), microstructure["bid_depth"])
+            self.assertEqual(D("1"), microstructure["imbalance"])
+        finally:
+            target.close()
+
+    def test_sharded_query_sees_every_sent_batch(self):
+        target = obm.ShardedOrderBookManager(["BTC-USD"], 1, {"max_levels": 5}, batch_size=1)
+        target.start()
+        try:
+            for i in range(500):
+                target.handle_event(_open("BTC-USD", str(i), "buy", "{}.00".format(i % 50 + 1), "1.0"))
+            actual = target.get_stats("BTC-USD")
+        finally:
+            target.close()
+
+        self.assertEqual(500, actual["total_message_count"])
+
+    def test_sharded_partial_batch_sent_once_idle(self):
+        target = obm.ShardedOrderBookManager(["BTC-USD"], 1, {"max_levels": 5}, batch_size=1000, max_batch_delay=0.01)
+        target.start()
+        try:
+            shard = target._shards[0]
+            for i in range(3):
+                target.handle_event(_open("BTC-USD", str(i), "buy", "99.00", "1.0"))
+            deadline = time.monotonic() + 5
+            while shard.pending and (time.monotonic() < deadline):
+                time.sleep(0.005)
+
+            self.assertEqual([], shard.pending)
+        finally:
+            target.close()
+
+    def test_microstructure_per_product(self):
+        target = obm.OrderBookManager(["BTC-USD", "ETH-USD"], {"tick_size": "0.01", "lot_size": "0.00000001"})
+        target.handle_event(_open("BTC-USD", "1", "sell", "100.00", "1.0"))
+        target.handle_event(_open("BTC-USD", "2", "buy", "99.00", "3.0"))
+        target.handle_event({"type": "match", "product_id": "ETH-USD", "maker_order_id": "3", "side": "sell",
+                             "price": "10.50", "size": "2.0"})
+
+        actual = target.get_microstructure("BTC-USD")
+        self.assertEqual(D("99.50"), actual["mid"])
+        self.assertEqual(D("99.75"), actual["microprice"])
+        self.assertEqual(D("0.5"), actual["imbalance"])
+        self.assertEqual(None, actual["vwap"])
+        self.assertEqual(target.get_order_book("BTC-USD").version, actual["version"])
+
+        actual = target.get_microstructure("ETH-USD")
+        self.assertEqual(None, actual["mid"])
+        self.assertEqual(D("10.50"), actual["vwap"])
+        self.assertEqual(1, actual["trade_count"])
+
+
+class TestBookSnapshot(unittest.TestCase):
+
+    def test_snapshot_shared_until_book_changes(self):
+        target = obm.OrderBookManager(["BTC-USD"], {"max_levels": 5})
+        target.handle_event(_open("BTC-USD", "1", "sell", "100.00", "1.0"))
+        target.handle_event(_open("BTC-USD", "2", "buy", "99.00", "2.0"))
+
+        first = target.get_snapshot("BTC-USD", 3)
+        self.assertEqual(((D("100.00"), D("1.0")),), first.asks)
+        self.assertEqual(((D("99.00"), D("2.0")),), first.bids)
+        self.assertIs(first, target.get_snapshot("BTC-USD", 2))
+
+        target.handle_event(_open("BTC-USD", "3", "buy", "99.50", "0.5"))
+        second = target.get_snapshot("BTC-USD", 2)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(((D("99.50"), D("0.5")), (D("99.00"), D("2.0"))), second.bids)
+        self.assertEqual(3, second.level_count)  # Kept at the deepest depth asked for
+        self.assertEqual(((D("100.00"), D("1.0")),), first.asks)  # Published snapshots never change
+
+    def test_reader_waits_out_update_in_progress(self):
+        target = obm.OrderBookManager(["BTC-USD"], {"max_levels": 5})
+        product_book = target.product_books["BTC-USD"]
+        product_book.write_sequence += 1  # As if the feed thread were part way through an update
+        product_book.order_book.open_order("1", "sell", "100.00", D("1.0"))
+        snapshots = []
+        reader = Thread(target=lambda: snapshots.append(target.get_snapshot("BTC-USD", 5)))
+        reader.start()
+        time.sleep(0.05)
+        self.assertEqual([], snapshots)
+
+        product_book.write_sequence += 1
+        reader.join(5)
+
+        self.assertEqual(((D("100.00"), D("1.0")),), snapshots[0].asks)
+
+    def test_concurrent_reads_are_consistent(self):
+        # Every snapshot read while the feed thread applies events matches the book as it was at that version
+        target = obm.OrderBookManager(["BTC-USD"], {"max_levels": 5})
+        order_book = target.get_order_book("BTC-USD")
+        expected = {}  # Dict<Int, Pair<Tuple, Tuple>> -> {Version : ( Asks , Bids )}
+        snapshots = []
+        done = []
+
+        def write():
+            for i in range(2000):
+                side = "sell" if i % 2 else "buy"
+                price = "{}.00".format(100 + i % 7 if side == "sell" else 99 - i % 7)
+                target.handle_event(_open("BTC-USD", str(i), side, price, "1.0"))
+                if i >= 10:
+                    target.handle_event({"type": "done", "product_id": "BTC-USD", "order_id": str(i - 10),
+                                         "side": "sell" if (i - 10) % 2 else "buy"})
+                expected[order_book.version] = (tuple(order_book.get_inside_ask_levels(5)),
+                                                tuple(order_book.get_inside_bid_levels(5)))
+            done.append(True)
+
+        def read():
+            while not done:
+                snapshots.append(target.get_snapshot("BTC-USD", 5))
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # Switch threads as often as possible, so reads overlap updates
+        try:
+            reader = Thread(target=read)
+            reader.start()
+            write()
+            reader.join(5)
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        self.assertGreater(len(snapshots), 0)
+        for snapshot in snapshots:
+            if snapshot.version not in expected:
+                continue  # Read before the writer recorded its first version
+            (asks, bids) = expected[snapshot.version]
+            self.assertEqual(tuple((D(price), quantity) for (price, quantity) in asks), snapshot.asks)
+            self.assertEqual(tuple((D(price), quantity) for (price, quantity) in bids), snapshot.bids)
+
+    def test_sharded_snapshot(self):
+        target = obm.ShardedOrderBookManager(["BTC-USD"], 1, {"max_levels": 5})
+        target.start()
+        try:
+            target.handle_event(_open("BTC-USD", "1", "sell", "100.00", "1.0"))
+            actual = target.get_snapshot("BTC-USD", 5)
+        finally:
+            target.close()
+
+        self.assertEqual(((D("100.00"), D("1.0")),), actual.asks)
+
+    def test_trades_and_bars(self):
+        target = obm.OrderBookManager(["BTC-USD", "ETH-USD"], {"max_levels": 5}, tape_kwargs={"capacity": 2})
+        target.handle_event(_open("BTC-USD", "1", "sell", "100.00", "3.0"))
+        for (size, time_text) in [("1.0", "2021-06-01T12:00:00.100000Z"), ("0.5", "2021-06-01T12:00:01.100000Z"),
+                                  ("0.25", "2021-06-01T12:00:02.100000Z")]:
+            target.handle_event(_match("BTC-USD", "1", "sell", "100.00", size, time_text))
+        target.reset()  # Trades outlive the book
+
+        self.assertEqual([0.5, 0.25], target.get_trades("BTC-USD")["size"].tolist())
+        self.assertEqual([3, 1.75], [target.get_bars("BTC-USD", "1m")[0][key] for key in ("trade_count", "volume")])
+        self.assertEqual(3, len(target.get_bars("BTC-USD", "1s")))
+        self.assertEqual(0, len(target.get_trades("ETH-USD")))
+        self.assertEqual(3, target.get_stats("BTC-USD")["trade_tape"]["trade_count"])
+        with self.assertRaises(ValueError):
+            target.get_bars("BTC-USD", "1h")
+
+    def test_sharded_trades_and_bars(self):
+        target = obm.ShardedOrderBookManager(["BTC-USD"], 1, {"max_levels": 5}, tape_kwargs={"capacity": 8})
+        target.start()
+        try:
+            target.handle_event(_open("BTC-USD", "1", "sell", "100.00", "1.0"))
+            target.handle_event(_match("BTC-USD", "1", "sell", "100.00", "0.5", "2021-06-01T12:00:00.100000Z"))
+            trades = target.get_trades("BTC-USD", 10)
+            bars = target.get_bars("BTC-USD", "5m")
+            with self.assertRaises(ValueError):
+                target.get_bars("BTC-USD", "1h")
+            stats = target.get_stats("BTC-USD")
+        finally:
+            target.close()
+
+        self.assertEqual([(100.0, 0.5)], trades[["price", "size"]].tolist())
+        self.assertEqual([1], bars["trade_count"].tolist())
+        self.assertEqual(8, stats["trade_tape"]["capacity"])
+
+
+class TestMarketDataFeedClientProducts(unittest.TestCase):
+
+    def test_inside_levels_per_product(self):
+        target = mdf.MarketDataFeedClient(products=["BTC-USD", "ETH-USD"])
+        target.on_message(_open("BTC-USD", "1", "sell", "100.00", "1.0"))
+        target.on_message(_open("ETH-USD", "2", "sell", "10.00", "2.0"))
+
+        self.assertEqual(([(D("1.00000"), D("100.00"))], []), target.get_inside_levels(2))
+        self.assertEqual(([(D("2.00000"), D("10.00"))], []), target.get_inside_levels(2, "ETH-USD"))
+        with self.assertRaises(KeyError):
+            target.get_inside_levels_printout(2, "LTC-USD")  # Never the default product's book under another name
+        self.assertEqual(1, target.get_product_stats("ETH-USD")["total_message_count"])
+        self.assertEqual(["BTC-USD", "ETH-USD"], list(target.get_all_product_stats()))
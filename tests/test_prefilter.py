@@ -0,0 +1,87 @@
+import json
+import unittest
+from decimal import Decimal as D
+from market_data_feed import prefilter as pf, market_data_feed_client as mdf
+from market_data_feed.snapshot_loader import FileSnapshotLoader
+
+
+def frame(**fields):
+    return json.dumps(fields, separators=(',', ':'))
+
+
+class TestFramePrefilter(unittest.TestCase):
+
+    def test_drops_ignored_types(self):
+        target = pf.FramePrefilter()
+
+        self.assertFalse(target.accept(frame(type="received", order_id="a1", product_id="BTC-USD", sequence=1)))
+        self.assertFalse(target.accept(frame(type="activate", order_id="a2", product_id="BTC-USD", sequence=2)))
+        self.assertTrue(target.accept(frame(type="open", order_id="a1", price="100.01", product_id="BTC-USD")))
+        self.assertTrue(target.accept(frame(type="subscriptions", channels=[])))
+        self.assertTrue(target.accept(frame(type="receivedX")))
+
+        expected = {'dropped_type_count': {'received': 1, 'activate': 1}, 'band_dropped_count': 0, 'dropped_count': 2}
+
+        self.assertEqual(expected, target.get_stats())
+
+    def test_unrecognized_frames_pass(self):
+        target = pf.FramePrefilter()
+
+        self.assertTrue(target.accept('{"type": "received", "order_id": "a1"}'))
+        self.assertTrue(target.accept('{"order_id":"a1","type":"received"}'))
+        self.assertTrue(target.accept(b'{"type":"received","order_id":"a1"}'))
+        self.assertEqual(0, target.get_stats()['dropped_count'])
+
+    def test_price_band(self):
+        mids = {"BTC-USD": D("100.00"), "ETH-USD": None}
+        target = pf.FramePrefilter(price_band=0.01, mid_source=mids.get)
+
+        self.assertTrue(target.accept(frame(type="open", price="100.99", product_id="BTC-USD")))
+        self.assertTrue(target.accept(frame(type="open", price="99.01", product_id="BTC-USD")))
+        self.assertFalse(target.accept(frame(type="open", price="101.50", product_id="BTC-USD")))
+        self.assertFalse(target.accept(frame(type="open", price="98.00", product_id="BTC-USD")))
+        self.assertTrue(target.accept(frame(type="open", price="1.00", product_id="ETH-USD")))  # Mid unknown
+        self.assertTrue(target.accept(frame(type="done", price="150.00", product_id="BTC-USD")))  # Only opens
+
+        self.assertEqual(2, target.band_dropped_count)
+
+    def test_malformed_price_passes(self):
+        target = pf.FramePrefilter(price_band=0.01, mid_source={"BTC-USD": D("100.00")}.get)
+
+        self.assertTrue(target.accept(frame(type="open", price="1x0", product_id="BTC-USD")))
+        self.assertEqual(0, target.band_dropped_count)
+
+    def test_price_band_refresh(self):
+        mids = {"BTC-USD": D("100.00")}
+        target = pf.FramePrefilter(price_band=0.01, mid_source=mids.get, band_refresh_interval=2)
+        far_open = frame(type="open", price="110.00", product_id="BTC-USD")
+
+        self.assertFalse(target.accept(far_open))
+        mids["BTC-USD"] = D("110.00")
+        self.assertFalse(target.accept(far_open))  # Band not refreshed yet
+        self.assertTrue(target.accept(far_open))
+
+
+class TestClientPrefilter(unittest.TestCase):
+
+    def test_client_sets_mid_source(self):
+        prefilter = pf.FramePrefilter(price_band=0.01)
+        target = mdf.MarketDataFeedClient(prefilter=prefilter)
+        target.book_manager.reset()
+        target.on_message({"type": "open", "side": "sell", "price": "100.02", "order_id": "a1",
+                           "remaining_size": "1.0", "product_id": "BTC-USD"})
+        target.on_message({"type": "open", "side": "buy", "price": "99.98", "order_id": "b1",
+                           "remaining_size": "1.0", "product_id": "BTC-USD"})
+
+        self.assertEqual(target.get_mid_price, prefilter.mid_source)
+        self.assertEqual(D("100.00"), target.get_mid_price())
+        self.assertFalse(prefilter.accept(frame(type="open", price="120.00", product_id="BTC-USD")))
+        self.assertEqual(prefilter.get_stats(), target.get_prefilter_stats())
+
+    def test_rejected_with_snapshot_loader(self):
+        with self.assertRaises(ValueError):
+            mdf.MarketDataFeedClient(prefilter=pf.FramePrefilter(), snapshot_loader=FileSnapshotLoader("{}.json"))
+
+
+if __name__ == '__main__':
+    unittest.main()
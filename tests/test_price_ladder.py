@@ -0,0 +1,74 @@
+import unittest
+from market_data_feed import price_ladder as pl
+from decimal import Decimal as D
+
+
+class TestPriceLadder(unittest.TestCase):
+
+    def test_ascending_ladder_orders_best_first(self):
+        target = pl.PriceLadder()
+
+        target.add(D("2.00"), "2.00")
+        target.add(D("1.00"), "1.00")
+        target.add(D("3.00"), "3.00")
+
+        self.assertEqual(["1.00", "2.00", "3.00"], target.top(5))
+        self.assertEqual("1.00", target.best())
+        self.assertEqual("3.00", target.worst())
+        self.assertEqual(D("1.00"), target.best_price())
+        self.assertEqual(D("3.00"), target.worst_price())
+
+    def test_descending_ladder_orders_best_first(self):
+        target = pl.PriceLadder(descending=True)
+
+        target.add(D("2.00"), "2.00")
+        target.add(D("1.00"), "1.00")
+        target.add(D("3.00"), "3.00")
+
+        self.assertEqual(["3.00", "2.00"], target.top(2))
+        self.assertEqual("3.00", target.best())
+        self.assertEqual("1.00", target.worst())
+        self.assertEqual(D("3.00"), target.best_price())
+        self.assertEqual(D("1.00"), target.worst_price())
+
+    def test_add_and_remove_return_level_index(self):
+        target = pl.PriceLadder()
+
+        self.assertEqual(0, target.add(D("5.00"), "5.00"))
+        self.assertEqual(1, target.add(D("6.00"), "6.00"))
+        self.assertEqual(0, target.add(D("4.00"), "4.00"))
+
+        self.assertEqual(1, target.remove(D("5.00"), "5.00"))
+        self.assertEqual(["4.00", "6.00"], target.top(5))
+
+    def test_remove_with_equal_numeric_prices(self):
+        target = pl.PriceLadder()
+        target.add(D("100.0"), "100.0")
+        target.add(D("100.00"), "100.00")
+
+        target.remove(D("100.00"), "100.00")
+
+        self.assertEqual(["100.0"], target.top(5))
+
+    def test_pop_worst_and_empty_ladder(self):
+        target = pl.PriceLadder(descending=True)
+        target.add(D("1.00"), "1.00")
+        target.add(D("2.00"), "2.00")
+
+        self.assertEqual("1.00", target.pop_worst())
+        self.assertEqual("2.00", target.pop_worst())
+        self.assertEqual(0, len(target))
+        self.assertIsNone(target.best())
+        self.assertIsNone(target.worst_price())
+
+    def test_rebuild(self):
+        target = pl.PriceLadder()
+        target.add(D("9.00"), "9.00")
+
+        target.rebuild([(D("2.00"), "2.00"), (D("1.00"), "1.00")])
+
+        self.assertEqual(["1.00", "2.00"], target.top(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import json
+import time
+import unittest
+from market_data_feed import websocket_client as wc, market_data_feed_client as mdf, prefilter as pf
+from tests.feed_server import FeedServer
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting")
+        time.sleep(0.005)
+
+
+class RecordingClient(wc.WebSocketClient):
+
+    def on_open(self):
+        self.messages = []
+        self.reconnect_events = 0
+
+    def on_message(self, msg):
+        self.messages.append(msg)
+
+    def on_reconnect(self):
+        super().on_reconnect()
+        self.reconnect_events += 1
+
+
+class TestReconnect(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FeedServer()
+
+    def tearDown(self):
+        self.server.close()
+
+    def _client(self, **kwargs):
+        kwargs.setdefault('reconnect_delay', 0.01)
+        kwargs.setdefault('max_reconnect_delay', 0.05)
+        return RecordingClient(url=self.server.url, channels=["full"], **kwargs)
+
+    def test_decode_error_does_not_stop_feed(self):
+        target = self._client()
+        target.start()
+        self.server.wait_for_subscriptions(1)
+        self.server.send(['{"type":"open","sequence":1}', '{"type":"open",', '{"type":"done","sequence":2}'])
+        wait_until(lambda: len(target.messages) == 2)
+        target.close()
+
+        self.assertEqual([{"type": "open", "sequence": 1}, {"type": "done", "sequence": 2}], target.messages)
+        self.assertEqual(1, target.decode_error_count)
+        self.assertIsNone(target.error)
+        self.assertEqual(0, target.reconnect_count)
+
+    def test_prefilter_error_does_not_stop_pipeline(self):
+        class FailingPrefilter(pf.FramePrefilter):
+            def accept(self, frame):
+                if '"fail"' in frame:
+                    raise ValueError("Unreadable frame")
+                return super().accept(frame)
+
+        target = self._client(pipeline=True, prefilter=FailingPrefilter())
+        target.start()
+        self.server.wait_for_subscriptions(1)
+        self.server.send(['{"type":"open","sequence":1}', '{"type":"fail"}', '{"type":"done","sequence":2}'])
+        wait_until(lambda: len(target.messages) == 2)
+        target.close()
+
+        self.assertEqual(1, target.decode_error_count)
+        self.assertIsNone(target.error)
+
+    def test_reconnects_after_drop(self):
+        for pipeline in (False, True):
+            target = self._client(pipeline=pipeline)
+            target.start()
+            self.server.wait_for_subscriptions(len(self.server.subscriptions) + 1)
+            subscription_count = len(self.server.subscriptions)
+            self.server.send(['{"type":"open","sequence":1}'])
+            wait_until(lambda: len(target.messages) == 1)
+
+            self.server.drop_connections()
+            self.server.wait_for_subscriptions(subscription_count + 1)
+            self.server.send(['{"type":"open","sequence":5}'])
+            wait_until(lambda: len(target.messages) == 2)
+            target.close()
+
+            self.assertEqual(1, target.reconnect_count)
+            self.assertEqual(1, target.reconnect_events)
+            self.assertEqual(2, target.connection_count)
+            self.assertIsNotNone(target.last_disconnect_time_ms)
+            self.assertGreaterEqual(target.last_outage_ms, 0)
+            self.assertIsNone(target.error)
+            self.assertEqual(self.server.subscriptions[0], self.server.subscriptions[-1])
+
+    def test_backs_off_while_refused(self):
+        target = self._client()
+        target.start()
+        self.server.wait_for_subscriptions(1)
+
+        self.server.pause()
+        time.sleep(0.2)  # Several refused attempts
+        self.assertFalse(target.get_connection_stats()['connected'])
+        self.server.resume()
+        self.server.wait_for_subscriptions(2)
+        wait_until(lambda: target.reconnect_count == 1)
+        target.close()
+
+        self.assertEqual(2, target.connection_count)
+        self.assertGreaterEqual(target.last_outage_ms, 200)
+
+    def test_close_while_waiting_to_reconnect(self):
+        target = self._client(reconnect_delay=60, max_reconnect_delay=60)
+        target.start()
+        self.server.wait_for_subscriptions(1)
+        self.server.pause()
+        wait_until(lambda: not target.get_connection_stats()['connected'])
+
+        start = time.monotonic()
+        target.close()
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse(target.thread.is_alive())
+
+    def test_reconnect_disabled(self):
+        target = self._client(reconnect=False)
+        target.start()
+        self.server.wait_for_subscriptions(1)
+        self.server.drop_connections()
+        wait_until(lambda: target.stop)
+        target.thread.join(5)
+
+        self.assertIsNotNone(target.error)
+        self.assertEqual(0, target.reconnect_count)
+        self.assertEqual(1, len(self.server.subscriptions))
+
+
+class TestBookRecovery(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FeedServer()
+        self.sequence = 0
+        self.orders = []  # Every order the "exchange" has opened, delivered or not
+
+    def tearDown(self):
+        self.server.close()
+
+    def _open_frames(self, count):
+        frames = []
+        for _ in range(count):
+            self.sequence += 1
+            order = {"type": "open", "product_id": "BTC-USD", "sequence": self.sequence, "side": "buy",
+                     "order_id": "o{}".format(self.sequence), "price": "{}.00".format(100 + self.sequence),
+                     "remaining_size": "1.0"}
+            self.orders.append(order)
+            frames.append(json.dumps(order, separators=(',', ':')))
+        return frames
+
+    def _snapshot(self, product_id):
+        return {"sequence": self.sequence, "asks": [],
+                "bids": [[order["price"], order["remaining_size"], order["order_id"]] for order in self.orders]}
+
+    def test_book_rebuilt_after_drop(self):
+        target = mdf.MarketDataFeedClient(url=self.server.url, snapshot_loader=self._snapshot, max_levels=50)
+        target.reconnect_delay = 0.01
+        target.start()
+        self.server.wait_for_subscriptions(1)
+        self.server.send(self._open_frames(3))
+        wait_until(lambda: len(target.order_book.bid_ids) == 3)
+
+        self.server.drop_connections()
+        self._open_frames(4)  # Missed while disconnected
+        self.server.wait_for_subscriptions(2)
+        self.server.send(self._open_frames(2))
+        wait_until(lambda: len(target.order_book.bid_ids) == 9)
+        actual = target.get_recovery_stats()
+        target.close()
+
+        self.assertEqual(9, target.order_book.sequence)
+        self.assertEqual(1, actual['reconnect_count'])
+        self.assertGreaterEqual(actual['book_recovery_time_ms']['BTC-USD'], actual['last_outage_ms'])
+        self.assertLess(actual['book_recovery_time_ms']['BTC-USD'], 5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import json
+import time
+import unittest
+import multiprocessing
+from threading import Thread
+from decimal import Decimal as D
+from market_data_feed import shared_book as sb, market_data_feed_client as mdf
+
+
+def open_order(order_id, side, price, size):
+    return {"type": "open", "product_id": "BTC-USD", "order_id": order_id, "side": side, "price": price,
+            "remaining_size": size, "time": "2021-06-01T12:00:00.000001Z"}
+
+
+def read_levels_in_child(name, results):
+    client = mdf.MarketDataFeedClient(shared_book=name)
+    results.put(client.get_inside_levels_json(5)[1])
+    client.book_manager.close()
+
+
+class TestSharedBook(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mdf.MarketDataFeedClient(tick_size="0.01", lot_size="0.00000001")
+        self.client.on_message(open_order("a1", "sell", "101.00", "1.5"))
+        self.client.on_message(open_order("b1", "buy", "99.00", "2.0"))
+        self.client.on_message(open_order("b2", "buy", "98.50", "0.25"))
+        self.publisher = sb.SharedBookPublisher(self.client, level_count=3)
+        self.publisher.publish()
+        self.target = sb.SharedBookManager(self.publisher.name)
+
+    def tearDown(self):
+        self.target.close()
+        self.publisher.close()
+
+    def test_levels_read_back_exactly(self):
+        actual = self.target.get_snapshot("BTC-USD", 3)
+
+        self.assertEqual(["BTC-USD"], self.target.products)
+        self.assertEqual(self.client.get_book_snapshot(3).version, actual.version)
+        self.assertEqual("2021-06-01T12:00:00.000001Z", actual.time)
+        self.assertEqual(((D("101.00"), D("1.50000000")),), actual.asks)
+        self.assertEqual(((D("99.00"), D("2.00000000")), (D("98.50"), D("0.25000000"))), actual.bids)
+        self.assertEqual("101.00", str(actual.asks[0][0]))
+        self.assertEqual((1,), actual.ask_order_counts)
+        self.assertEqual((1, 1), actual.bid_order_counts)
+
+    def test_snapshot_decoded_once_per_publish(self):
+        first = self.target.get_snapshot("BTC-USD", 3)
+        self.assertIs(first, self.target.get_snapshot("BTC-USD", 3))
+        self.publisher.publish()  # Book unchanged, stats not due -> slot left alone
+        self.assertIs(first, self.target.get_snapshot("BTC-USD", 3))
+
+        self.client.on_message({"type": "done", "product_id": "BTC-USD", "order_id": "a1", "side": "sell"})
+        self.publisher.publish()
+        actual = self.target.get_snapshot("BTC-USD", 3)
+
+        self.assertIsNot(first, actual)
+        self.assertEqual((), actual.asks)
+        self.assertEqual(2, len(actual.bids))
+
+    def test_stats(self):
+        actual = self.target.get_stats("BTC-USD")
+
+        self.assertEqual(3, actual["total_message_count"])
+        self.assertEqual(2, actual["bid_order_count"])
+        self.assertEqual(self.publisher.name, actual["shared_book"]["name"])
+
+    def test_microstructure(self):
+        self.client.on_message({"type": "match", "product_id": "BTC-USD", "maker_order_id": "a1", "side": "sell",
+                                "price": "101.00", "size": "0.5"})
+        self.publisher.publish()
+        expected = self.client.get_microstructure()
+
+        actual = self.target.get_microstructure("BTC-USD")
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(D("101.00"), actual["vwap"])
+        self.assertEqual(D("100.00"), actual["mid"])
+
+    def test_levels_and_microstructure_of_one_version(self):
+        get_microstructure = self.client.get_microstructure
+
+        def book_moves_on_first_read(product_id=None):
+            if self.client.get_book_snapshot(3).asks:
+                self.client.on_message({"type": "done", "product_id": "BTC-USD", "order_id": "a1", "side": "sell"})
+            return get_microstructure(product_id)
+
+        self.client.on_message(open_order("b3", "buy", "99.50", "1.0"))
+        self.client.get_microstructure = book_moves_on_first_read
+        self.publisher.publish()
+
+        snapshot = self.target.get_snapshot("BTC-USD", 3)
+        microstructure = self.target.get_microstructure("BTC-USD")
+        self.assertEqual(snapshot.version, microstructure["version"])
+        self.assertEqual((), snapshot.asks)
+        self.assertEqual(None, microstructure["mid"])
+
+    def test_reader_waits_out_write_in_progress(self):
+        offset = self.target._offsets["BTC-USD"]
+        (sequence,) = sb.SEQUENCE.unpack_from(self.publisher.shm.buf, offset)
+        sb.SEQUENCE.pack_into(self.publisher.shm.buf, offset, sequence + 1)
+        snapshots = []
+        reader = Thread(target=lambda: snapshots.append(self.target.get_snapshot("BTC-USD", 3)))
+        reader.start()
+        time.sleep(0.05)
+        self.assertEqual([], snapshots)
+
+        sb.SEQUENCE.pack_into(self.publisher.shm.buf, offset, sequence + 2)
+        reader.join(5)
+
+        self.assertEqual(1, len(snapshots[0].asks))
+
+    def test_reader_client(self):
+        target = mdf.MarketDataFeedClient(shared_book=self.publisher.name)
+        try:
+            self.assertEqual(self.client.get_inside_levels_printout(3), target.get_inside_levels_printout(3))
+            self.assertEqual(json.loads(self.client.get_inside_levels_json(3)[1]),
+                             json.loads(target.get_inside_levels_json(3)[1]))
+            with self.assertRaises(ValueError):
+                target.start()
+            with self.assertRaises(ValueError):
+                target.get_bars()
+        finally:
+            target.book_manager.close()
+
+    def test_reader_process(self):
+        results = multiprocessing.Queue()
+        child = multiprocessing.Process(target=read_levels_in_child, args=(self.publisher.name, results))
+        child.start()
+        actual = json.loads(results.get(timeout=10))
+        child.join(10)
+
+        self.assertEqual([["101.00", "1.50000000"]], actual["asks"])
+        # Segment outlives the reader process
+        sb.SharedBookManager(self.publisher.name).close()
+
+    def test_not_a_shared_book(self):
+        self.publisher.shm.buf[0:4] = b"XXXX"
+        with self.assertRaises(ValueError):
+            sb.SharedBookManager(self.publisher.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
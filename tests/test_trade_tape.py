@@ -0,0 +1,91 @@
+import unittest
+from market_data_feed import trade_tape as tt, time_util
+
+SECOND = 1000000000
+START = time_util.parse_exchange_time("2021-06-01T12:00:00.000000Z")
+
+
+def match(price, size, side, time_text):
+    return {"type": "match", "product_id": "BTC-USD", "maker_order_id": "m", "taker_order_id": "t", "side": side,
+            "price": price, "size": size, "time": time_text}
+
+
+class TestTradeTape(unittest.TestCase):
+
+    def test_record_match(self):
+        target = tt.TradeTape()
+
+        target.record_match(match("100.00", "0.5", "sell", "2021-06-01T12:00:00.250000Z"))
+        target.record_match(match("99.50", "1.5", "buy", "2021-06-01T12:00:01.000001Z"))
+        actual = target.get_trades()
+
+        self.assertEqual(2, len(actual))
+        self.assertEqual([START + SECOND // 4, START + SECOND + 1000], actual["time"].tolist())
+        self.assertEqual([100.0, 99.5], actual["price"].tolist())
+        self.assertEqual([0.5, 1.5], actual["size"].tolist())
+        # Maker sold -> taker bought
+        self.assertEqual([tt.BUY, tt.SELL], actual["side"].tolist())
+
+    def test_ring_keeps_most_recent_trades(self):
+        target = tt.TradeTape(capacity=4)
+        for i in range(10):
+            target.record(START + i, 100.0 + i, 1.0, tt.BUY)
+
+        self.assertEqual([106.0, 107.0, 108.0, 109.0], target.get_trades()["price"].tolist())
+        self.assertEqual([108.0, 109.0], target.get_trades(2)["price"].tolist())
+        self.assertEqual(0, len(target.get_trades(0)))
+        self.assertEqual(10, target.get_stats()["trade_count"])
+
+    def test_bars_roll_over_per_resolution(self):
+        target = tt.TradeTape()
+        target.record(START, 100.0, 1.0, tt.BUY)
+        target.record(START + SECOND // 2, 102.0, 2.0, tt.SELL)
+        target.record(START + SECOND // 2, 99.0, 0.5, tt.BUY)
+        target.record(START + 3 * SECOND, 101.0, 1.0, tt.BUY)  # No trades in the 2nd and 3rd second -> no bars
+        target.record(START + 61 * SECOND, 98.0, 4.0, tt.SELL)
+
+        actual = target.get_bars("1s")
+        self.assertEqual([START, START + 3 * SECOND, START + 61 * SECOND], actual["time"].tolist())
+        self.assertEqual((START, 100.0, 102.0, 99.0, 99.0, 3.5, 3), actual[0].item())
+        self.assertEqual((START + 61 * SECOND, 98.0, 98.0, 98.0, 98.0, 4.0, 1), actual[-1].item())
+
+        actual = target.get_bars("1m")
+        self.assertEqual([(START, 100.0, 102.0, 99.0, 101.0, 4.5, 4),
+                          (START + 60 * SECOND, 98.0, 98.0, 98.0, 98.0, 4.0, 1)], actual.tolist())
+
+        actual = target.get_bars("5m")
+        self.assertEqual([(START, 100.0, 102.0, 98.0, 98.0, 8.5, 5)], actual.tolist())
+        self.assertEqual({"1s": 2, "1m": 1, "5m": 0}, target.get_stats()["closed_bar_count"])
+
+    def test_bar_count(self):
+        target = tt.TradeTape(bar_count=3)
+        for i in range(10):
+            target.record(START + i * SECOND, 100.0 + i, 1.0, tt.BUY)
+
+        # 3 closed bars kept, plus the open one
+        self.assertEqual([106.0, 107.0, 108.0, 109.0], target.get_bars("1s")["open"].tolist())
+        self.assertEqual([108.0, 109.0], target.get_bars("1s", 2)["open"].tolist())
+        self.assertEqual([109.0], target.get_bars("1s", 1)["open"].tolist())
+        self.assertEqual(0, len(target.get_bars("1s", 0)))
+
+    def test_empty(self):
+        target = tt.TradeTape()
+
+        self.assertEqual(0, len(target.get_trades()))
+        self.assertEqual(0, len(target.get_bars("1m")))
+        with self.assertRaises(ValueError):
+            target.get_bars("1h")
+        with self.assertRaises(ValueError):
+            target.get_trades(-5)
+        with self.assertRaises(ValueError):
+            target.get_bars("1m", -1)
+
+    def test_resolutions_must_nest(self):
+        with self.assertRaises(ValueError):
+            tt.TradeTape(resolutions=[("1m", 60), ("90s", 90)])
+        target = tt.TradeTape(resolutions=[("5s", 5), ("1h", 3600)])
+        self.assertEqual(["5s", "1h"], target.resolution_names)
+
+
+if __name__ == '__main__':
+    unittest.main()